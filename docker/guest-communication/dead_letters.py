@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth Dead-Letter Messages
+Inspection and rate-capped replay of guest messages that ran out of send
+attempts
+
+Usage:
+    python dead_letters.py list --error "503" --limit 20
+    python dead_letters.py replay --booking-id HA-123456 --rate 2
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from work_queue import WorkQueue
+
+# Dead-lettered messages before they moved to the keys below
+LEGACY_FAILED_MESSAGES_KEY = "failed_messages"
+
+@dataclass
+class DeadLetterFilter:
+    """Which dead letters to list or replay; unset fields match everything"""
+    error: Optional[str] = None
+    booking_id: Optional[str] = None
+    message_ids: Optional[List[str]] = None
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        if self.error and self.error.lower() not in (entry.get("error") or "").lower():
+            return False
+        if self.booking_id and entry.get("booking_id") != self.booking_id:
+            return False
+        if self.message_ids is not None and entry.get("message_id") not in self.message_ids:
+            return False
+        return True
+
+class DeadLetterQueue:
+    """Failed messages, indexed by failure time and stored by message_id"""
+
+    def __init__(
+        self,
+        redis_client,
+        queue: WorkQueue,
+        payloads_key: str,
+        priority_class: Callable[[Optional[str]], str],
+        key: str = "failed_messages"
+    ):
+        self.redis = redis_client
+        self.queue = queue
+        self.payloads_key = payloads_key
+        self.priority_class = priority_class
+        self.ids_key = f"{key}:ids"
+        self.dead_payloads_key = f"{key}:payloads"
+
+    def add_commands(self, pipe, message_data: Dict[str, Any], error: Optional[str]):
+        """Dead-letter a message, as part of `pipe`"""
+        failed_at = time.time()
+        entry = {**message_data, "error": error, "failed_at": datetime.fromtimestamp(failed_at).isoformat()}
+        pipe.hset(self.dead_payloads_key, message_data["message_id"], json.dumps(entry))
+        pipe.zadd(self.ids_key, {message_data["message_id"]: failed_at})
+
+    async def count(self) -> int:
+        return await self.redis.zcard(self.ids_key)
+
+    async def migrate_legacy(self) -> int:
+        """Move messages dead-lettered to the old failed_messages list"""
+        legacy = await self.redis.lrange(LEGACY_FAILED_MESSAGES_KEY, 0, -1)
+        if not legacy:
+            return 0
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for raw in legacy:
+                message_data = json.loads(raw)
+                self.add_commands(pipe, message_data, message_data.get("error", "Max retries reached"))
+            pipe.delete(LEGACY_FAILED_MESSAGES_KEY)
+            await pipe.execute()
+        logger.info(f"📦 Moved {len(legacy)} failed messages to {self.ids_key}")
+        return len(legacy)
+
+    async def scan(
+        self,
+        filters: DeadLetterFilter,
+        start: int = 0,
+        chunk_size: int = 500
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (position, entry) for matching dead letters, oldest first"""
+        position = start
+        while True:
+            ids = await self.redis.zrange(self.ids_key, position, position + chunk_size - 1)
+            if not ids:
+                return
+            payloads = await self.redis.hmget(self.dead_payloads_key, ids)
+            for offset, payload in enumerate(payloads):
+                if payload is None:
+                    continue
+                entry = json.loads(payload)
+                if filters.matches(entry):
+                    yield position + offset, entry
+            position += len(ids)
+
+    async def list(self, filters: DeadLetterFilter, cursor: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """One page of matching dead letters; pass next_cursor to continue
+
+        total_dead_letters counts every dead letter, not just matches, so
+        a page never costs a scan of the whole set.
+        """
+        entries, next_cursor = [], None
+        async for position, entry in self.scan(filters, start=cursor):
+            if len(entries) == limit:
+                next_cursor = position
+                break
+            entries.append(entry)
+        return {"total_dead_letters": await self.count(), "messages": entries, "next_cursor": next_cursor}
+
+    async def replay(
+        self,
+        filters: DeadLetterFilter,
+        rate_per_second: float,
+        batch_size: int = 100,
+        limit: Optional[int] = None,
+        progress: Optional[Callable[[int], Any]] = None
+    ) -> int:
+        """Put matching dead letters back on the send queue at a capped rate"""
+        # Collected up front: replaying removes entries from the index
+        # we would otherwise be walking
+        picked = []
+        async for _, entry in self.scan(filters):
+            picked.append(entry)
+            if limit is not None and len(picked) >= limit:
+                break
+
+        batch_size = max(1, min(batch_size, int(rate_per_second) or 1))
+        replayed = 0
+        started = time.monotonic()
+        for offset in range(0, len(picked), batch_size):
+            batch = picked[offset:offset + batch_size]
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for entry in batch:
+                    message_id = entry["message_id"]
+                    message_data = {
+                        field: value for field, value in entry.items()
+                        if field not in ("error", "failed_at", "last_error")
+                    }
+                    message_data["attempts"] = 0
+                    pipe.zrem(self.ids_key, message_id)
+                    pipe.hdel(self.dead_payloads_key, message_id)
+                    pipe.hset(self.payloads_key, message_id, json.dumps(message_data))
+                await self.queue.push_many_commands(pipe, [
+                    (entry["message_id"], self.priority_class(entry.get("priority")), entry.get("booking_id"))
+                    for entry in batch
+                ])
+                await pipe.execute()
+
+            replayed += len(batch)
+            if progress:
+                await progress(replayed)
+
+            # Pace batches so the average rate stays under the cap
+            ahead = replayed / rate_per_second - (time.monotonic() - started)
+            if ahead > 0 and replayed < len(picked):
+                await asyncio.sleep(ahead)
+
+        logger.info(f"🔁 Replayed {replayed} dead-lettered messages at up to {rate_per_second:g}/s")
+        return replayed
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay dead-lettered guest messages")
+    parser.add_argument("command", choices=["list", "replay"])
+    parser.add_argument("--error", help="Only messages whose last error contains this text")
+    parser.add_argument("--booking-id", help="Only messages for this booking")
+    parser.add_argument("--message-id", action="append", dest="message_ids", help="Only these messages (repeatable)")
+    parser.add_argument("--limit", type=int, help="At most this many messages")
+    parser.add_argument("--rate", type=float, help="Replay rate cap in messages per second")
+    args = parser.parse_args()
+
+    import main as service
+
+    filters = DeadLetterFilter(args.error, args.booking_id, args.message_ids)
+
+    async def run() -> Dict[str, Any]:
+        try:
+            if args.command == "list":
+                return await service.dead_letters.list(filters, limit=args.limit or 50)
+            replayed = await service.dead_letters.replay(
+                filters,
+                rate_per_second=args.rate or service.DEAD_LETTER_REPLAY_RATE_PER_SECOND,
+                batch_size=service.DEAD_LETTER_REPLAY_BATCH_SIZE,
+                limit=args.limit
+            )
+            return {"replayed": replayed, "remaining": await service.dead_letters.count()}
+        finally:
+            await service.redis_client.aclose()
+
+    print(json.dumps(asyncio.run(run()), indent=2, default=str))
+
+if __name__ == "__main__":
+    main()
@@ -5,26 +5,42 @@ Automated guest messaging through VRBO's built-in messaging system
 """
 
 import asyncio
+import hashlib
 import os
 import json
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple
 from enum import Enum
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-import aiohttp
 from loguru import logger
 import redis.asyncio as redis
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+
+from vrbo_client import VRBOClient, VRBOAuthError
+from vrbo_rate_limiter import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    VRBO_RATE_LIMIT_PER_SECOND,
+    VRBORateLimiter
+)
+from work_queue import DelayedWorkMover, WorkQueue
+from dead_letters import DeadLetterFilter, DeadLetterQueue
+from redis_pubsub import listen_forever
 
 # Configure logging
+LOG_DIR = os.getenv("LOG_DIR", "/app/logs")
 logger.add(
-    "/app/logs/guest_communication.log",
+    f"{LOG_DIR}/guest_communication.log",
     rotation="1 day",
     retention="30 days",
     level="INFO"
@@ -57,7 +73,107 @@ redis_client = redis.from_url(REDIS_URL)
 # VRBO API Configuration
 VRBO_CLIENT_ID = os.getenv("VRBO_CLIENT_ID")
 VRBO_CLIENT_SECRET = os.getenv("VRBO_CLIENT_SECRET")
-VRBO_BASE_URL = "https://api.expediapartnercentral.com"
+vrbo_client = VRBOClient(
+    VRBO_CLIENT_ID,
+    VRBO_CLIENT_SECRET,
+    limiter=VRBORateLimiter(redis_client)
+)
+
+# Outgoing messages are sent by MESSAGE_WORKERS concurrent workers per
+# replica. A claimed message that is not acked within
+# MESSAGE_VISIBILITY_TIMEOUT_SECONDS (its worker died) is put back on the
+# queue by a reaper running every MESSAGE_REAPER_INTERVAL_SECONDS.
+MESSAGE_WORKERS = int(os.getenv("MESSAGE_WORKERS", "8"))
+MESSAGE_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("MESSAGE_VISIBILITY_TIMEOUT_SECONDS", "120"))
+MESSAGE_REAPER_INTERVAL_SECONDS = int(os.getenv("MESSAGE_REAPER_INTERVAL_SECONDS", "15"))
+MESSAGE_MAX_ATTEMPTS = int(os.getenv("MESSAGE_MAX_ATTEMPTS", "3"))
+
+# A failed send is retried after MESSAGE_RETRY_BASE_SECONDS, doubling with
+# each further attempt. Until then the message stays at the head of its
+# booking's messages, so they are still sent in order.
+MESSAGE_RETRY_BASE_SECONDS = float(os.getenv("MESSAGE_RETRY_BASE_SECONDS", "30"))
+
+# Workers share their claims between priority classes in proportion to
+# MESSAGE_PRIORITY_WEIGHTS, so a flood of high priority messages slows
+# normal and low ones down rather than starving them. A message that has
+# waited MESSAGE_MAX_WAIT_SECONDS is sent next whatever its class. Messages
+# for the same booking are always sent one at a time, in the order queued.
+def parse_priority_weights(value: str) -> Dict[str, int]:
+    """Parse "class=weight,..." priority weights, failing on anything malformed"""
+    weights = {}
+    for pair in value.split(","):
+        name, separator, weight = (part.strip() for part in pair.partition("="))
+        if not name or not separator or not weight.isdigit() or int(weight) < 1:
+            raise ValueError(
+                f"Invalid MESSAGE_PRIORITY_WEIGHTS entry {pair.strip()!r} in {value!r}: expected "
+                "comma-separated class=weight pairs with positive integer weights, e.g. high=6,normal=3,low=1"
+            )
+        weights[name] = int(weight)
+    if "normal" not in weights:
+        raise ValueError(f"MESSAGE_PRIORITY_WEIGHTS {value!r} must include a weight for the normal class")
+    return weights
+
+MESSAGE_PRIORITY_WEIGHTS = parse_priority_weights(os.getenv("MESSAGE_PRIORITY_WEIGHTS", "high=6,normal=3,low=1"))
+MESSAGE_MAX_WAIT_SECONDS = int(os.getenv("MESSAGE_MAX_WAIT_SECONDS", "300"))
+message_queue = WorkQueue(
+    redis_client,
+    "message_queue",
+    classes=MESSAGE_PRIORITY_WEIGHTS,
+    max_wait=MESSAGE_MAX_WAIT_SECONDS,
+    default_class="normal",
+    visibility_timeout=MESSAGE_VISIBILITY_TIMEOUT_SECONDS
+)
+
+# Queue layout before priority classes: one sorted set scored by
+# priority, and the scores of claimed messages
+LEGACY_MESSAGE_QUEUE_KEY = "message_queue"
+LEGACY_CLAIMED_SCORES_KEY = "message_queue:claimed_scores"
+
+# Message payloads are stored once, in a hash keyed by message_id; the
+# queue, processing and scheduled sorted sets only hold the ids
+MESSAGE_PAYLOADS_KEY = "message_payloads"
+
+# Idempotency-Key headers on /send-message and /bulk-message are
+# remembered, with the original response, for this long
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# A key whose request is still being handled is held for at most this
+# long, so a request that died before answering does not block its
+# retries for a whole day
+IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS", "60"))
+
+# Dead-lettered messages are replayed in batches of up to
+# DEAD_LETTER_REPLAY_BATCH_SIZE, at no more than
+# DEAD_LETTER_REPLAY_RATE_PER_SECOND (by default half the shared VRBO rate
+# limit, leaving the rest for live traffic)
+DEAD_LETTER_REPLAY_RATE_PER_SECOND = float(
+    os.getenv("DEAD_LETTER_REPLAY_RATE_PER_SECOND", str(VRBO_RATE_LIMIT_PER_SECOND / 2))
+)
+DEAD_LETTER_REPLAY_BATCH_SIZE = int(os.getenv("DEAD_LETTER_REPLAY_BATCH_SIZE", "100"))
+
+# Scheduled messages are kept rendered in scheduled_messages and moved
+# onto message_queue in batches of this size when due
+SCHEDULED_MESSAGE_BATCH_SIZE = int(os.getenv("SCHEDULED_MESSAGE_BATCH_SIZE", "100"))
+scheduled_message_mover = DelayedWorkMover(
+    redis_client,
+    "scheduled_messages",
+    message_queue,
+    batch_size=SCHEDULED_MESSAGE_BATCH_SIZE
+)
+
+# Bulk messages are rendered and queued BULK_MESSAGE_BATCH_SIZE at a
+# time by a background job; job progress is kept for
+# BULK_MESSAGE_JOB_TTL_SECONDS
+BULK_MESSAGE_BATCH_SIZE = int(os.getenv("BULK_MESSAGE_BATCH_SIZE", "500"))
+BULK_MESSAGE_JOB_TTL_SECONDS = int(os.getenv("BULK_MESSAGE_JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Message status events are written to message_logs in multi-row inserts
+# of up to MESSAGE_LOG_BATCH_SIZE rows, at least every
+# MESSAGE_LOG_FLUSH_MS. Senders wait once MESSAGE_LOG_MAX_BUFFERED events
+# are waiting for Postgres.
+MESSAGE_LOG_BATCH_SIZE = int(os.getenv("MESSAGE_LOG_BATCH_SIZE", "200"))
+MESSAGE_LOG_FLUSH_MS = int(os.getenv("MESSAGE_LOG_FLUSH_MS", "250"))
+MESSAGE_LOG_MAX_BUFFERED = int(os.getenv("MESSAGE_LOG_MAX_BUFFERED", "10000"))
+MESSAGE_LOG_SHUTDOWN_TIMEOUT_SECONDS = 10
 
 # Template configuration
 template_env = Environment(
@@ -65,6 +181,9 @@ template_env = Environment(
     autoescape=select_autoescape(['html', 'xml'])
 )
 
+# Message subjects and bodies are plain text, rendered without autoescaping
+message_template_env = Environment()
+
 class MessageType(str, Enum):
     WELCOME = "welcome"
     CHECKIN_INSTRUCTIONS = "checkin_instructions"
@@ -97,6 +216,13 @@ class MessageTemplate(BaseModel):
     variables: List[str] = Field(default_factory=list)
     active: bool = True
 
+class DeadLetterReplay(BaseModel):
+    error: Optional[str] = None
+    booking_id: Optional[str] = None
+    message_ids: Optional[List[str]] = None
+    limit: Optional[int] = Field(None, ge=1)
+    rate_per_second: Optional[float] = Field(None, gt=0)
+
 class MessageStatus(BaseModel):
     message_id: str
     booking_id: str
@@ -104,7 +230,7 @@ class MessageStatus(BaseModel):
     sent_at: Optional[datetime]
     error: Optional[str]
 
-@app.on_startup
+@app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
     logger.info("🚀 Starting Bill Sloth Guest Communication Service")
@@ -127,9 +253,35 @@ async def startup_event():
     # Initialize default templates
     await initialize_default_templates()
     
+    try:
+        await dead_letters.migrate_legacy()
+    except Exception as e:
+        logger.error(f"❌ Failed to migrate legacy failed messages: {e}")
+    
+    try:
+        await migrate_legacy_message_queue()
+    except Exception as e:
+        logger.error(f"❌ Failed to migrate legacy message queue: {e}")
+    
     # Start background tasks
-    asyncio.create_task(message_queue_processor())
-    asyncio.create_task(scheduled_message_sender())
+    app.state.template_listener = asyncio.create_task(template_cache.listen())
+    message_log_writer.start()
+    app.state.message_processor = asyncio.create_task(message_queue_processor())
+    app.state.scheduled_message_sender = asyncio.create_task(scheduled_message_sender())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop sending, flush buffered message logs and release pooled connections"""
+    tasks = [
+        getattr(app.state, name, None)
+        for name in ("message_processor", "scheduled_message_sender", "template_listener")
+    ]
+    tasks = [task for task in tasks if task]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await message_log_writer.close()
+    await vrbo_client.close()
 
 @app.get("/")
 async def root():
@@ -150,27 +302,114 @@ async def health_check():
     }
 
 @app.post("/send-message")
-async def send_message(message: GuestMessage, background_tasks: BackgroundTasks):
-    """Send a message to guest through VRBO messaging"""
+async def send_message(
+    message: GuestMessage,
+    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Send a message to guest through VRBO messaging
+
+    With an Idempotency-Key header, repeats of the request return the
+    original response instead of queueing the message again.
+    """
+    if idempotency_key:
+        previous = await claim_idempotency_key("send-message", idempotency_key)
+        if previous:
+            return previous
+    
     try:
         # Validate booking exists
         booking = await get_booking_details(message.booking_id)
         if not booking:
             raise HTTPException(status_code=404, detail="Booking not found")
         
+        message_id = idempotent_message_id(idempotency_key) if idempotency_key else None
+        
         # If scheduled, add to queue
         if message.schedule_time and message.schedule_time > datetime.now():
-            await schedule_message(message)
-            return {"status": "scheduled", "scheduled_time": message.schedule_time}
+            message_id = await schedule_message(message, message_id)
+            response = {"status": "scheduled", "message_id": message_id, "scheduled_time": message.schedule_time}
+        else:
+            # Send immediately
+            message_id = await queue_message_for_sending(message, message_id)
+            response = {"status": "queued", "message_id": message_id}
         
-        # Send immediately
-        message_id = await queue_message_for_sending(message)
-        return {"status": "queued", "message_id": message_id}
+        if idempotency_key:
+            await store_idempotent_response("send-message", idempotency_key, response)
+        return response
         
     except Exception as e:
+        if idempotency_key:
+            await release_idempotency_key("send-message", idempotency_key)
+        if isinstance(e, HTTPException):
+            raise
         logger.error(f"Error sending message: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/dead-letters")
+async def list_dead_letters(
+    error: Optional[str] = None,
+    booking_id: Optional[str] = None,
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """List messages that ran out of send attempts, oldest first"""
+    return await dead_letters.list(DeadLetterFilter(error, booking_id), cursor=cursor, limit=limit)
+
+@app.post("/dead-letters/replay")
+async def replay_dead_letters(replay: DeadLetterReplay, background_tasks: BackgroundTasks):
+    """Put matching dead-lettered messages back on the send queue
+
+    Runs as a background job under the replay rate cap; poll
+    GET /dead-letters/replay/{job_id} for its progress.
+    """
+    job_id = f"replay_{uuid.uuid4().hex}"
+    rate = replay.rate_per_second or DEAD_LETTER_REPLAY_RATE_PER_SECOND
+    await redis_client.hset(replay_job_key(job_id), mapping={
+        "status": "pending",
+        "rate_per_second": rate,
+        "messages_replayed": 0,
+        "created_at": datetime.now().isoformat()
+    })
+    await redis_client.expire(replay_job_key(job_id), BULK_MESSAGE_JOB_TTL_SECONDS)
+    background_tasks.add_task(run_dead_letter_replay, job_id, replay, rate)
+    return {"status": "accepted", "job_id": job_id, "status_url": f"/dead-letters/replay/{job_id}"}
+
+@app.get("/dead-letters/replay/{job_id}")
+async def get_dead_letter_replay(job_id: str):
+    """Get progress of a dead-letter replay job"""
+    job = await redis_client.hgetall(replay_job_key(job_id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Replay job not found")
+    
+    job = {field.decode(): value.decode() for field, value in job.items()}
+    job["messages_replayed"] = int(job["messages_replayed"])
+    job["rate_per_second"] = float(job["rate_per_second"])
+    return {"job_id": job_id, **job}
+
+def replay_job_key(job_id: str) -> str:
+    return f"dead_letter_replays:{job_id}"
+
+async def run_dead_letter_replay(job_id: str, replay: DeadLetterReplay, rate: float):
+    key = replay_job_key(job_id)
+    try:
+        await redis_client.hset(key, "status", "running")
+        replayed = await dead_letters.replay(
+            DeadLetterFilter(replay.error, replay.booking_id, replay.message_ids),
+            rate_per_second=rate,
+            batch_size=DEAD_LETTER_REPLAY_BATCH_SIZE,
+            limit=replay.limit,
+            progress=lambda count: redis_client.hset(key, "messages_replayed", count)
+        )
+        await redis_client.hset(key, mapping={
+            "status": "completed",
+            "messages_replayed": replayed,
+            "completed_at": datetime.now().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"❌ Dead-letter replay job {job_id} failed: {e}")
+        await redis_client.hset(key, mapping={"status": "failed", "error": str(e)})
+
 @app.get("/templates")
 async def get_templates(message_type: Optional[MessageType] = None):
     """Get available message templates"""
@@ -201,36 +440,123 @@ async def get_message_history(booking_id: str):
 async def send_bulk_message(
     message_type: MessageType,
     property_ids: List[str],
-    date_range: Optional[Dict[str, str]] = None
+    background_tasks: BackgroundTasks,
+    date_range: Optional[Dict[str, str]] = None,
+    idempotency_key: Optional[str] = Header(None)
 ):
-    """Send bulk messages to multiple guests"""
+    """Send bulk messages to multiple guests
+
+    Messages are rendered and queued by a background job; poll
+    GET /bulk-message/{job_id} for its progress. With an Idempotency-Key
+    header, repeats of the request return the original job instead of
+    starting another.
+    """
+    if idempotency_key:
+        previous = await claim_idempotency_key("bulk-message", idempotency_key)
+        if previous:
+            return previous
+    
     try:
-        # Get relevant bookings
-        bookings = await get_bookings_for_bulk_message(property_ids, date_range)
-        
-        # Queue messages for each booking
-        queued_count = 0
-        for booking in bookings:
-            message = GuestMessage(
-                booking_id=booking['booking_id'],
-                message_type=message_type,
-                subject="",  # Will be filled by template
-                body="",     # Will be filled by template
-                priority=MessagePriority.NORMAL
-            )
-            await queue_message_for_sending(message)
-            queued_count += 1
+        job_id = bulk_job_id(idempotency_key) if idempotency_key else f"bulk_{uuid.uuid4().hex}"
+        await redis_client.hset(bulk_job_key(job_id), mapping={
+            "status": "pending",
+            "message_type": message_type.value,
+            "total_bookings": 0,
+            "messages_queued": 0,
+            "created_at": datetime.now().isoformat()
+        })
+        await redis_client.expire(bulk_job_key(job_id), BULK_MESSAGE_JOB_TTL_SECONDS)
+        background_tasks.add_task(run_bulk_message_job, job_id, message_type, property_ids, date_range)
         
-        return {
-            "status": "queued",
-            "total_bookings": len(bookings),
-            "messages_queued": queued_count
+        response = {
+            "status": "accepted",
+            "job_id": job_id,
+            "status_url": f"/bulk-message/{job_id}"
         }
+        if idempotency_key:
+            await store_idempotent_response("bulk-message", idempotency_key, response)
+        return response
         
     except Exception as e:
+        if idempotency_key:
+            await release_idempotency_key("bulk-message", idempotency_key)
         logger.error(f"Error sending bulk messages: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/bulk-message/{job_id}")
+async def get_bulk_message_job(job_id: str):
+    """Get progress of a bulk message job"""
+    job = await redis_client.hgetall(bulk_job_key(job_id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Bulk message job not found")
+    
+    job = {field.decode(): value.decode() for field, value in job.items()}
+    for field in ("total_bookings", "messages_queued"):
+        job[field] = int(job[field])
+    return {"job_id": job_id, **job}
+
+def bulk_job_id(idempotency_key: str) -> str:
+    """Job id of a keyed request, the same for every attempt with that key"""
+    return f"bulk_{hashlib.sha256(idempotency_key.encode()).hexdigest()[:32]}"
+
+def bulk_job_key(job_id: str) -> str:
+    return f"bulk_message_jobs:{job_id}"
+
+async def run_bulk_message_job(
+    job_id: str,
+    message_type: MessageType,
+    property_ids: List[str],
+    date_range: Optional[Dict[str, str]]
+):
+    """Render and queue one bulk message per target booking
+
+    Bookings come from a single query joined with their property, the
+    template is looked up once, and each batch of rendered messages is
+    queued with one Redis pipeline together with the job's progress.
+    """
+    key = bulk_job_key(job_id)
+    try:
+        await redis_client.hset(key, "status", "running")
+        
+        # Get relevant bookings
+        bookings = await get_bookings_for_bulk_message(property_ids, date_range)
+        template = None
+        if message_type != MessageType.CUSTOM:
+            template = await template_cache.get(message_type)
+        await redis_client.hset(key, "total_bookings", len(bookings))
+        
+        for start in range(0, len(bookings), BULK_MESSAGE_BATCH_SIZE):
+            batch = {}
+            for booking in bookings[start:start + BULK_MESSAGE_BATCH_SIZE]:
+                subject, body = template.render(booking) if template else ("", "")
+                message_data = build_message_data(
+                    booking['booking_id'], subject, body, MessagePriority.NORMAL,
+                    message_id=f"msg_{job_id}_{booking['booking_id']}"
+                )
+                batch[message_data["message_id"]] = message_data
+            
+            # Message ids are fixed per job and booking. A job id is only
+            # reused when a request is retried with its Idempotency-Key,
+            # and then messages still queued from the first attempt are
+            # not queued again
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(MESSAGE_PAYLOADS_KEY, mapping={
+                    message_id: json.dumps(message_data) for message_id, message_data in batch.items()
+                })
+                await message_queue.push_many_commands(pipe, [
+                    (message_id, get_priority_class(MessagePriority.NORMAL), message_data["booking_id"])
+                    for message_id, message_data in batch.items()
+                ])
+                pipe.hincrby(key, "messages_queued", len(batch))
+                await pipe.execute()
+        
+        await redis_client.hset(key, mapping={"status": "completed", "completed_at": datetime.now().isoformat()})
+        logger.info(f"📨 Bulk message job {job_id} queued {len(bookings)} {message_type.value} messages")
+        
+    except Exception as e:
+        logger.error(f"❌ Bulk message job {job_id} failed: {e}")
+        await redis_client.hset(key, mapping={"status": "failed", "error": str(e)})
+
 async def initialize_default_templates():
     """Initialize default message templates"""
     default_templates = [
@@ -400,149 +726,230 @@ async def get_booking_details(booking_id: str) -> Optional[Dict]:
         JOIN properties p ON b.property_id = p.id
         WHERE b.vrbo_booking_id = :booking_id
         """
-        result = await session.execute(query, {"booking_id": booking_id})
+        result = await session.execute(text(query), {"booking_id": booking_id})
         row = result.first()
-        return dict(row) if row else None
+        return dict(row._mapping) if row else None
 
-async def queue_message_for_sending(message: GuestMessage) -> str:
+async def queue_message_for_sending(message: GuestMessage, message_id: Optional[str] = None) -> str:
     """Queue message for sending through VRBO API"""
-    message_id = f"msg_{datetime.now().timestamp()}_{message.booking_id}"
+    message_data = await prepare_message_data(message, message_id)
+    message_id = message_data["message_id"]
+    
+    # Queued in its priority class, behind earlier messages for the booking
+    async with redis_client.pipeline(transaction=True) as pipe:
+        store_message_commands(pipe, message_data)
+        await message_queue.push_commands(pipe, message_id, get_priority_class(message.priority), message.booking_id)
+        await pipe.execute()
     
+    logger.info(f"📧 Queued message {message_id} for booking {message.booking_id}")
+    return message_id
+
+async def prepare_message_data(message: GuestMessage, message_id: Optional[str] = None) -> Dict:
+    """Render a message's template (if any) into a queue entry"""
     # If template-based, render the message
     if message.message_type != MessageType.CUSTOM:
-        template = await get_template_for_type(message.message_type)
+        template = await template_cache.get(message.message_type)
         if template:
             # Get booking details for template variables
             booking = await get_booking_details(message.booking_id)
             template_vars = {**booking, **message.template_variables}
             
             # Render template
-            message.subject = render_template_string(template['subject'], template_vars)
-            message.body = render_template_string(template['body'], template_vars)
+            message.subject, message.body = template.render(template_vars)
     
-    # Add to Redis queue
-    message_data = {
-        "message_id": message_id,
-        "booking_id": message.booking_id,
-        "subject": message.subject,
-        "body": message.body,
-        "priority": message.priority,
+    return build_message_data(message.booking_id, message.subject, message.body, message.priority, message_id)
+
+def build_message_data(
+    booking_id: str,
+    subject: str,
+    body: str,
+    priority: MessagePriority,
+    message_id: Optional[str] = None
+) -> Dict:
+    """Queue entry for one outgoing message"""
+    return {
+        "message_id": message_id or f"msg_{datetime.now().timestamp()}_{booking_id}",
+        "booking_id": booking_id,
+        "subject": subject,
+        "body": body,
+        "priority": priority,
         "created_at": datetime.now().isoformat(),
         "attempts": 0
     }
+
+async def schedule_message(message: GuestMessage, message_id: Optional[str] = None) -> str:
+    """Schedule a message for future sending
+
+    The message is rendered now and stored ready to send, so moving it onto
+    the send queue when due is a single Redis step.
+    """
+    message_data = await prepare_message_data(message, message_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        store_message_commands(pipe, message_data)
+        scheduled_message_mover.schedule_commands(
+            pipe,
+            message_data["message_id"],
+            message.schedule_time.timestamp(),
+            get_priority_class(message.priority),
+            message.booking_id
+        )
+        await pipe.execute()
     
-    # Use priority queue
-    score = get_priority_score(message.priority)
-    await redis_client.zadd("message_queue", {json.dumps(message_data): score})
+    logger.info(f"📅 Scheduled message {message_data['message_id']} for {message.schedule_time}")
+    return message_data["message_id"]
+
+def store_message_commands(pipe, message_data: Dict):
+    """Store a message's payload under its id, as part of `pipe`"""
+    pipe.hset(MESSAGE_PAYLOADS_KEY, message_data["message_id"], json.dumps(message_data))
+
+async def load_claimed_message(member: bytes) -> Optional[Dict]:
+    """Payload of a claimed queue member, or None if it was already handled"""
+    if member.startswith(b"{"):
+        # Queued before payloads moved to message_payloads
+        return json.loads(member)
+    payload = await redis_client.hget(MESSAGE_PAYLOADS_KEY, member)
+    return json.loads(payload) if payload else None
+
+def idempotent_message_id(idempotency_key: str) -> str:
+    return f"msg_{hashlib.sha256(idempotency_key.encode()).hexdigest()[:32]}"
+
+def idempotency_redis_key(scope: str, idempotency_key: str) -> str:
+    return f"idempotency:{scope}:{hashlib.sha256(idempotency_key.encode()).hexdigest()}"
+
+async def claim_idempotency_key(scope: str, idempotency_key: str) -> Optional[Dict]:
+    """Reserve an idempotency key with SETNX
+
+    Returns None for a new request, or the stored response of the request
+    that used the key first. Raises 409 while that request is still being
+    handled.
+    """
+    key = idempotency_redis_key(scope, idempotency_key)
+    if await redis_client.set(key, "", nx=True, ex=IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS):
+        return None
     
-    logger.info(f"📧 Queued message {message_id} for booking {message.booking_id}")
-    return message_id
+    stored = await redis_client.get(key)
+    if not stored:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+    logger.info(f"♻️ Ignored duplicate {scope} request")
+    return json.loads(stored)
+
+async def store_idempotent_response(scope: str, idempotency_key: str, response: Dict):
+    await redis_client.set(
+        idempotency_redis_key(scope, idempotency_key),
+        json.dumps(response, default=str),
+        xx=True,
+        ex=IDEMPOTENCY_TTL_SECONDS
+    )
+
+async def release_idempotency_key(scope: str, idempotency_key: str):
+    """Forget a key whose request failed, so the client can retry it"""
+    await redis_client.delete(idempotency_redis_key(scope, idempotency_key))
 
-async def schedule_message(message: GuestMessage):
-    """Schedule a message for future sending"""
-    schedule_data = {
-        "message": message.dict(),
-        "scheduled_time": message.schedule_time.isoformat()
-    }
+async def message_queue_processor():
+    """Process queued messages
+
+    Runs MESSAGE_WORKERS workers that each claim and send one message at a
+    time, back to back while messages are queued; see WorkQueue for the
+    claiming, wake-up and visibility timeout logic.
+    """
+    await message_queue.run(
+        process_queued_message,
+        workers=MESSAGE_WORKERS,
+        reaper_interval=MESSAGE_REAPER_INTERVAL_SECONDS
+    )
+
+async def process_queued_message(member: bytes, priority_class: str):
+    """Send one claimed message, then ack, retry or dead-letter it"""
+    message_data = await load_claimed_message(member)
+    if message_data is None:
+        # Sent or dead-lettered by a worker whose claim had already timed out
+        await message_queue.ack(member)
+        return
     
-    # Add to scheduled messages sorted set
-    score = message.schedule_time.timestamp()
-    await redis_client.zadd("scheduled_messages", {json.dumps(schedule_data): score})
+    # Send through VRBO API
+    success = await send_vrbo_message(message_data)
     
-    logger.info(f"📅 Scheduled message for {message.schedule_time}")
+    if success:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            await message_queue.ack_commands(pipe, member)
+            pipe.hdel(MESSAGE_PAYLOADS_KEY, message_data['message_id'])
+            await pipe.execute()
+        await record_message_status(message_data, "sent", datetime.now())
+        return
+    
+    # Increment retry count
+    message_data['attempts'] += 1
+    
+    if message_data['attempts'] >= MESSAGE_MAX_ATTEMPTS:
+        # Max retries reached, move to failed queue
+        async with redis_client.pipeline(transaction=True) as pipe:
+            await message_queue.ack_commands(pipe, member)
+            dead_letters.add_commands(pipe, message_data, message_data.get('last_error') or "Max retries reached")
+            pipe.hdel(MESSAGE_PAYLOADS_KEY, message_data['message_id'])
+            await pipe.execute()
+        await record_message_status(message_data, "failed", datetime.now(), "Max retries reached")
+    else:
+        # Retry with low priority once the backoff has passed
+        delay = MESSAGE_RETRY_BASE_SECONDS * 2 ** (message_data['attempts'] - 1)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            store_message_commands(pipe, message_data)
+            await scheduled_message_mover.retry_commands(
+                pipe,
+                member,
+                (datetime.now() + timedelta(seconds=delay)).timestamp(),
+                get_priority_class(MessagePriority.LOW)
+            )
+            await pipe.execute()
+        logger.warning(f"⚠️ Message {message_data['message_id']} failed, retrying in {delay:.0f}s")
 
-async def message_queue_processor():
-    """Process queued messages"""
-    while True:
-        try:
-            # Get highest priority message
-            messages = await redis_client.zrange("message_queue", 0, 0)
-            
-            if messages:
-                message_data = json.loads(messages[0])
-                
-                # Send through VRBO API
-                success = await send_vrbo_message(message_data)
-                
-                if success:
-                    # Remove from queue
-                    await redis_client.zrem("message_queue", messages[0])
-                    
-                    # Log success
-                    await log_message_status(
-                        message_data['message_id'],
-                        message_data['booking_id'],
-                        "sent",
-                        datetime.now()
-                    )
-                else:
-                    # Increment retry count
-                    message_data['attempts'] += 1
-                    
-                    if message_data['attempts'] >= 3:
-                        # Max retries reached, move to failed queue
-                        await redis_client.zrem("message_queue", messages[0])
-                        await redis_client.rpush("failed_messages", json.dumps(message_data))
-                        
-                        await log_message_status(
-                            message_data['message_id'],
-                            message_data['booking_id'],
-                            "failed",
-                            datetime.now(),
-                            "Max retries reached"
-                        )
-                    else:
-                        # Re-queue with lower priority
-                        await redis_client.zrem("message_queue", messages[0])
-                        score = get_priority_score(MessagePriority.LOW) + message_data['attempts'] * 100
-                        await redis_client.zadd("message_queue", {json.dumps(message_data): score})
-            
-            # Process every 5 seconds
-            await asyncio.sleep(5)
-            
-        except Exception as e:
-            logger.error(f"Error in message queue processor: {e}")
-            await asyncio.sleep(10)
+async def record_message_status(
+    message_data: Dict,
+    status: str,
+    sent_at: Optional[datetime],
+    error: Optional[str] = None
+):
+    """Log a message's outcome; the message is already acked, so failures here are only logged"""
+    try:
+        await log_message_status(message_data['message_id'], message_data['booking_id'], status, sent_at, error)
+    except Exception as e:
+        logger.error(f"Failed to log status of message {message_data['message_id']}: {e}")
 
 async def scheduled_message_sender():
-    """Send scheduled messages"""
-    while True:
-        try:
-            now = datetime.now().timestamp()
-            
-            # Get due messages
-            due_messages = await redis_client.zrangebyscore(
-                "scheduled_messages", 0, now
+    """Send scheduled messages
+
+    Moves each message onto the send queue at its due time rather than on a
+    fixed poll; see DelayedWorkMover for the wake-up and moving logic.
+    """
+    try:
+        await migrate_legacy_scheduled_messages()
+    except Exception as e:
+        logger.error(f"❌ Failed to migrate legacy scheduled messages: {e}")
+    await scheduled_message_mover.run()
+
+async def migrate_legacy_scheduled_messages() -> int:
+    """Render scheduled messages stored in the old unrendered format"""
+    migrated = 0
+    for member, due_at in await redis_client.zrange("scheduled_messages", 0, -1, withscores=True):
+        schedule_data = json.loads(member)
+        if "message" not in schedule_data:
+            continue
+        message = GuestMessage(**schedule_data['message'])
+        message_data = await prepare_message_data(message)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.zrem("scheduled_messages", member)
+            store_message_commands(pipe, message_data)
+            scheduled_message_mover.schedule_commands(
+                pipe, message_data["message_id"], due_at, get_priority_class(message.priority), message.booking_id
             )
-            
-            for message_json in due_messages:
-                schedule_data = json.loads(message_json)
-                message = GuestMessage(**schedule_data['message'])
-                
-                # Queue for immediate sending
-                await queue_message_for_sending(message)
-                
-                # Remove from scheduled
-                await redis_client.zrem("scheduled_messages", message_json)
-                
-                logger.info(f"📤 Moved scheduled message to send queue")
-            
-            # Check every minute
-            await asyncio.sleep(60)
-            
-        except Exception as e:
-            logger.error(f"Error in scheduled message sender: {e}")
-            await asyncio.sleep(60)
+            await pipe.execute()
+        migrated += 1
+    if migrated:
+        logger.info(f"📦 Rendered {migrated} scheduled messages stored in the old format")
+    return migrated
 
 async def send_vrbo_message(message_data: Dict) -> bool:
     """Send message through VRBO messaging API"""
     try:
-        # Get access token
-        token = await get_vrbo_access_token()
-        if not token:
-            logger.error("Failed to get VRBO access token")
-            return False
-        
         # Prepare VRBO message payload
         vrbo_payload = {
             "bookingId": message_data['booking_id'],
@@ -551,71 +958,72 @@ async def send_vrbo_message(message_data: Dict) -> bool:
             "messageType": "HOST_TO_GUEST"
         }
         
-        # Send through VRBO API
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-            
-            url = f"{VRBO_BASE_URL}/messaging/v1/messages"
-            
-            async with session.post(url, json=vrbo_payload, headers=headers) as response:
-                if response.status == 200:
-                    logger.info(f"✅ Message sent successfully to booking {message_data['booking_id']}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Failed to send message: {response.status} - {error_text}")
-                    return False
+        # Guest-facing sends take priority over background API traffic;
+        # low-priority messages queue behind it
+        api_priority = PRIORITY_INTERACTIVE
+        if message_data.get('priority') == MessagePriority.LOW:
+            api_priority = PRIORITY_BACKGROUND
+        
+        # Send through VRBO API on the shared pooled session
+        async with vrbo_client.request(
+            "POST", "/messaging/v1/messages", priority=api_priority, json=vrbo_payload
+        ) as response:
+            if response.status == 200:
+                logger.info(f"✅ Message sent successfully to booking {message_data['booking_id']}")
+                return True
+            else:
+                error_text = await response.text()
+                logger.error(f"Failed to send message: {response.status} - {error_text}")
+                message_data['last_error'] = f"{response.status} - {error_text[:500]}"
+                return False
                     
+    except VRBOAuthError:
+        logger.error("Failed to get VRBO access token")
+        message_data['last_error'] = "Failed to get VRBO access token"
+        return False
     except Exception as e:
         logger.error(f"Error sending VRBO message: {e}")
+        message_data['last_error'] = str(e) or type(e).__name__
         return False
 
 async def get_vrbo_access_token() -> Optional[str]:
-    """Get VRBO API access token"""
-    # Check cache first
-    cached_token = await redis_client.get("vrbo_access_token")
-    if cached_token:
-        return cached_token.decode()
-    
-    # Request new token
-    auth_url = f"{VRBO_BASE_URL}/authentication/v1/token"
-    
-    async with aiohttp.ClientSession() as session:
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": VRBO_CLIENT_ID,
-            "client_secret": VRBO_CLIENT_SECRET
-        }
-        
-        async with session.post(auth_url, data=data) as response:
-            if response.status == 200:
-                result = await response.json()
-                token = result.get("access_token")
-                expires_in = result.get("expires_in", 3600)
-                
-                # Cache token
-                await redis_client.setex(
-                    "vrbo_access_token",
-                    expires_in - 300,  # 5 min buffer
-                    token
-                )
-                
-                return token
-            else:
-                logger.error(f"Auth failed: {response.status}")
-                return None
-
-def get_priority_score(priority: MessagePriority) -> float:
-    """Get numeric score for message priority"""
-    scores = {
-        MessagePriority.HIGH: 0,
-        MessagePriority.NORMAL: 100,
-        MessagePriority.LOW: 200
-    }
-    return scores.get(priority, 100)
+    """Get VRBO API access token (cached and refreshed by the shared client)"""
+    return await vrbo_client.get_token()
+
+def get_priority_class(priority: Optional[MessagePriority]) -> str:
+    """Queue class for a message priority"""
+    try:
+        priority_class = MessagePriority(priority).value
+    except ValueError:
+        return message_queue.default_class
+    return priority_class if priority_class in message_queue.classes else message_queue.default_class
+
+async def migrate_legacy_message_queue() -> int:
+    """Move messages queued in the old single sorted set into priority classes
+
+    Old scores were 0 for high, 100 for normal and anything else for low
+    priority or a retry. Messages are moved in their old score order, so
+    each booking's messages keep their relative order.
+    """
+    if await redis_client.type(LEGACY_MESSAGE_QUEUE_KEY) != b"zset":
+        return 0
+    queued = await redis_client.zrange(LEGACY_MESSAGE_QUEUE_KEY, 0, -1, withscores=True)
+    payloads = await redis_client.hmget(MESSAGE_PAYLOADS_KEY, [member for member, _ in queued]) if queued else []
+    legacy_classes = {0: MessagePriority.HIGH, 100: MessagePriority.NORMAL}
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for (member, score), payload in zip(queued, payloads):
+            if payload is None and member.startswith(b"{"):
+                payload = member
+            message_data = json.loads(payload) if payload else {}
+            priority_class = get_priority_class(legacy_classes.get(score, MessagePriority.LOW))
+            await message_queue.push_commands(pipe, member, priority_class, message_data.get("booking_id"), wake=False)
+        pipe.delete(LEGACY_MESSAGE_QUEUE_KEY, LEGACY_CLAIMED_SCORES_KEY)
+        await pipe.execute()
+    if queued:
+        logger.info(f"📦 Moved {len(queued)} queued messages into priority classes")
+    return len(queued)
+
+dead_letters = DeadLetterQueue(redis_client, message_queue, MESSAGE_PAYLOADS_KEY, get_priority_class)
 
 async def load_templates(message_type: Optional[MessageType] = None) -> List[Dict]:
     """Load message templates from database"""
@@ -626,14 +1034,89 @@ async def load_templates(message_type: Optional[MessageType] = None) -> List[Dic
         if message_type:
             query += " AND template_type = :message_type"
             params["message_type"] = message_type.value
-            
-        result = await session.execute(query, params)
-        return [dict(row) for row in result]
+        
+        query += " ORDER BY id DESC"
+        result = await session.execute(text(query), params)
+        return [dict(row._mapping) for row in result]
 
 async def get_template_for_type(message_type: MessageType) -> Optional[Dict]:
     """Get template for specific message type"""
-    templates = await load_templates(message_type)
-    return templates[0] if templates else None
+    template = await template_cache.get(message_type)
+    return template.row if template else None
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """An active template with its subject and body compiled once"""
+    row: Dict[str, Any]
+    version: int
+    subject: Template
+    body: Template
+    
+    def render(self, variables: Dict[str, Any]) -> Tuple[str, str]:
+        return self.subject.render(**variables), self.body.render(**variables)
+
+class TemplateCache:
+    """In-process cache of compiled message templates, reloaded when another replica changes one"""
+    
+    def __init__(self, redis_client, key: str = "message_templates"):
+        self.redis = redis_client
+        self.version_key = f"{key}:version"
+        self.channel = f"{key}:changed"
+        self.templates: Dict[str, CompiledTemplate] = {}
+        self.version = 0
+        self.stale = True
+        self._lock = asyncio.Lock()
+    
+    async def get(self, message_type: MessageType) -> Optional[CompiledTemplate]:
+        if self.stale:
+            await self.reload()
+        return self.templates.get(MessageType(message_type).value)
+    
+    async def reload(self):
+        async with self._lock:
+            if not self.stale:
+                return
+            # A change published mid-reload marks the cache stale again
+            self.stale = False
+            try:
+                version = int(await self.redis.get(self.version_key) or 0)
+                rows = await load_templates()
+            except Exception:
+                self.stale = True
+                raise
+            
+            templates = {}
+            for row in rows:
+                # Rows come newest first; the newest template of a type wins
+                if row["template_type"] not in templates:
+                    templates[row["template_type"]] = CompiledTemplate(
+                        row=row,
+                        version=version,
+                        subject=compile_template(row["subject"] or ""),
+                        body=compile_template(row["body_text"])
+                    )
+            self.templates, self.version = templates, version
+            logger.info(f"📝 Loaded {len(templates)} message templates (version {version})")
+    
+    async def invalidate(self):
+        """Mark every replica's cache stale after a template change"""
+        self.stale = True
+        version = await self.redis.incr(self.version_key)
+        await self.redis.publish(self.channel, version)
+    
+    async def listen(self):
+        """Follow template changes made on other replicas until cancelled"""
+        await listen_forever(self.redis, self.channel, self._on_change, on_subscribe=self._mark_stale)
+    
+    def _on_change(self, version: bytes):
+        if int(version) != self.version:
+            self.stale = True
+    
+    async def _mark_stale(self):
+        # Changes made while unsubscribed were missed
+        self.stale = True
+
+template_cache = TemplateCache(redis_client)
 
 async def save_template(template: MessageTemplate) -> int:
     """Save message template to database"""
@@ -654,16 +1137,21 @@ async def save_template(template: MessageTemplate) -> int:
             "active": template.active
         }
         
-        result = await session.execute(query, params)
+        result = await session.execute(text(query), params)
+        template_id = result.scalar()
         await session.commit()
-        
-        return result.scalar()
+    
+    await template_cache.invalidate()
+    return template_id
+
+@lru_cache(maxsize=512)
+def compile_template(source: str) -> Template:
+    """Compile template source once; Jinja templates are safe to share"""
+    return message_template_env.from_string(source)
 
 def render_template_string(template: str, variables: Dict[str, Any]) -> str:
     """Render template string with variables"""
-    from jinja2 import Template
-    tmpl = Template(template)
-    return tmpl.render(**variables)
+    return compile_template(template).render(**variables)
 
 async def fetch_message_history(booking_id: str) -> List[Dict]:
     """Fetch message history for a booking"""
@@ -686,26 +1174,27 @@ async def get_bookings_for_bulk_message(
     """Get bookings for bulk messaging"""
     async with AsyncSessionLocal() as session:
         query = """
-        SELECT b.vrbo_booking_id as booking_id, b.* 
+        SELECT b.*, b.vrbo_booking_id as booking_id,
+               p.name as property_name, p.address as property_address
         FROM bookings b
         JOIN properties p ON b.property_id = p.id
-        WHERE p.vrbo_property_id IN :property_ids
+        WHERE p.vrbo_property_id = ANY(:property_ids)
         AND b.booking_status = 'confirmed'
         """
         
-        params = {"property_ids": tuple(property_ids)}
+        params = {"property_ids": list(property_ids)}
         
         if date_range:
             if "start_date" in date_range:
-                query += " AND b.check_in >= :start_date"
+                query += " AND b.check_in >= CAST(:start_date AS date)"
                 params["start_date"] = date_range["start_date"]
             
             if "end_date" in date_range:
-                query += " AND b.check_in <= :end_date"
+                query += " AND b.check_in <= CAST(:end_date AS date)"
                 params["end_date"] = date_range["end_date"]
         
-        result = await session.execute(query, params)
-        return [dict(row) for row in result]
+        result = await session.execute(text(query), params)
+        return [dict(row._mapping) for row in result]
 
 async def log_message_status(
     message_id: str,
@@ -714,30 +1203,137 @@ async def log_message_status(
     sent_at: Optional[datetime],
     error: Optional[str] = None
 ):
-    """Log message status to database"""
-    async with AsyncSessionLocal() as session:
-        query = """
-        INSERT INTO message_logs 
-        (message_id, booking_id, status, sent_at, error_message, created_at)
-        VALUES (:message_id, :booking_id, :status, :sent_at, :error, NOW())
-        """
-        
-        await session.execute(query, {
-            "message_id": message_id,
-            "booking_id": booking_id,
-            "status": status,
-            "sent_at": sent_at,
-            "error": error
-        })
-        await session.commit()
+    """Log message status to database
+
+    The event is buffered and written in a later batch; this only waits
+    when the buffer is full.
+    """
+    await message_log_writer.log({
+        "message_id": message_id,
+        "booking_id": booking_id,
+        "status": status,
+        "sent_at": sent_at,
+        "error": error
+    })
+
+INSERT_MESSAGE_LOGS_QUERY = """
+    INSERT INTO message_logs
+    (message_id, booking_id, status, sent_at, error_message, created_at)
+    SELECT l.message_id, l.booking_id, l.status, l.sent_at, l.error, NOW()
+    FROM unnest(
+        CAST(:message_id AS text[]),
+        CAST(:booking_id AS text[]),
+        CAST(:status AS text[]),
+        CAST(:sent_at AS timestamp[]),
+        CAST(:error AS text[])
+    ) AS l(message_id, booking_id, status, sent_at, error)
+"""
+
+class MessageLogWriter:
+    """Buffered writer for message_logs"""
+    
+    def __init__(self, batch_size: int, flush_interval: float, max_buffered: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffered)
+        self.closing = False
+        self.written = 0
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None:
+            self.closing = False
+            self._task = asyncio.create_task(self._run())
+    
+    async def log(self, event: Dict[str, Any]):
+        self.start()
+        await self.queue.put(event)
+    
+    def backlog(self) -> int:
+        return self.queue.qsize()
+    
+    async def close(self):
+        """Flush buffered events and stop the flusher"""
+        if self._task is None:
+            return
+        self.closing = True
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=MESSAGE_LOG_SHUTDOWN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error(f"❌ Gave up flushing {self.queue.qsize()} buffered message logs on shutdown")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                if self.closing:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout=deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+            
+            await self._write_with_retry(batch)
+            for _ in batch:
+                self.queue.task_done()
+    
+    async def _write_with_retry(self, batch: List[Dict[str, Any]]):
+        delay = 0.5
+        while True:
+            try:
+                await self._write(batch)
+                self.written += len(batch)
+                return
+            except Exception as e:
+                if self.closing:
+                    logger.error(f"❌ Dropped {len(batch)} message logs on shutdown: {e}")
+                    return
+                logger.error(f"Failed to write {len(batch)} message logs, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+    
+    async def _write(self, batch: List[Dict[str, Any]]):
+        columns = ("message_id", "booking_id", "status", "sent_at", "error")
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                text(INSERT_MESSAGE_LOGS_QUERY),
+                {column: [event[column] for event in batch] for column in columns}
+            )
+            await session.commit()
+
+message_log_writer = MessageLogWriter(
+    batch_size=MESSAGE_LOG_BATCH_SIZE,
+    flush_interval=MESSAGE_LOG_FLUSH_MS / 1000,
+    max_buffered=MESSAGE_LOG_MAX_BUFFERED
+)
+
+@app.get("/rate-limit")
+async def get_rate_limit_state():
+    """Get shared VRBO API rate limiter state"""
+    return await vrbo_client.limiter.state()
 
 @app.get("/stats")
 async def get_messaging_stats():
     """Get messaging statistics"""
     stats = {
-        "queue_size": await redis_client.zcard("message_queue"),
+        "queue_size": await message_queue.depth(),
+        "messages_in_flight": await message_queue.in_flight(),
+        "priority_classes": await message_queue.stats(),
+        "message_logs_buffered": message_log_writer.backlog(),
+        "message_storage": await message_storage_report(),
         "scheduled_messages": await redis_client.zcard("scheduled_messages"),
-        "failed_messages": await redis_client.llen("failed_messages"),
+        "failed_messages": await dead_letters.count(),
         "templates_available": len(await load_templates()),
         "last_24h_sent": 0,  # Would query from database
         "avg_response_time": "< 1 minute"
@@ -745,6 +1341,39 @@ async def get_messaging_stats():
     
     return stats
 
+async def message_storage_report(sample_size: int = 200) -> Dict[str, Any]:
+    """Estimate the Redis memory saved by keeping payloads out of the sorted sets
+
+    Each queued, scheduled or in-flight message used to carry its full JSON
+    payload as its sorted set member (twice while in flight: the processing
+    set and the claimed scores hash). Now only the id is repeated there and
+    the payload is stored once.
+    """
+    sample = await redis_client.hrandfield(MESSAGE_PAYLOADS_KEY, sample_size, withvalues=True) or []
+    ids, payloads = sample[0::2], sample[1::2]
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hlen(MESSAGE_PAYLOADS_KEY)
+        pipe.hlen(message_queue.meta_key)
+        pipe.zcard(scheduled_message_mover.key)
+        pipe.zcard(message_queue.processing_key)
+        stored, known, scheduled, in_flight = await pipe.execute()
+    queued = max(0, known - in_flight)
+    
+    if not payloads:
+        return {"stored_payloads": stored, "bytes_saved_per_queued_message": 0, "estimated_bytes_saved": 0}
+    
+    avg_payload = sum(len(payload) for payload in payloads) / len(payloads)
+    avg_id = sum(len(message_id) for message_id in ids) / len(ids)
+    saved_per_reference = max(0.0, avg_payload - avg_id)
+    references = queued + scheduled + 2 * in_flight
+    return {
+        "stored_payloads": stored,
+        "avg_payload_bytes": round(avg_payload),
+        "avg_member_bytes": round(avg_id),
+        "bytes_saved_per_queued_message": round(saved_per_reference),
+        "estimated_bytes_saved": round(saved_per_reference * references)
+    }
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth Delayed Job Dispatcher
+Runs delayed jobs at their due time rather than on a fixed poll, safely
+across several replicas
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+
+from loguru import logger
+
+from redis_pubsub import listen_forever
+
+class DelayedDispatcher(ABC):
+    """Sleeps until the earliest job is due, woken early by jobs published on `wakeup_channel`"""
+
+    def __init__(self, redis_client, wakeup_channel: str, max_sleep: float = 60.0):
+        self.redis = redis_client
+        self.wakeup_channel = wakeup_channel
+        self.max_sleep = max_sleep
+        self._wakeup = asyncio.Event()
+
+    async def notify(self, due_at: float):
+        """Tell dispatchers on every replica about a newly added job"""
+        await self.redis.publish(self.wakeup_channel, due_at)
+
+    @abstractmethod
+    async def dispatch_due(self) -> int:
+        """Claim and handle every job that is currently due"""
+
+    @abstractmethod
+    async def seconds_until_next_job(self) -> float:
+        """Time to sleep before the earliest job is due, capped at max_sleep"""
+
+    async def run(self):
+        """Dispatch jobs at their due time until cancelled"""
+        listener = asyncio.create_task(
+            listen_forever(self.redis, self.wakeup_channel, lambda _: self._wakeup.set())
+        )
+        try:
+            while True:
+                # Cleared before looking for due jobs, so a wake-up
+                # published while we dispatch is not lost
+                self._wakeup.clear()
+                try:
+                    await self.dispatch_due()
+                    delay = await self.seconds_until_next_job()
+                except Exception as e:
+                    logger.error(f"Error in {self.wakeup_channel} dispatcher: {e}")
+                    delay = self.max_sleep
+
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            listener.cancel()
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth Latency Stats
+Percentile summaries of latency samples
+"""
+
+from typing import Dict, Iterable
+
+def percentiles(samples: Iterable[float]) -> Dict[str, float]:
+    """p50/p95/p99 of durations (seconds) in milliseconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    pick = lambda p: round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
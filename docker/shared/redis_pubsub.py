@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth Redis Pub/Sub
+Long-lived channel subscriptions that survive dropped Redis connections
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+
+async def listen_forever(
+    redis_client,
+    channel: str,
+    handler: Callable[[bytes], None],
+    on_subscribe: Optional[Callable[[], Awaitable[None]]] = None
+):
+    """Call `handler` with each message published on `channel` until cancelled
+
+    Resubscribes after a lost connection. Pub/sub does not replay messages
+    missed in between, so `on_subscribe` runs after every (re)subscription
+    to catch up on them.
+    """
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            if on_subscribe is not None:
+                await on_subscribe()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    handler(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Lost {channel} subscription, resubscribing: {e}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.reset()
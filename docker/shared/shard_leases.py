@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth Shard Leases
+Splits work into a fixed number of shards and hands them out to replicas
+through Redis leases, so each shard is worked on by exactly one replica
+"""
+
+import asyncio
+import math
+import os
+import socket
+import time
+import uuid
+import zlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from loguru import logger
+
+# KEYS: lease key
+# ARGV: owner, ttl in milliseconds
+# Extends a lease only if we still hold it
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: lease key
+# ARGV: owner
+# Drops a lease only if we still hold it
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def default_owner_id() -> str:
+    """Unique id for this worker process"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class ShardLeases:
+    """Redis-leased ownership of shards 0..shard_count-1"""
+
+    def __init__(
+        self,
+        redis_client,
+        name: str,
+        shard_count: int,
+        lease_ttl: float = 30.0,
+        heartbeat_interval: float = 10.0,
+        owner: Optional[str] = None
+    ):
+        self.redis = redis_client
+        self.name = name
+        self.shard_count = shard_count
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.owner = owner or default_owner_id()
+        self.workers_key = f"{name}:workers"
+        self.owned: Set[int] = set()
+        self._renew = redis_client.register_script(RENEW_SCRIPT)
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+
+    def lease_key(self, shard: int) -> str:
+        return f"{self.name}:shard:{shard}:lease"
+
+    def owns(self, shard: int) -> bool:
+        return shard in self.owned
+
+    async def live_workers(self) -> int:
+        """Record our heartbeat and count workers seen within the lease TTL"""
+        now = time.time()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.workers_key, {self.owner: now})
+            pipe.zremrangebyscore(self.workers_key, "-inf", now - self.lease_ttl)
+            pipe.zcard(self.workers_key)
+            results = await pipe.execute()
+        return max(1, results[-1])
+
+    def fair_share(self, workers: int) -> int:
+        return math.ceil(self.shard_count / workers)
+
+    async def renew(self) -> Set[int]:
+        """Extend every lease we hold; returns the shards we no longer own"""
+        ttl_ms = int(self.lease_ttl * 1000)
+        lost = set()
+        for shard in sorted(self.owned):
+            if not await self._renew(keys=[self.lease_key(shard)], args=[self.owner, ttl_ms]):
+                lost.add(shard)
+        self.owned -= lost
+        return lost
+
+    async def try_acquire(self, shard: int) -> bool:
+        acquired = await self.redis.set(
+            self.lease_key(shard), self.owner, nx=True, px=int(self.lease_ttl * 1000)
+        )
+        if acquired:
+            self.owned.add(shard)
+        return bool(acquired)
+
+    async def release(self, shard: int):
+        self.owned.discard(shard)
+        await self._release(keys=[self.lease_key(shard)], args=[self.owner])
+
+    @asynccontextmanager
+    async def hold(self, shard: int) -> AsyncIterator[bool]:
+        """Lease one shard for a one-off job, outside of rebalancing
+
+        Yields False straight away if the shard is already leased. Otherwise
+        the lease is renewed every heartbeat_interval until the block exits,
+        and then released.
+        """
+        key = self.lease_key(shard)
+        ttl_ms = int(self.lease_ttl * 1000)
+        if not await self.redis.set(key, self.owner, nx=True, px=ttl_ms):
+            yield False
+            return
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self.heartbeat_interval)
+                try:
+                    if not await self._renew(keys=[key], args=[self.owner, ttl_ms]):
+                        logger.warning(f"⚠️ Lost lease on {self.name} shard {shard}")
+                        return
+                except Exception as e:
+                    logger.error(f"Error renewing {self.name} shard {shard} lease: {e}")
+
+        renewer = asyncio.create_task(heartbeat())
+        try:
+            yield True
+        finally:
+            renewer.cancel()
+            await asyncio.shield(self._release(keys=[key], args=[self.owner]))
+
+    async def rebalance(
+        self,
+        on_acquired: Callable[[int], None],
+        on_lost: Callable[[int], None]
+    ):
+        """One heartbeat: renew, then claim or give back shards"""
+        for shard in await self.renew():
+            logger.warning(f"⚠️ Lost lease on {self.name} shard {shard}")
+            on_lost(shard)
+
+        share = self.fair_share(await self.live_workers())
+
+        # Give back the surplus so newly started workers get their share
+        for shard in sorted(self.owned, reverse=True)[:max(0, len(self.owned) - share)]:
+            on_lost(shard)
+            await self.release(shard)
+            logger.info(f"↪️ Released {self.name} shard {shard} for rebalancing")
+
+        if len(self.owned) >= share:
+            return
+
+        # Start scanning at a per-worker offset so replicas don't all race
+        # for the same free shards
+        start = zlib.crc32(self.owner.encode()) % self.shard_count
+        for i in range(self.shard_count):
+            shard = (start + i) % self.shard_count
+            if shard in self.owned:
+                continue
+            if await self.try_acquire(shard):
+                logger.info(f"🔒 Acquired {self.name} shard {shard}")
+                on_acquired(shard)
+                if len(self.owned) >= share:
+                    return
+
+    async def run(
+        self,
+        on_acquired: Callable[[int], None],
+        on_lost: Callable[[int], None]
+    ):
+        """Heartbeat and rebalance until cancelled, then release every lease"""
+        try:
+            while True:
+                try:
+                    await self.rebalance(on_acquired, on_lost)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error renewing {self.name} shard leases: {e}")
+                await asyncio.sleep(self.heartbeat_interval)
+        finally:
+            await asyncio.shield(self.release_all(on_lost))
+
+    async def release_all(self, on_lost: Optional[Callable[[int], None]] = None):
+        """Give up every lease, e.g. on shutdown, so others take over at once"""
+        for shard in sorted(self.owned):
+            if on_lost:
+                on_lost(shard)
+            await self.release(shard)
+        await self.redis.zrem(self.workers_key, self.owner)
+
+    async def assignments(self) -> Dict[int, Optional[str]]:
+        """Current owner of every shard (None if unclaimed)"""
+        owners = await self.redis.mget([self.lease_key(shard) for shard in range(self.shard_count)])
+        return {
+            shard: owner.decode() if isinstance(owner, bytes) else owner
+            for shard, owner in enumerate(owners)
+        }
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth VRBO Partner API Client
+Shared pooled HTTP client and token cache for services that talk to the
+VRBO/Expedia Partner API
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import aiohttp
+from loguru import logger
+
+from vrbo_rate_limiter import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    VRBORateLimiter,
+    parse_retry_after
+)
+
+# VRBO API Configuration
+VRBO_BASE_URL = os.getenv("VRBO_BASE_URL", "https://api.expediapartnercentral.com")
+
+# Connection pool and token tuning
+VRBO_POOL_SIZE = int(os.getenv("VRBO_POOL_SIZE", "20"))
+VRBO_DNS_CACHE_SECONDS = int(os.getenv("VRBO_DNS_CACHE_SECONDS", "300"))
+VRBO_KEEPALIVE_SECONDS = int(os.getenv("VRBO_KEEPALIVE_SECONDS", "60"))
+VRBO_REQUEST_TIMEOUT_SECONDS = int(os.getenv("VRBO_REQUEST_TIMEOUT_SECONDS", "30"))
+VRBO_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("VRBO_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+VRBO_MAX_THROTTLE_RETRIES = int(os.getenv("VRBO_MAX_THROTTLE_RETRIES", "3"))
+VRBO_MAX_SERVER_ERROR_RETRIES = int(os.getenv("VRBO_MAX_SERVER_ERROR_RETRIES", "2"))
+VRBO_SERVER_ERROR_BACKOFF_SECONDS = float(os.getenv("VRBO_SERVER_ERROR_BACKOFF_SECONDS", "0.5"))
+
+# Only these are safe to resend after a 5xx
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+class VRBOAuthError(Exception):
+    """Raised when no VRBO access token can be obtained"""
+
+class VRBOClient:
+    """Long-lived VRBO Partner API client"""
+
+    def __init__(
+        self,
+        client_id: Optional[str],
+        client_secret: Optional[str],
+        base_url: str = VRBO_BASE_URL,
+        pool_size: int = VRBO_POOL_SIZE,
+        refresh_margin: int = VRBO_TOKEN_REFRESH_MARGIN_SECONDS,
+        limiter: Optional[VRBORateLimiter] = None
+    ):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.refresh_margin = refresh_margin
+        self.limiter = limiter
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.client_id and self.client_secret)
+
+    def session(self) -> aiohttp.ClientSession:
+        """Get the shared session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                ttl_dns_cache=VRBO_DNS_CACHE_SECONDS,
+                keepalive_timeout=VRBO_KEEPALIVE_SECONDS
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=VRBO_REQUEST_TIMEOUT_SECONDS)
+            )
+        return self._session
+
+    async def get_token(self) -> Optional[str]:
+        """Get a valid access token, refreshing it if needed"""
+        now = time.monotonic()
+
+        if self._token and now < self._token_expires_at:
+            if now >= self._token_expires_at - self.refresh_margin:
+                # Still valid: refresh in the background and keep serving it
+                self._start_refresh()
+            return self._token
+
+        # Shield the shared refresh so one cancelled caller cannot abort it
+        return await asyncio.shield(self._start_refresh())
+
+    def invalidate_token(self):
+        """Drop the cached token, e.g. after the API rejects it"""
+        self._token = None
+        self._token_expires_at = 0.0
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_token())
+        return self._refresh_task
+
+    async def _refresh_token(self) -> Optional[str]:
+        auth_url = f"{self.base_url}/authentication/v1/token"
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret
+        }
+
+        try:
+            async with self._send("POST", auth_url, PRIORITY_INTERACTIVE, data=data) as response:
+                if response.status != 200:
+                    logger.error(f"VRBO auth failed: {response.status}")
+                    return None
+
+                result = await response.json()
+        except aiohttp.ClientError as e:
+            logger.error(f"VRBO auth request failed: {e}")
+            return None
+
+        self._token = result.get("access_token")
+        self._token_expires_at = time.monotonic() + int(result.get("expires_in", 3600))
+        logger.info("🔑 Refreshed VRBO access token")
+        return self._token
+
+    @asynccontextmanager
+    async def request(
+        self,
+        method: str,
+        path: str,
+        priority: str = PRIORITY_BACKGROUND,
+        **kwargs
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Make an authenticated request to the Partner API"""
+        token = await self.get_token()
+        if not token:
+            raise VRBOAuthError("Failed to get VRBO access token")
+
+        headers = {"Authorization": f"Bearer {token}", **kwargs.pop("headers", {})}
+        url = f"{self.base_url}{path}"
+
+        async with self._send(method, url, priority, headers=headers, **kwargs) as response:
+            if response.status == 401:
+                self.invalidate_token()
+            yield response
+
+    @asynccontextmanager
+    async def _send(self, method: str, url: str, priority: str, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Send a request through the rate limiter, retrying 429s and idempotent 5xx"""
+        attempt = 0
+        server_errors = 0
+        while True:
+            if self.limiter:
+                await self.limiter.acquire(priority)
+
+            response = await self.session().request(method, url, **kwargs)
+            if response.status == 429 and attempt < VRBO_MAX_THROTTLE_RETRIES:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.release()
+                if self.limiter:
+                    # Blocks every replica until Retry-After has passed
+                    await self.limiter.throttled(retry_after)
+                else:
+                    await asyncio.sleep(retry_after)
+                attempt += 1
+                continue
+
+            if (
+                response.status >= 500
+                and method.upper() in IDEMPOTENT_METHODS
+                and server_errors < VRBO_MAX_SERVER_ERROR_RETRIES
+            ):
+                response.release()
+                await asyncio.sleep(VRBO_SERVER_ERROR_BACKOFF_SECONDS * 2 ** server_errors)
+                server_errors += 1
+                continue
+
+            try:
+                yield response
+            finally:
+                response.release()
+            return
+
+    async def close(self):
+        """Close the shared session"""
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        if self._session and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth VRBO Rate Limiter
+Redis-backed token bucket shared by every service and replica that calls
+the VRBO/Expedia Partner API
+"""
+
+import asyncio
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+# Partner API quota: sustained requests per second and burst size. Background
+# traffic may not take the last VRBO_RATE_LIMIT_INTERACTIVE_RESERVE tokens,
+# so guest-facing sends still get through while a sync is saturating the API.
+VRBO_RATE_LIMIT_PER_SECOND = float(os.getenv("VRBO_RATE_LIMIT_PER_SECOND", "5"))
+VRBO_RATE_LIMIT_BURST = int(os.getenv("VRBO_RATE_LIMIT_BURST", "10"))
+VRBO_RATE_LIMIT_INTERACTIVE_RESERVE = int(os.getenv("VRBO_RATE_LIMIT_INTERACTIVE_RESERVE", "3"))
+VRBO_RATE_LIMIT_DEFAULT_RETRY_AFTER = float(os.getenv("VRBO_RATE_LIMIT_DEFAULT_RETRY_AFTER", "5"))
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+
+RATE_LIMIT_KEY_PREFIX = "vrbo:ratelimit"
+
+# KEYS: bucket hash, blocked-until key
+# ARGV: rate per second, capacity, reserve kept back for this caller
+# Returns {acquired (0/1), wait in ms}. Redis server time is used so every
+# replica refills the bucket against the same clock.
+ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+
+local blocked_until = tonumber(redis.call('GET', KEYS[2]) or '0')
+if blocked_until > now then
+    return {0, blocked_until - now}
+end
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+
+local acquired = 0
+local wait = 0
+if tokens - 1 >= reserve then
+    tokens = tokens - 1
+    acquired = 1
+else
+    wait = math.ceil((reserve + 1 - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 60000)
+return {acquired, wait}
+"""
+
+# KEYS: blocked-until key, throttled counter
+# ARGV: retry after in ms
+# Pushes the shared block forward (never back) and counts the 429
+THROTTLE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local until_ms = now + tonumber(ARGV[1])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if until_ms > current then
+    redis.call('SET', KEYS[1], until_ms, 'PX', tonumber(ARGV[1]))
+end
+redis.call('INCR', KEYS[2])
+return until_ms
+"""
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """Parse a Retry-After header (delta seconds or HTTP date) into seconds"""
+    if not value:
+        return VRBO_RATE_LIMIT_DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return VRBO_RATE_LIMIT_DEFAULT_RETRY_AFTER
+
+class VRBORateLimiter:
+    """Distributed token bucket for outbound Partner API calls, shared by every replica"""
+
+    def __init__(
+        self,
+        redis_client,
+        rate: float = VRBO_RATE_LIMIT_PER_SECOND,
+        capacity: int = VRBO_RATE_LIMIT_BURST,
+        interactive_reserve: int = VRBO_RATE_LIMIT_INTERACTIVE_RESERVE
+    ):
+        self.redis = redis_client
+        self.rate = rate
+        self.capacity = capacity
+        self.interactive_reserve = min(interactive_reserve, max(0, capacity - 1))
+        self.bucket_key = f"{RATE_LIMIT_KEY_PREFIX}:bucket"
+        self.blocked_key = f"{RATE_LIMIT_KEY_PREFIX}:blocked_until"
+        self.throttled_key = f"{RATE_LIMIT_KEY_PREFIX}:throttled"
+        self._acquire = redis_client.register_script(ACQUIRE_SCRIPT)
+        self._throttle = redis_client.register_script(THROTTLE_SCRIPT)
+
+    async def acquire(self, priority: str = PRIORITY_BACKGROUND):
+        """Wait until a request slot is available for this priority"""
+        reserve = 0 if priority == PRIORITY_INTERACTIVE else self.interactive_reserve
+
+        while True:
+            acquired, wait_ms = await self._acquire(
+                keys=[self.bucket_key, self.blocked_key],
+                args=[self.rate, self.capacity, reserve]
+            )
+            if acquired:
+                return
+
+            # Jitter so waiting replicas do not retry in lockstep
+            await asyncio.sleep(int(wait_ms) / 1000 * random.uniform(1.0, 1.2))
+
+    async def throttled(self, retry_after: float):
+        """Record a 429 so every caller backs off for retry_after seconds"""
+        retry_after_ms = max(1, int(retry_after * 1000))
+        await self._throttle(keys=[self.blocked_key, self.throttled_key], args=[retry_after_ms])
+        logger.warning(f"⏳ VRBO API throttled us, backing off for {retry_after:.1f}s")
+
+    async def state(self) -> Dict[str, Any]:
+        """Current limiter state for monitoring endpoints"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(self.bucket_key, "tokens", "ts")
+            pipe.pttl(self.blocked_key)
+            pipe.get(self.throttled_key)
+            pipe.time()
+            (tokens, ts), blocked_ms, throttled, (seconds, micros) = await pipe.execute()
+
+        now_ms = seconds * 1000 + micros // 1000
+        available = float(self.capacity)
+        if tokens is not None and ts is not None:
+            elapsed_ms = max(0, now_ms - int(ts))
+            available = min(self.capacity, float(tokens) + elapsed_ms * self.rate / 1000)
+
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.capacity,
+            "interactive_reserve": self.interactive_reserve,
+            "tokens_available": round(available, 2),
+            "blocked_for_seconds": round(max(0, blocked_ms) / 1000, 3),
+            "throttled_total": int(throttled or 0)
+        }
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth Work Queue
+Reliable Redis priority queue worked by a pool of concurrent workers, safe
+across several replicas
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from delayed_jobs import DelayedDispatcher
+from latency_stats import percentiles
+from redis_pubsub import listen_forever
+
+DueJobs = List[Tuple[bytes, float]]
+
+# Recent claim wait times kept per priority class for /stats percentiles
+WAIT_SAMPLES_PER_CLASS = 1000
+
+# Queue layout under a key prefix P:
+#   P:meta            hash  member -> "enqueued_at|class|sequence|group"
+#   P:class:<class>   zset  ready members of a class, by enqueue time
+#   P:groups          zset  "<group>\0<sequence>\0<member>" for every member
+#                           of a group (booking), all at score 0 so each
+#                           group's entries sort together in push order
+#   P:group_sequence  counter for the sequence numbers in P:groups
+#   P:processing      zset  claimed members, by visibility deadline
+#   P:wrr             hash  class -> smooth weighted round-robin credit
+#   P:deferred        set   members waiting on a delayed retry
+# Only the head of a group is ever ready, so a group's messages are
+# claimed one at a time and in the order they were pushed.
+#
+# Every queue script gets the queue's keys (WorkQueue.script_keys) as
+# KEYS: meta, deferred, groups, group sequence, processing, wrr, then the
+# ready set of each class, then any keys of its own. ARGV
+# (WorkQueue.script_args) starts with the class count, the class names in
+# the order of their ready sets and the default class, followed by the
+# script's own arguments. Members whose class is not configured are
+# queued in the default class.
+QUEUE_FUNCTIONS = """
+local meta_key, deferred_key, groups_key, sequence_key, processing_key, wrr_key =
+    KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6]
+local class_count = tonumber(ARGV[1])
+local class_names, class_keys = {}, {}
+for i = 1, class_count do
+    class_names[i] = ARGV[1 + i]
+    class_keys[ARGV[1 + i]] = KEYS[6 + i]
+end
+local default_class = ARGV[class_count + 2]
+local args, own_keys = {}, {}
+for i = class_count + 3, #ARGV do
+    table.insert(args, ARGV[i])
+end
+for i = class_count + 7, #KEYS do
+    table.insert(own_keys, KEYS[i])
+end
+
+local SEQUENCE_WIDTH = 16
+
+local function parse_meta(meta)
+    return string.match(meta, '^([^|]*)|([^|]*)|([^|]*)|(.*)$')
+end
+
+local function class_key(class)
+    return class_keys[class] or class_keys[default_class]
+end
+
+local function group_entry(group, sequence, member)
+    return group .. '\\0' .. sequence .. '\\0' .. member
+end
+
+local function group_head(group)
+    local head = redis.call('ZRANGEBYLEX', groups_key, '[' .. group .. '\\0', '(' .. group .. '\\1', 'LIMIT', 0, 1)
+    if #head == 0 then
+        return nil
+    end
+    return string.sub(head[1], #group + SEQUENCE_WIDTH + 3)
+end
+
+local function push(member, class, group, enqueued_at)
+    if redis.call('SREM', deferred_key, member) == 1 then
+        local meta = redis.call('HGET', meta_key, member)
+        if meta then
+            local _, _, sequence, deferred_group = parse_meta(meta)
+            redis.call('HSET', meta_key, member, enqueued_at .. '|' .. class .. '|' .. sequence .. '|' .. deferred_group)
+            redis.call('ZADD', class_key(class), enqueued_at, member)
+            return 1
+        end
+    end
+    if redis.call('HEXISTS', meta_key, member) == 1 then
+        return 0
+    end
+    local sequence = ''
+    if group ~= '' then
+        sequence = string.format('%0' .. SEQUENCE_WIDTH .. 'd', redis.call('INCR', sequence_key))
+        redis.call('ZADD', groups_key, 0, group_entry(group, sequence, member))
+    end
+    redis.call('HSET', meta_key, member, enqueued_at .. '|' .. class .. '|' .. sequence .. '|' .. group)
+    if group == '' or group_head(group) == member then
+        redis.call('ZADD', class_key(class), enqueued_at, member)
+    end
+    return 1
+end
+"""
+
+# ARGV: member, class, group ('' for none), enqueued at
+# Queues a message unless it is already queued. Returns 1 if it was added.
+PUSH_SCRIPT = QUEUE_FUNCTIONS + """
+return push(args[1], args[2], args[3], args[4])
+"""
+
+# ARGV: now, visibility deadline, max wait, then the weight of each class
+# Picks a class, pops its oldest ready message and records it as in flight
+# until the deadline. A class whose oldest message has waited max wait
+# seconds goes first (oldest first); otherwise classes are picked by
+# smooth weighted round robin over the classes with ready messages, so
+# each gets its weight's share of claims and none is starved. Returns
+# {member, class, enqueued at} or an empty list.
+CLAIM_SCRIPT = QUEUE_FUNCTIONS + """
+local now, max_wait = tonumber(args[1]), tonumber(args[3])
+local chosen, oldest
+local ready = {}
+for i, class in ipairs(class_names) do
+    local head = redis.call('ZRANGE', class_keys[class], 0, 0, 'WITHSCORES')
+    if #head > 0 then
+        table.insert(ready, {class, tonumber(args[3 + i])})
+        local enqueued_at = tonumber(head[2])
+        if now - enqueued_at >= max_wait and (oldest == nil or enqueued_at < oldest) then
+            chosen, oldest = class, enqueued_at
+        end
+    end
+end
+if #ready == 0 then
+    return {}
+end
+if not chosen then
+    local total, best = 0, nil
+    for _, class in ipairs(ready) do
+        local credit = redis.call('HINCRBY', wrr_key, class[1], class[2])
+        total = total + class[2]
+        if best == nil or credit > best then
+            chosen, best = class[1], credit
+        end
+    end
+    redis.call('HINCRBY', wrr_key, chosen, -total)
+end
+local head = redis.call('ZPOPMIN', class_keys[chosen])
+redis.call('ZADD', processing_key, args[2], head[1])
+return {head[1], chosen, head[2]}
+"""
+
+# ARGV: member
+# Marks a claimed message done and makes the next message of its group
+# ready. Returns 1 if the message was known.
+ACK_SCRIPT = QUEUE_FUNCTIONS + """
+local member = args[1]
+redis.call('ZREM', processing_key, member)
+local meta = redis.call('HGET', meta_key, member)
+if not meta then
+    return 0
+end
+redis.call('HDEL', meta_key, member)
+local _, _, sequence, group = parse_meta(meta)
+if group ~= '' then
+    redis.call('ZREM', groups_key, group_entry(group, sequence, member))
+    local next_member = group_head(group)
+    if next_member then
+        local next_meta = redis.call('HGET', meta_key, next_member)
+        if next_meta then
+            local enqueued_at, class = parse_meta(next_meta)
+            redis.call('ZADD', class_key(class), enqueued_at, next_member)
+        end
+    end
+end
+return 1
+"""
+
+# ARGV: member
+# Takes a claimed message out of flight without making it ready, until it
+# is pushed again (by a DelayedWorkMover). It stays at the head of its
+# group, so later messages of the group keep waiting behind it.
+DEFER_SCRIPT = QUEUE_FUNCTIONS + """
+local member = args[1]
+redis.call('ZREM', processing_key, member)
+if redis.call('HEXISTS', meta_key, member) == 0 then
+    return 0
+end
+redis.call('SADD', deferred_key, member)
+return 1
+"""
+
+# ARGV: now
+# Makes messages whose visibility deadline has passed ready again in their
+# class, keeping their enqueue time. Returns how many were requeued.
+REAP_SCRIPT = QUEUE_FUNCTIONS + """
+local now = args[1]
+local expired = redis.call('ZRANGEBYSCORE', processing_key, '-inf', now)
+for _, member in ipairs(expired) do
+    redis.call('ZREM', processing_key, member)
+    local meta = redis.call('HGET', meta_key, member)
+    if meta then
+        local enqueued_at, class = parse_meta(meta)
+        redis.call('ZADD', class_key(class), enqueued_at, member)
+    else
+        push(member, default_class, '', now)
+    end
+end
+return #expired
+"""
+
+# Own KEYS: delayed sorted set, ready hash (member -> "class|group")
+# ARGV: now, batch size, queue wake-up channel
+# Pushes due messages onto the queue, with the class and group they were
+# scheduled with and their due time as enqueue time, in one step, so each
+# message is moved by exactly one replica, and wakes the queue's workers.
+# Returns a flat member/due time list of what was moved.
+MOVE_DUE_SCRIPT = QUEUE_FUNCTIONS + """
+local delayed_key, ready_key = own_keys[1], own_keys[2]
+local due = redis.call('ZRANGEBYSCORE', delayed_key, '-inf', args[1], 'WITHSCORES', 'LIMIT', 0, tonumber(args[2]))
+for i = 1, #due, 2 do
+    local class, group = default_class, ''
+    local ready = redis.call('HGET', ready_key, due[i])
+    if ready then
+        class, group = string.match(ready, '^([^|]*)|(.*)$')
+    end
+    redis.call('ZREM', delayed_key, due[i])
+    redis.call('HDEL', ready_key, due[i])
+    push(due[i], class, group, due[i + 1])
+end
+if #due > 0 then
+    redis.call('PUBLISH', args[3], args[1])
+end
+return due
+"""
+
+class WorkQueue:
+    """Weighted-fair priority queue with per-group ordering and at-least-once delivery"""
+
+    def __init__(
+        self,
+        redis_client,
+        key: str,
+        classes: Dict[str, int],
+        max_wait: float = 300.0,
+        default_class: Optional[str] = None,
+        visibility_timeout: float = 120.0,
+        max_sleep: float = 30.0
+    ):
+        self.redis = redis_client
+        self.key = key
+        self.classes = classes
+        self.max_wait = max_wait
+        self.default_class = default_class or next(iter(classes))
+        if self.default_class not in classes:
+            raise ValueError(f"Default class {self.default_class!r} is not one of the queue's classes")
+        self.meta_key = f"{key}:meta"
+        self.groups_key = f"{key}:groups"
+        self.sequence_key = f"{key}:group_sequence"
+        self.processing_key = f"{key}:processing"
+        self.wrr_key = f"{key}:wrr"
+        self.deferred_key = f"{key}:deferred"
+        self.wakeup_channel = f"{key}:wakeup"
+        self.visibility_timeout = visibility_timeout
+        self.max_sleep = max_sleep
+        self.waits: Dict[str, Deque[float]] = {
+            name: deque(maxlen=WAIT_SAMPLES_PER_CLASS) for name in classes
+        }
+        self._push = redis_client.register_script(PUSH_SCRIPT)
+        self._claim = redis_client.register_script(CLAIM_SCRIPT)
+        self._ack = redis_client.register_script(ACK_SCRIPT)
+        self._defer = redis_client.register_script(DEFER_SCRIPT)
+        self._reap = redis_client.register_script(REAP_SCRIPT)
+        self._waiters: List[asyncio.Event] = []
+
+    def class_key(self, priority_class: str) -> str:
+        return f"{self.key}:class:{priority_class}"
+
+    def script_keys(self, *own_keys: str) -> List[str]:
+        """KEYS for a queue script: the queue's keys, then the script's own"""
+        return [
+            self.meta_key, self.deferred_key, self.groups_key, self.sequence_key,
+            self.processing_key, self.wrr_key,
+            *(self.class_key(name) for name in self.classes),
+            *own_keys
+        ]
+
+    def script_args(self, *own_args) -> List[Any]:
+        """ARGV for a queue script: the class names and default class, then the script's own"""
+        return [len(self.classes), *self.classes, self.default_class, *own_args]
+
+    async def push_commands(
+        self,
+        pipe,
+        member,
+        priority_class: str,
+        group: Optional[str] = None,
+        enqueued_at: Optional[float] = None,
+        wake: bool = True
+    ):
+        """Queue a message (no-op if already queued) and wake idle workers, as part of `pipe`"""
+        enqueued_at = time.time() if enqueued_at is None else enqueued_at
+        await self._push(
+            keys=self.script_keys(),
+            args=self.script_args(member, priority_class, group or "", enqueued_at),
+            client=pipe
+        )
+        if wake:
+            pipe.publish(self.wakeup_channel, enqueued_at)
+
+    async def push_many_commands(self, pipe, messages: Iterable[Tuple[Any, str, Optional[str]]]):
+        """Queue (member, class, group) messages with a single wake-up, as part of `pipe`"""
+        now = time.time()
+        for member, priority_class, group in messages:
+            await self.push_commands(pipe, member, priority_class, group, enqueued_at=now, wake=False)
+        pipe.publish(self.wakeup_channel, now)
+
+    async def ack_commands(self, pipe, member):
+        """Mark a claimed message done, as part of `pipe`"""
+        await self._ack(keys=self.script_keys(), args=self.script_args(member), client=pipe)
+
+    async def defer_commands(self, pipe, member):
+        """Hold a claimed message, still blocking its group, until it is pushed again, as part of `pipe`"""
+        await self._defer(keys=self.script_keys(), args=self.script_args(member), client=pipe)
+
+    async def push(self, member, priority_class: str, group: Optional[str] = None):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            await self.push_commands(pipe, member, priority_class, group)
+            await pipe.execute()
+
+    async def ack(self, member):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            await self.ack_commands(pipe, member)
+            await pipe.execute()
+
+    async def claim(self) -> Optional[Tuple[bytes, str, float]]:
+        """Claim the next message; returns (member, class, enqueued at)"""
+        now = time.time()
+        head = await self._claim(
+            keys=self.script_keys(),
+            args=self.script_args(now, now + self.visibility_timeout, self.max_wait, *self.classes.values())
+        )
+        if not head:
+            return None
+
+        member, priority_class, enqueued_at = head[0], head[1].decode(), float(head[2])
+        if priority_class in self.waits:
+            self.waits[priority_class].append(max(0.0, now - enqueued_at))
+        return member, priority_class, enqueued_at
+
+    async def reap(self, now: Optional[float] = None) -> int:
+        """Requeue messages whose visibility timeout expired"""
+        now = time.time() if now is None else now
+        requeued = await self._reap(keys=self.script_keys(), args=self.script_args(now))
+        if requeued:
+            logger.warning(f"⚠️ Requeued {requeued} {self.key} messages whose worker timed out")
+            await self.redis.publish(self.wakeup_channel, now)
+        return requeued
+
+    async def depth(self) -> int:
+        """Messages queued and not in flight, including those waiting on their group"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hlen(self.meta_key)
+            pipe.zcard(self.processing_key)
+            queued, in_flight = await pipe.execute()
+        return max(0, queued - in_flight)
+
+    async def in_flight(self) -> int:
+        return await self.redis.zcard(self.processing_key)
+
+    async def stats(self) -> Dict[str, Any]:
+        """Per-class ready depth, weight and claim wait percentiles (this replica)"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for name in self.classes:
+                pipe.zcard(self.class_key(name))
+            pipe.hlen(self.meta_key)
+            pipe.zcard(self.processing_key)
+            pipe.scard(self.deferred_key)
+            *ready, queued, in_flight, deferred = await pipe.execute()
+
+        return {
+            "classes": {
+                name: {
+                    "weight": weight,
+                    "ready": depth,
+                    "wait_ms": percentiles(self.waits[name])
+                }
+                for (name, weight), depth in zip(self.classes.items(), ready)
+            },
+            "waiting_on_group": max(0, queued - in_flight - deferred - sum(ready)),
+            "in_flight": in_flight,
+            "deferred": deferred,
+            "max_wait_seconds": self.max_wait
+        }
+
+    async def run(
+        self,
+        handler: Callable[[bytes, str], Awaitable[None]],
+        workers: int,
+        reaper_interval: float = 15.0
+    ):
+        """Work the queue with `workers` concurrent workers until cancelled"""
+        tasks = [asyncio.create_task(listen_forever(self.redis, self.wakeup_channel, self._wake_workers))]
+        tasks.append(asyncio.create_task(self._reaper(reaper_interval)))
+        tasks.extend(asyncio.create_task(self._worker(handler)) for _ in range(max(1, workers)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _worker(self, handler: Callable[[bytes, str], Awaitable[None]]):
+        wakeup = asyncio.Event()
+        self._waiters.append(wakeup)
+        try:
+            while True:
+                wakeup.clear()
+                try:
+                    claimed = await self.claim()
+                except Exception as e:
+                    logger.error(f"Error claiming from {self.key}: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                if claimed is None:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), timeout=self.max_sleep)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                member, priority_class, _ = claimed
+                try:
+                    await handler(member, priority_class)
+                except Exception as e:
+                    logger.error(
+                        f"❌ Failed to handle {self.key} message, "
+                        f"retrying after {self.visibility_timeout:.0f}s: {e}"
+                    )
+        finally:
+            self._waiters.remove(wakeup)
+
+    async def _reaper(self, interval: float):
+        while True:
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Error reaping {self.processing_key}: {e}")
+            await asyncio.sleep(interval)
+
+    def _wake_workers(self, _):
+        for waiter in self._waiters:
+            waiter.set()
+
+class DelayedWorkMover(DelayedDispatcher):
+    """Moves messages from a delayed sorted set onto a WorkQueue when due"""
+
+    def __init__(
+        self,
+        redis_client,
+        key: str,
+        queue: WorkQueue,
+        batch_size: int = 100,
+        max_sleep: float = 60.0
+    ):
+        super().__init__(redis_client, f"{key}:wakeup", max_sleep=max_sleep)
+        self.key = key
+        self.batch_size = batch_size
+        self.queue = queue
+        self.ready_key = f"{key}:ready"
+        self._move_due = redis_client.register_script(MOVE_DUE_SCRIPT)
+
+    def schedule_commands(
+        self,
+        pipe,
+        member,
+        due_at: float,
+        priority_class: str,
+        group: Optional[str] = None
+    ):
+        """Schedule a message for `due_at` and wake the movers, as part of `pipe`"""
+        pipe.zadd(self.key, {member: due_at})
+        pipe.hset(self.ready_key, member, f"{priority_class}|{group or ''}")
+        pipe.publish(self.wakeup_channel, due_at)
+
+    async def retry_commands(self, pipe, member, due_at: float, priority_class: str):
+        """Requeue a claimed message at `due_at`, keeping its place in its group, as part of `pipe`"""
+        await self.queue.defer_commands(pipe, member)
+        self.schedule_commands(pipe, member, due_at, priority_class)
+
+    async def schedule(self, member, due_at: float, priority_class: str, group: Optional[str] = None):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self.schedule_commands(pipe, member, due_at, priority_class, group)
+            await pipe.execute()
+
+    async def claim_due(self, now: Optional[float] = None) -> DueJobs:
+        """Atomically move up to batch_size due messages onto the queue"""
+        now = time.time() if now is None else now
+        flat = await self._move_due(
+            keys=self.queue.script_keys(self.key, self.ready_key),
+            args=self.queue.script_args(now, self.batch_size, self.queue.wakeup_channel)
+        )
+        return [(flat[i], float(flat[i + 1])) for i in range(0, len(flat), 2)]
+
+    async def dispatch_due(self) -> int:
+        """Move every message that is currently due"""
+        moved = 0
+        while True:
+            batch = await self.claim_due()
+            if batch:
+                lag = time.time() - min(due_at for _, due_at in batch)
+                logger.info(f"📤 Moved {len(batch)} {self.key} to {self.queue.key} ({lag * 1000:.0f}ms after due)")
+            moved += len(batch)
+            if len(batch) < self.batch_size:
+                return moved
+
+    async def seconds_until_next_job(self) -> float:
+        head = await self.redis.zrange(self.key, 0, 0, withscores=True)
+        if not head:
+            return self.max_sleep
+        return min(self.max_sleep, max(0.0, head[0][1] - time.time()))
@@ -0,0 +1,38 @@
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import fakeredis
+import pytest
+import redis.asyncio
+
+# Services import their sibling and shared modules by bare name, as laid
+# out in their Docker images
+DOCKER_DIR = Path(__file__).resolve().parent.parent
+for directory in ("shared", "vrbo-automation", "guest-communication"):
+    sys.path.insert(0, str(DOCKER_DIR / directory))
+
+# Tests that need Postgres run against TEST_DATABASE_URL
+# (postgresql+asyncpg://...), a scratch database initialised from sql/init
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+requires_database = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+@pytest.fixture
+def load_service(monkeypatch, tmp_path):
+    """Import a fresh copy of a service's main.py, backed by its own fakeredis"""
+    def load(directory: str, **env: str):
+        monkeypatch.setenv("LOG_DIR", str(tmp_path))
+        monkeypatch.setenv("DATABASE_URL", TEST_DATABASE_URL or "postgresql+asyncpg://localhost/unused")
+        monkeypatch.setenv("VRBO_JOURNAL_DIR", "")
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        server = fakeredis.FakeServer()
+        monkeypatch.setattr(redis.asyncio, "from_url", lambda *args, **kwargs: fakeredis.aioredis.FakeRedis(server=server))
+
+        name = f"{directory.replace('-', '_')}_main"
+        spec = importlib.util.spec_from_file_location(name, DOCKER_DIR / directory / "main.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    return load
@@ -0,0 +1,146 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+
+from availability_index import AvailabilityIndex
+
+def day(n: int) -> date:
+    return date(2025, 1, 1) + timedelta(days=n)
+
+def test_overlap_is_half_open():
+    index = AvailabilityIndex()
+    index.upsert("B1", "P1", day(10), day(15), "confirmed")
+
+    assert index.overlapping("P1", day(5), day(10)) == []
+    assert index.overlapping("P1", day(15), day(20)) == []
+    assert index.overlapping("P1", day(14), day(15)) == ["B1"]
+    assert index.overlapping("P1", day(9), day(11)) == ["B1"]
+    assert index.overlapping("P1", day(11), day(12)) == ["B1"]
+    assert index.is_available("P1", day(15), day(16))
+    assert index.is_available("P2", day(10), day(15))
+
+def test_same_day_turnover_is_not_a_conflict():
+    index = AvailabilityIndex()
+    assert index.upsert("B1", "P1", day(0), day(3), "confirmed") == []
+    assert index.upsert("B2", "P1", day(3), day(6), "confirmed") == []
+    assert index.property_conflicts() == []
+
+def test_conflicts_are_added_and_removed():
+    index = AvailabilityIndex()
+    index.upsert("B1", "P1", day(0), day(10), "confirmed")
+    index.upsert("B3", "P2", day(0), day(10), "confirmed")
+    assert sorted(index.upsert("B2", "P1", day(5), day(8), "confirmed")) == ["B1"]
+    assert sorted(index.upsert("B4", "P1", day(7), day(12), "confirmed")) == ["B1", "B2"]
+
+    assert index.conflict_count() == 3
+    assert index.property_conflicts("P1") == [
+        {"property_id": "P1", "booking_id": "B1", "conflicts_with": "B2"},
+        {"property_id": "P1", "booking_id": "B1", "conflicts_with": "B4"},
+        {"property_id": "P1", "booking_id": "B2", "conflicts_with": "B4"}
+    ]
+    assert index.property_conflicts("P2") == []
+
+    # Moving a booking away drops its conflicts
+    assert index.upsert("B4", "P1", day(12), day(14), "confirmed") == []
+    assert index.conflict_count() == 1
+
+    # So does cancelling it
+    assert index.upsert("B2", "P1", day(5), day(8), "cancelled") == []
+    assert index.conflict_count() == 0
+    assert index.overlapping("P1", day(5), day(8)) == ["B1"]
+
+def test_non_blocking_and_incomplete_bookings_are_ignored():
+    index = AvailabilityIndex()
+    index.upsert("B1", "P1", day(0), day(5), "pending")
+    index.upsert("B2", None, day(0), day(5), "confirmed")
+    index.upsert("B3", "P1", None, day(5), "confirmed")
+    assert len(index) == 0
+    assert index.is_available("P1", day(0), day(5))
+
+def test_matches_brute_force():
+    rng = random.Random(7)
+    index = AvailabilityIndex()
+    stays = {}
+    for n in range(2000):
+        booking_id = f"B{rng.randrange(300)}"
+        if rng.random() < 0.2:
+            index.remove(booking_id)
+            stays.pop(booking_id, None)
+            continue
+        start = rng.randrange(365)
+        stay = (start, start + rng.randint(1, 30))
+        index.upsert(booking_id, "P1", day(stay[0]), day(stay[1]), "confirmed")
+        stays[booking_id] = stay
+
+    for _ in range(500):
+        start = rng.randrange(400)
+        end = start + rng.randint(1, 20)
+        expected = {booking_id for booking_id, (a, b) in stays.items() if a < end and b > start}
+        assert set(index.overlapping("P1", day(start), day(end))) == expected
+
+    expected_pairs = {
+        tuple(sorted((first, second)))
+        for first, (a, b) in stays.items()
+        for second, (c, d) in stays.items()
+        if first != second and a < d and c < b
+    }
+    assert {(c["booking_id"], c["conflicts_with"]) for c in index.property_conflicts()} == expected_pairs
+
+def test_long_early_stay_does_not_make_lookups_linear():
+    index = AvailabilityIndex()
+    index.upsert("LONG", "P1", day(0), day(20_000 * 3), "confirmed")
+    for n in range(20_000):
+        index.upsert(f"B{n}", "P1", day(n * 3), day(n * 3 + 2), "confirmed")
+
+    started = time.perf_counter()
+    for n in range(1000):
+        found = index.overlapping("P1", day(n * 48 + 2), day(n * 48 + 3))
+        assert found == ["LONG"]
+    assert time.perf_counter() - started < 0.5
+
+class FakeBookingsResult:
+    def __init__(self, partitions, between_partitions):
+        self._partitions = partitions
+        self._between_partitions = between_partitions
+
+    async def partitions(self):
+        for rows in self._partitions:
+            yield rows
+            self._between_partitions()
+
+class FakeEngine:
+    def __init__(self, result):
+        self.result = result
+
+    @asynccontextmanager
+    async def connect(self):
+        yield self
+
+    async def stream(self, query):
+        return self.result
+
+def test_reload_keeps_serving_and_replays_live_changes(load_service):
+    vrbo = load_service("vrbo-automation")
+    vrbo.availability_index.upsert("OLD", "P1", day(0), day(3), "confirmed")
+    served_during_load = []
+
+    def between_partitions():
+        served_during_load.append(vrbo.availability_index.overlapping("P1", day(0), day(3)))
+        # Another replica cancels B1 and books B3 while the load is running
+        vrbo.upsert_availability(("B1", "P1", day(10), day(15), "cancelled"))
+        vrbo.upsert_availability(("B3", "P2", day(0), day(5), "confirmed"))
+
+    vrbo.engine = FakeEngine(FakeBookingsResult(
+        [[("B1", "P1", day(10), day(15), "confirmed")], [("B2", "P1", day(20), day(25), "confirmed")]],
+        between_partitions
+    ))
+
+    loaded = asyncio.run(vrbo.load_availability_index())
+    index = vrbo.availability_index
+    assert loaded == 2
+    assert served_during_load == [["OLD"], ["OLD"]]
+    assert index.overlapping("P1", day(0), day(30)) == ["B2"]
+    assert index.overlapping("P2", day(0), day(5)) == ["B3"]
+    assert vrbo.availability_index_reload_changes is None
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import time
+
+import fakeredis
+
+from dead_letters import DeadLetterFilter, DeadLetterQueue
+from work_queue import WorkQueue
+
+CLASSES = {"high": 6, "normal": 3, "low": 1}
+
+def make_dead_letters() -> DeadLetterQueue:
+    redis_client = fakeredis.aioredis.FakeRedis()
+    queue = WorkQueue(redis_client, "queue", classes=CLASSES, default_class="normal")
+    return DeadLetterQueue(redis_client, queue, "payloads", lambda priority: priority if priority in CLASSES else "normal")
+
+async def dead_letter(dead_letters: DeadLetterQueue, messages):
+    async with dead_letters.redis.pipeline(transaction=True) as pipe:
+        for message_id, booking_id, error in messages:
+            message_data = {"message_id": message_id, "booking_id": booking_id, "priority": "high", "attempts": 3}
+            dead_letters.add_commands(pipe, message_data, error)
+        await pipe.execute()
+
+def test_list_pages_through_matching_dead_letters():
+    async def run():
+        dead_letters = make_dead_letters()
+        await dead_letter(dead_letters, [
+            (f"m{n}", "B1", "503 Service Unavailable" if n % 2 else "400 Bad Request") for n in range(5)
+        ])
+        first = await dead_letters.list(DeadLetterFilter(error="503"), limit=1)
+        second = await dead_letters.list(DeadLetterFilter(error="503"), cursor=first["next_cursor"], limit=1)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert [entry["message_id"] for entry in first["messages"]] == ["m1"]
+    assert [entry["message_id"] for entry in second["messages"]] == ["m3"]
+    assert first["total_dead_letters"] == 5
+    assert second["next_cursor"] is None
+
+def test_replay_requeues_matching_messages_with_fresh_attempts():
+    async def run():
+        dead_letters = make_dead_letters()
+        await dead_letter(dead_letters, [("m1", "B1", "503"), ("m2", "B2", "400"), ("m3", "B1", "503")])
+        replayed = await dead_letters.replay(DeadLetterFilter(booking_id="B1"), rate_per_second=100)
+
+        queue = dead_letters.queue
+        first = await queue.claim()
+        blocked = await queue.claim()
+        await queue.ack(first[0])
+        second = await queue.claim()
+        payload = json.loads(await dead_letters.redis.hget("payloads", "m1"))
+        return replayed, first, blocked, second, payload, await dead_letters.count()
+
+    replayed, first, blocked, second, payload, remaining = asyncio.run(run())
+    assert replayed == 2
+    # Replayed in failure order, one at a time per booking
+    assert first[:2] == (b"m1", "high")
+    assert blocked is None
+    assert second[0] == b"m3"
+    assert payload == {"message_id": "m1", "booking_id": "B1", "priority": "high", "attempts": 0}
+    assert remaining == 1
+
+def test_replay_stays_under_the_rate_cap():
+    async def run():
+        dead_letters = make_dead_letters()
+        await dead_letter(dead_letters, [(f"m{n}", f"B{n}", "503") for n in range(10)])
+        progress = []
+
+        async def record(count):
+            progress.append(count)
+
+        started = time.monotonic()
+        replayed = await dead_letters.replay(DeadLetterFilter(), rate_per_second=20, batch_size=5, progress=record)
+        return replayed, progress, time.monotonic() - started
+
+    replayed, progress, elapsed = asyncio.run(run())
+    assert replayed == 10
+    assert progress == [5, 10]
+    assert elapsed >= 0.25
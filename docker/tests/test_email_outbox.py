@@ -0,0 +1,93 @@
+import asyncio
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import requires_database
+from delayed_jobs import DelayedDispatcher
+
+@pytest.fixture
+def vrbo(load_service):
+    service = load_service("vrbo-automation", EMAIL_RETRY_DELAY_SECONDS="600")
+    service.sent = []
+    service.failing = set()
+
+    async def send_scheduled_email(email_type, booking_id):
+        if booking_id in service.failing:
+            raise RuntimeError("mail server down")
+        service.sent.append((booking_id, email_type))
+
+    service.send_scheduled_email = send_scheduled_email
+    return service
+
+async def outbox_rows(service, booking_ids):
+    async with service.AsyncSessionLocal() as session:
+        result = await session.execute(service.text("""
+            SELECT booking_id, email_type, delivery_status, attempts FROM email_queue
+            WHERE booking_id = ANY(CAST(:booking_ids AS text[]))
+            ORDER BY booking_id, email_type
+        """), {"booking_ids": booking_ids})
+        return [tuple(row) for row in result]
+
+def booking(booking_id: str, **fields) -> dict:
+    check_in = date.today() + timedelta(days=30)
+    return {
+        "id": booking_id, "property_id": "PROP-TEST", "guest_name": "Guest", "guest_email": "guest@example.com",
+        "guest_count": 2, "check_in": check_in.isoformat(), "check_out": (check_in + timedelta(days=3)).isoformat(),
+        "total_amount": 300, "status": "confirmed", **fields
+    }
+
+def test_dispatchers_must_implement_due_job_methods():
+    class PollOnly(DelayedDispatcher):
+        async def dispatch_due(self) -> int:
+            return 0
+
+    with pytest.raises(TypeError):
+        PollOnly(None, "test:wakeup")
+
+@requires_database
+def test_due_emails_are_sent_once_and_failures_retried_later(vrbo):
+    ok, failing, later = (f"OUTBOX-{uuid.uuid4().hex[:8]}" for _ in range(3))
+    vrbo.failing.add(failing)
+    now = vrbo.utc_now()
+
+    async def run():
+        await vrbo.enqueue_guest_emails([
+            vrbo.guest_email_row("welcome", {"id": ok}, now - timedelta(minutes=1)),
+            vrbo.guest_email_row("welcome", {"id": failing}, now - timedelta(minutes=1)),
+            vrbo.guest_email_row("welcome", {"id": later}, now + timedelta(days=1))
+        ])
+        await vrbo.scheduled_email_dispatcher.dispatch_due()
+        await vrbo.scheduled_email_dispatcher.dispatch_due()
+        return await outbox_rows(vrbo, [ok, failing, later]), await vrbo.scheduled_email_dispatcher.seconds_until_next_job()
+
+    rows, delay = asyncio.run(run())
+    assert [email for email in vrbo.sent if email[0] in (ok, failing, later)] == [(ok, "welcome")]
+    assert sorted(rows) == sorted([
+        (ok, "welcome", "sent", 1),
+        (failing, "welcome", "pending", 1),
+        (later, "welcome", "pending", 0)
+    ])
+    assert delay > 0
+
+@requires_database
+def test_legacy_emails_wait_in_redis_until_their_booking_is_synced(vrbo):
+    stored, missing = (f"LEGACY-{uuid.uuid4().hex[:8]}" for _ in range(2))
+    due_at = (vrbo.utc_now() + timedelta(days=2)).timestamp()
+
+    async def run():
+        await vrbo.process_booking_page([booking(stored)])
+        await vrbo.redis_client.zadd("scheduled_emails", {
+            f"checkin_instructions:{stored}": due_at,
+            f"checkin_instructions:{missing}": due_at
+        })
+        migrated = await vrbo.migrate_scheduled_emails_zset()
+        left = await vrbo.redis_client.zrange("scheduled_emails", 0, -1)
+        return migrated, left, await outbox_rows(vrbo, [stored, missing])
+
+    migrated, left, rows = asyncio.run(run())
+    assert migrated == 1
+    assert left == [f"checkin_instructions:{missing}".encode()]
+    assert (stored, "checkin_instructions", "pending", 0) in rows
+    assert not any(row[0] == missing for row in rows)
@@ -0,0 +1,10 @@
+import pytest
+
+def test_priority_weights_must_be_positive_class_weight_pairs(load_service):
+    guest = load_service("guest-communication", MESSAGE_PRIORITY_WEIGHTS="high=8, normal=2", MESSAGE_MAX_ATTEMPTS="5")
+    assert guest.message_queue.classes == {"high": 8, "normal": 2}
+    assert guest.MESSAGE_MAX_ATTEMPTS == 5
+
+    for value in ("high=6,normal", "high=6,normal=x", "high=6,normal=0", "high=6,low=1", ""):
+        with pytest.raises(ValueError, match="MESSAGE_PRIORITY_WEIGHTS"):
+            guest.parse_priority_weights(value)
@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+import pytest
+
+MESSAGE = {"booking_id": "B1", "message_type": "custom", "subject": "Hello", "body": "Welcome!"}
+
+@pytest.fixture
+def guest(load_service):
+    service = load_service("guest-communication")
+    service.bookings = {"B1": {"vrbo_booking_id": "B1"}}
+
+    async def get_booking_details(booking_id):
+        return service.bookings.get(booking_id)
+
+    service.get_booking_details = get_booking_details
+    return service
+
+async def send(service, message: dict, key: str) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=service.app), base_url="http://test") as client:
+        return await client.post("/send-message", json=message, headers={"Idempotency-Key": key})
+
+def test_repeated_request_returns_the_original_response_and_queues_once(guest):
+    async def run():
+        first = await send(guest, MESSAGE, "key-1")
+        repeat = await send(guest, MESSAGE, "key-1")
+        other = await send(guest, MESSAGE, "key-2")
+        return first, repeat, other, await guest.message_queue.depth()
+
+    first, repeat, other, queued = asyncio.run(run())
+    assert first.status_code == repeat.status_code == 200
+    assert repeat.json() == first.json()
+    assert first.json()["message_id"] == guest.idempotent_message_id("key-1")
+    assert other.json()["message_id"] != first.json()["message_id"]
+    assert queued == 2
+
+def test_key_in_progress_is_refused_and_expires(guest):
+    async def run():
+        assert await guest.claim_idempotency_key("send-message", "key-1") is None
+        response = await send(guest, MESSAGE, "key-1")
+        ttl = await guest.redis_client.ttl(guest.idempotency_redis_key("send-message", "key-1"))
+        return response, ttl
+
+    response, ttl = asyncio.run(run())
+    assert response.status_code == 409
+    assert 0 < ttl <= guest.IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS
+
+def test_failed_request_releases_its_key(guest):
+    async def run():
+        missing = await send(guest, {**MESSAGE, "booking_id": "B2"}, "key-1")
+        guest.bookings["B2"] = {"vrbo_booking_id": "B2"}
+        retried = await send(guest, {**MESSAGE, "booking_id": "B2"}, "key-1")
+        return missing, retried
+
+    missing, retried = asyncio.run(run())
+    assert missing.status_code == 404
+    assert (retried.status_code, retried.json()["status"]) == (200, "queued")
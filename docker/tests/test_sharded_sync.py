@@ -0,0 +1,80 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+CATALOG = [f"P{n}" for n in range(12)]
+# Listed on the account but not active in the catalog
+UNLISTED = ["PX", "PY"]
+
+@pytest.fixture
+def vrbo(load_service):
+    service = load_service("vrbo-automation", VRBO_CLIENT_ID="client", VRBO_CLIENT_SECRET="secret", SYNC_SHARDS="4")
+    service.catalog = list(CATALOG)
+    service.requests = []
+    service.processed = Counter()
+
+    async def get_active_property_ids():
+        return list(service.catalog)
+
+    async def get_vrbo_auth_token():
+        return "token"
+
+    async def fetch_vrbo_property_ids_page(cursor=None):
+        return CATALOG + UNLISTED, None
+
+    async def fetch_vrbo_bookings_page(cursor=None, modified_since=None, property_id=None):
+        service.requests.append((property_id, modified_since is not None))
+        property_ids = [property_id] if property_id else CATALOG + UNLISTED
+        return [{"id": f"B-{property_id}", "property_id": property_id} for property_id in property_ids], None
+
+    async def process_booking_page(bookings, force=False):
+        service.processed.update(booking["id"] for booking in bookings)
+        return {"inserted": len(bookings), "updated": 0, "unchanged": 0, "conflicts": 0}
+
+    service.get_active_property_ids = get_active_property_ids
+    service.get_vrbo_auth_token = get_vrbo_auth_token
+    service.fetch_vrbo_property_ids_page = fetch_vrbo_property_ids_page
+    service.fetch_vrbo_bookings_page = fetch_vrbo_bookings_page
+    service.process_booking_page = process_booking_page
+    return service
+
+def test_full_sync_fetches_every_property_once(vrbo):
+    stats = asyncio.run(vrbo.sync_bookings_from_vrbo(full=True))
+
+    assert sorted(property_id for property_id, _ in vrbo.requests) == sorted(CATALOG + UNLISTED)
+    assert vrbo.processed == Counter({f"B-{property_id}": 1 for property_id in CATALOG + UNLISTED})
+    assert (stats["bookings_synced"], stats["shards"], stats["skipped_shards"]) == (14, 4, [])
+
+def test_delta_sync_is_one_account_wide_query_per_shard(vrbo):
+    async def run():
+        await vrbo.sync_bookings_from_vrbo(full=True)
+        vrbo.catalog.append("PX")
+        vrbo.requests.clear()
+        vrbo.processed.clear()
+        return await vrbo.sync_bookings_from_vrbo(full=False)
+
+    stats = asyncio.run(run())
+    shards = {vrbo.UNASSIGNED_PROPERTIES_SHARD} | {vrbo.shard_for_property(property_id) for property_id in vrbo.catalog}
+    account_queries = [request for request in vrbo.requests if request[0] is None]
+    assert account_queries == [(None, True)] * len(shards)
+    # PX joined the catalog, so its new shard fetches it in full
+    assert [request for request in vrbo.requests if request[0]] == [("PX", False)]
+    assert vrbo.processed == Counter({f"B-{property_id}": 1 for property_id in CATALOG + UNLISTED})
+    assert stats["bookings_synced"] == 14
+
+def test_manual_sync_skips_leased_shards(vrbo):
+    async def run():
+        await vrbo.redis_client.set(vrbo.sync_leases.lease_key(1), "other-replica")
+        stats = await vrbo.sync_bookings_from_vrbo(full=True)
+        lease = await vrbo.redis_client.get(vrbo.sync_leases.lease_key(2))
+        return stats, lease
+
+    stats, lease = asyncio.run(run())
+    assert stats["skipped_shards"] == [1]
+    assert not any(
+        vrbo.shard_for_property(property_id) == 1
+        for property_id, _ in vrbo.requests if property_id in CATALOG
+    )
+    # Leases taken for the manual run are handed back afterwards
+    assert lease is None
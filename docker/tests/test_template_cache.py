@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+def template(template_id: int, template_type: str, body: str) -> dict:
+    return {"id": template_id, "template_type": template_type, "subject": "Hi {{ guest_name }}", "body_text": body}
+
+@pytest.fixture
+def guest(load_service):
+    service = load_service("guest-communication")
+    service.rows = [template(2, "welcome", "New {{ guest_name }}"), template(1, "welcome", "Old {{ guest_name }}")]
+    service.loads = 0
+
+    async def load_templates(message_type=None):
+        service.loads += 1
+        if isinstance(service.rows, Exception):
+            raise service.rows
+        return list(service.rows)
+
+    service.load_templates = load_templates
+    return service
+
+def test_templates_are_compiled_once_and_newest_wins(guest):
+    cache = guest.TemplateCache(guest.redis_client)
+
+    async def run():
+        first = await cache.get(guest.MessageType.WELCOME)
+        second = await cache.get(guest.MessageType.WELCOME)
+        return first, second, await cache.get(guest.MessageType.CUSTOM)
+
+    first, second, missing = asyncio.run(run())
+    assert first is second
+    assert first.render({"guest_name": "Ada"}) == ("Hi Ada", "New Ada")
+    assert missing is None
+    assert guest.loads == 1
+
+def test_change_on_another_replica_reloads_the_cache(guest):
+    cache = guest.TemplateCache(guest.redis_client)
+    other_replica = guest.TemplateCache(guest.redis_client)
+
+    async def run():
+        listener = asyncio.create_task(cache.listen())
+        try:
+            await cache.get(guest.MessageType.WELCOME)
+            await asyncio.sleep(0.05)
+            guest.rows = [template(3, "welcome", "Changed {{ guest_name }}")] + guest.rows
+            await other_replica.invalidate()
+            await asyncio.sleep(0.05)
+            return await cache.get(guest.MessageType.WELCOME)
+        finally:
+            listener.cancel()
+
+    changed = asyncio.run(run())
+    assert changed.render({"guest_name": "Ada"}) == ("Hi Ada", "Changed Ada")
+    assert changed.version == 1
+
+def test_failed_reload_is_retried_on_next_get(guest):
+    cache = guest.TemplateCache(guest.redis_client)
+    rows, guest.rows = guest.rows, RuntimeError("database unavailable")
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cache.get(guest.MessageType.WELCOME)
+        guest.rows = rows
+        return await cache.get(guest.MessageType.WELCOME)
+
+    assert asyncio.run(run()).row["id"] == 2
+    assert guest.loads == 2
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import hmac
+import json
+
+import httpx
+import pytest
+
+SECRET = "test-secret"
+
+def event(event_id: str, booking_id: str, **booking) -> dict:
+    return {
+        "event_id": event_id,
+        "event_type": "booking.created",
+        "booking": {"id": booking_id, "property_id": "P1", **booking}
+    }
+
+@pytest.fixture
+def vrbo(load_service):
+    service = load_service("vrbo-automation", VRBO_WEBHOOK_SECRET=SECRET, WEBHOOK_RETRY_SECONDS="0")
+    service.processed = []
+
+    async def process_booking_page(bookings, force=False):
+        if any(booking.get("fail") for booking in bookings):
+            raise RuntimeError("bad booking")
+        service.processed.extend(booking["id"] for booking in bookings)
+
+    service.process_booking_page = process_booking_page
+    return service
+
+async def post(service, payload: dict, secret: str = SECRET) -> httpx.Response:
+    body = json.dumps(payload).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=service.app), base_url="http://test") as client:
+        return await client.post("/webhooks/vrbo/bookings", content=body, headers={"X-VRBO-Signature": signature})
+
+async def start_group(service):
+    await service.redis_client.xgroup_create(
+        service.WEBHOOK_EVENTS_KEY, service.WEBHOOK_CONSUMER_GROUP, id="0", mkstream=True
+    )
+
+async def queue_raw(service, fields: dict):
+    await service.redis_client.xadd(service.WEBHOOK_EVENTS_KEY, fields)
+
+async def run_once(service):
+    entries = await service.claim_webhook_events(block_ms=1)
+    if entries:
+        await service.process_webhook_events(entries)
+
+def test_signed_events_are_queued_once(vrbo):
+    async def run():
+        first = await post(vrbo, event("E1", "B1"))
+        repeat = await post(vrbo, event("E1", "B1"))
+        forged = await post(vrbo, event("E2", "B2"), secret="wrong")
+        return first, repeat, forged, await vrbo.redis_client.xlen(vrbo.WEBHOOK_EVENTS_KEY)
+
+    first, repeat, forged, queued = asyncio.run(run())
+    assert (first.status_code, first.json()["status"]) == (202, "accepted")
+    assert repeat.json()["status"] == "duplicate"
+    assert forged.status_code == 401
+    assert queued == 1
+
+def test_unsigned_webhooks_are_refused_without_a_secret(load_service):
+    service = load_service("vrbo-automation", VRBO_WEBHOOK_SECRET="")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=service.app), base_url="http://test") as client:
+            return await client.post("/webhooks/vrbo/bookings", json=event("E1", "B1"))
+
+    assert asyncio.run(run()).status_code == 503
+
+def test_invalid_entry_is_dead_lettered_without_blocking_the_batch(vrbo):
+    async def run():
+        await start_group(vrbo)
+        await post(vrbo, event("E1", "B1"))
+        await queue_raw(vrbo, {"event": "not json"})
+        await post(vrbo, event("E2", "B2"))
+        await run_once(vrbo)
+        dead = await vrbo.redis_client.xrange(vrbo.WEBHOOK_DEAD_LETTERS_KEY)
+        return dead, await vrbo.redis_client.xlen(vrbo.WEBHOOK_EVENTS_KEY)
+
+    dead, left = asyncio.run(run())
+    assert vrbo.processed == ["B1", "B2"]
+    assert [fields[b"event"] for _, fields in dead] == [b"not json"]
+    assert left == 0
+
+def test_failing_event_is_retried_alone_and_dead_lettered_after_max_deliveries(vrbo):
+    async def run():
+        await start_group(vrbo)
+        await post(vrbo, event("E1", "B1", fail=True))
+        await post(vrbo, event("E2", "B1"))
+        await post(vrbo, event("E3", "B2"))
+        await run_once(vrbo)
+        after_first = list(vrbo.processed)
+        for _ in range(vrbo.WEBHOOK_MAX_DELIVERIES):
+            await run_once(vrbo)
+        dead = await vrbo.redis_client.xrange(vrbo.WEBHOOK_DEAD_LETTERS_KEY)
+        pending = await vrbo.redis_client.xpending(vrbo.WEBHOOK_EVENTS_KEY, vrbo.WEBHOOK_CONSUMER_GROUP)
+        return after_first, dead, pending["pending"]
+
+    after_first, dead, pending = asyncio.run(run())
+    # B1's later event waits behind its failed one; B2 is not held up
+    assert after_first == ["B2"]
+    assert [json.loads(fields[b"event"])["event_id"] for _, fields in dead] == ["E1"]
+    assert vrbo.processed == ["B2", "B1"]
+    assert pending == 0
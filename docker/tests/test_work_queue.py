@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import Counter
+
+import fakeredis
+
+from work_queue import DelayedWorkMover, WorkQueue
+
+CLASSES = {"high": 6, "normal": 3, "low": 1}
+
+def make_queue(**kwargs) -> WorkQueue:
+    return WorkQueue(fakeredis.aioredis.FakeRedis(), "queue", classes=CLASSES, **kwargs)
+
+async def claim_member(queue: WorkQueue):
+    claimed = await queue.claim()
+    return claimed and claimed[0].decode()
+
+def test_claims_follow_class_weights():
+    async def run():
+        queue = make_queue()
+        for name in CLASSES:
+            async with queue.redis.pipeline(transaction=True) as pipe:
+                await queue.push_many_commands(pipe, [(f"{name}-{n}", name, None) for n in range(100)])
+                await pipe.execute()
+
+        claimed = Counter()
+        for _ in range(100):
+            member, priority_class, _ = await queue.claim()
+            claimed[priority_class] += 1
+        return claimed
+
+    assert asyncio.run(run()) == {"high": 60, "normal": 30, "low": 10}
+
+def test_message_past_max_wait_is_claimed_first():
+    async def run():
+        queue = make_queue(max_wait=300)
+        async with queue.redis.pipeline(transaction=True) as pipe:
+            await queue.push_commands(pipe, "stale", "low", enqueued_at=time.time() - 400)
+            await queue.push_commands(pipe, "fresh", "high")
+            await pipe.execute()
+        return [await claim_member(queue), await claim_member(queue)]
+
+    assert asyncio.run(run()) == ["stale", "fresh"]
+
+def test_group_messages_are_claimed_one_at_a_time_in_order():
+    async def run():
+        queue = make_queue()
+        await queue.push("first", "low", "B1")
+        await queue.push("second", "high", "B1")
+        await queue.push("other", "low", "B2")
+
+        claimed = [await claim_member(queue), await claim_member(queue), await claim_member(queue)]
+        await queue.ack(b"first")
+        claimed.append(await claim_member(queue))
+        return claimed
+
+    assert asyncio.run(run()) == ["first", "other", None, "second"]
+
+def test_mover_promotes_due_messages_into_their_class():
+    async def run():
+        queue = make_queue()
+        mover = DelayedWorkMover(queue.redis, "scheduled", queue)
+        due_at = time.time() + 60
+        await mover.schedule("later", due_at, "high", "B1")
+
+        early = await mover.claim_due(now=due_at - 1)
+        moved = await mover.claim_due(now=due_at)
+        return early, moved, await queue.claim()
+
+    early, moved, claimed = asyncio.run(run())
+    assert early == []
+    assert [member for member, _ in moved] == [b"later"]
+    assert claimed[:2] == (b"later", "high")
+
+def test_retried_message_blocks_its_group_until_due():
+    async def run():
+        queue = make_queue()
+        mover = DelayedWorkMover(queue.redis, "scheduled", queue)
+        await queue.push("first", "normal", "B1")
+        await queue.push("second", "normal", "B1")
+        await claim_member(queue)
+
+        due_at = time.time() + 30
+        async with queue.redis.pipeline(transaction=True) as pipe:
+            await mover.retry_commands(pipe, b"first", due_at, "low")
+            await pipe.execute()
+
+        claimed = [await claim_member(queue)]
+        await mover.claim_due(now=due_at)
+        claimed.append(await claim_member(queue))
+        await queue.ack(b"first")
+        claimed.append(await claim_member(queue))
+        return claimed, await queue.in_flight()
+
+    assert asyncio.run(run()) == ([None, "first", "second"], 1)
+
+def test_groups_sharing_a_prefix_are_ordered_separately():
+    async def run():
+        queue = make_queue()
+        await queue.push("b1-first", "normal", "B1")
+        await queue.push("b10-first", "normal", "B10")
+        await queue.push("b1-second", "normal", "B1")
+        claimed = [await claim_member(queue), await claim_member(queue), await claim_member(queue)]
+        await queue.ack(b"b1-first")
+        claimed.append(await claim_member(queue))
+        return claimed
+
+    assert asyncio.run(run()) == ["b1-first", "b10-first", None, "b1-second"]
+
+def test_reaper_requeues_messages_whose_worker_timed_out():
+    async def run():
+        queue = make_queue(visibility_timeout=60)
+        await queue.push("slow", "high", "B1")
+        await queue.push("next", "high", "B1")
+        await claim_member(queue)
+
+        early = await queue.reap(now=time.time() + 30)
+        requeued = await queue.reap(now=time.time() + 61)
+        return early, requeued, await claim_member(queue), await claim_member(queue)
+
+    assert asyncio.run(run()) == (0, 1, "slow", None)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth Availability Index
+In-memory per-property index of blocking bookings for availability and
+double-booking checks without scanning the bookings table
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Booking statuses that occupy the property's calendar
+BLOCKING_STATUSES = {"confirmed"}
+
+Stay = Tuple[int, int, str]  # (check_in ordinal, check_out ordinal, booking id)
+
+class _Node:
+    """Treap node ordered by stay, with the latest check-out of its subtree"""
+    __slots__ = ("stay", "priority", "left", "right", "max_check_out")
+
+    def __init__(self, stay: Stay):
+        self.stay = stay
+        self.priority = random.random()
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+        self.max_check_out = stay[1]
+
+def _update(node: _Node):
+    node.max_check_out = node.stay[1]
+    for child in (node.left, node.right):
+        if child is not None and child.max_check_out > node.max_check_out:
+            node.max_check_out = child.max_check_out
+
+def _split(node: Optional[_Node], stay: Stay) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """Split into the stays before `stay` and the rest"""
+    if node is None:
+        return None, None
+    if node.stay < stay:
+        node.right, rest = _split(node.right, stay)
+        _update(node)
+        return node, rest
+    before, node.left = _split(node.left, stay)
+    _update(node)
+    return before, node
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    """Join two treaps whose stays are all ordered left before right"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+def _remove(node: Optional[_Node], stay: Stay) -> Optional[_Node]:
+    if node is None:
+        return None
+    if stay == node.stay:
+        return _merge(node.left, node.right)
+    if stay < node.stay:
+        node.left = _remove(node.left, stay)
+    else:
+        node.right = _remove(node.right, stay)
+    _update(node)
+    return node
+
+@dataclass
+class PropertyCalendar:
+    """Stays of one property in an interval tree (a treap keyed by check-in)"""
+    root: Optional[_Node] = None
+
+    def add(self, stay: Stay):
+        before, rest = _split(self.root, stay)
+        self.root = _merge(_merge(before, _Node(stay)), rest)
+
+    def remove(self, stay: Stay):
+        self.root = _remove(self.root, stay)
+
+    def overlapping(self, start: int, end: int) -> List[str]:
+        """Booking ids of stays overlapping the nights [start, end)"""
+        found = []
+        pending = [self.root]
+        while pending:
+            node = pending.pop()
+            if node is None or node.max_check_out <= start:
+                continue
+            pending.append(node.left)
+            if node.stay[0] < end:
+                if node.stay[1] > start:
+                    found.append(node.stay[2])
+                pending.append(node.right)
+        return found
+
+class AvailabilityIndex:
+    """Per-property interval index of confirmed stays, as half-open night ranges"""
+
+    def __init__(self):
+        self.calendars: Dict[str, PropertyCalendar] = {}
+        self.bookings: Dict[str, Tuple[str, Stay]] = {}
+        self.conflicts: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.bookings)
+
+    def upsert(
+        self,
+        booking_id: str,
+        property_id: Optional[str],
+        check_in: Optional[date],
+        check_out: Optional[date],
+        status: Optional[str]
+    ) -> List[str]:
+        """Add, move or drop a booking; returns the bookings it now overlaps"""
+        self.remove(booking_id)
+        if status not in BLOCKING_STATUSES or not property_id or not check_in or not check_out:
+            return []
+
+        stay = (check_in.toordinal(), check_out.toordinal(), booking_id)
+        calendar = self.calendars.setdefault(property_id, PropertyCalendar())
+        overlaps = calendar.overlapping(stay[0], stay[1])
+        calendar.add(stay)
+        self.bookings[booking_id] = (property_id, stay)
+        for other in overlaps:
+            self.conflicts.setdefault(booking_id, set()).add(other)
+            self.conflicts.setdefault(other, set()).add(booking_id)
+        return overlaps
+
+    def remove(self, booking_id: str):
+        entry = self.bookings.pop(booking_id, None)
+        if entry is None:
+            return
+        property_id, stay = entry
+        self.calendars[property_id].remove(stay)
+        for other in self.conflicts.pop(booking_id, ()):
+            others = self.conflicts[other]
+            others.discard(booking_id)
+            if not others:
+                del self.conflicts[other]
+
+    def load(self, rows: Iterable[Tuple[str, Optional[str], Optional[date], Optional[date], Optional[str]]]) -> int:
+        """Bulk load (booking_id, property_id, check_in, check_out, status) rows"""
+        loaded = 0
+        for row in rows:
+            self.upsert(*row)
+            loaded += 1
+        return loaded
+
+    def clear(self):
+        self.calendars.clear()
+        self.bookings.clear()
+        self.conflicts.clear()
+
+    def overlapping(self, property_id: str, start: date, end: date) -> List[str]:
+        calendar = self.calendars.get(property_id)
+        if calendar is None:
+            return []
+        return calendar.overlapping(start.toordinal(), end.toordinal())
+
+    def is_available(self, property_id: str, start: date, end: date) -> bool:
+        return not self.overlapping(property_id, start, end)
+
+    def conflict_count(self) -> int:
+        return sum(len(others) for others in self.conflicts.values()) // 2
+
+    def property_conflicts(self, property_id: Optional[str] = None) -> List[Dict[str, str]]:
+        """Current double bookings, optionally for one property"""
+        results = []
+        for first in sorted(self.conflicts):
+            conflict_property = self.bookings[first][0]
+            if property_id is not None and conflict_property != property_id:
+                continue
+            for second in sorted(self.conflicts[first]):
+                if first < second:
+                    results.append({"property_id": conflict_property, "booking_id": first, "conflicts_with": second})
+        return results
@@ -5,22 +5,39 @@ Professional VRBO/Expedia Partner API integration for vacation rental management
 """
 
 import asyncio
+import base64
+import hashlib
+import hmac
+import json
 import os
-from datetime import datetime, timedelta
-from typing import List, Optional
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, AsyncIterator, Collection, Dict, List, Optional, Set, Tuple
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import aiohttp
 from loguru import logger
 import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+
+from availability_index import AvailabilityIndex
+from delayed_jobs import DelayedDispatcher
+from payload_journal import PayloadJournal
+from redis_pubsub import listen_forever
+from shard_leases import ShardLeases, default_owner_id
+from vrbo_client import VRBOClient
+from vrbo_rate_limiter import VRBORateLimiter
 
 # Configure logging
+LOG_DIR = os.getenv("LOG_DIR", "/app/logs")
 logger.add(
-    "/app/logs/vrbo_automation.log",
+    f"{LOG_DIR}/vrbo_automation.log",
     rotation="1 day",
     retention="30 days",
     level="INFO"
@@ -40,7 +57,132 @@ redis_client = redis.from_url(REDIS_URL)
 # VRBO API Configuration
 VRBO_CLIENT_ID = os.getenv("VRBO_CLIENT_ID")
 VRBO_CLIENT_SECRET = os.getenv("VRBO_CLIENT_SECRET")
-VRBO_BASE_URL = "https://api.expediapartnercentral.com"
+vrbo_client = VRBOClient(
+    VRBO_CLIENT_ID,
+    VRBO_CLIENT_SECRET,
+    limiter=VRBORateLimiter(redis_client)
+)
+
+# Scheduled guest emails live in the email_queue outbox table and are
+# claimed in batches of SCHEDULED_EMAIL_BATCH_SIZE by EMAIL_OUTBOX_WORKERS
+# concurrent claimers per replica
+SCHEDULED_EMAIL_BATCH_SIZE = int(os.getenv("SCHEDULED_EMAIL_BATCH_SIZE", "100"))
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", "4"))
+EMAIL_CLAIM_TIMEOUT_SECONDS = int(os.getenv("EMAIL_CLAIM_TIMEOUT_SECONDS", "300"))
+EMAIL_RETRY_DELAY_SECONDS = int(os.getenv("EMAIL_RETRY_DELAY_SECONDS", "300"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+GUEST_EMAIL_SUBJECTS = {
+    "welcome": "Welcome! Your stay is confirmed",
+    "checkin_instructions": "Check-in instructions for your stay",
+    "checkout_instructions": "Checkout instructions for your stay"
+}
+
+# Booking sync tuning
+VRBO_PAGE_SIZE = int(os.getenv("VRBO_PAGE_SIZE", "100"))
+SYNC_MAX_INFLIGHT_PAGES = int(os.getenv("SYNC_MAX_INFLIGHT_PAGES", "2"))
+BOOKING_CACHE_TTL_SECONDS = 86400
+BOOKING_FINGERPRINTS_KEY = "vrbo:booking_fingerprints"
+
+# GET /bookings pages are cached for BOOKINGS_PAGE_CACHE_TTL_SECONDS under
+# the current cache generation, which is bumped whenever a booking changes
+BOOKINGS_PAGE_DEFAULT_LIMIT = 100
+BOOKINGS_PAGE_MAX_LIMIT = 1000
+BOOKINGS_PAGE_CACHE_TTL_SECONDS = int(os.getenv("BOOKINGS_PAGE_CACHE_TTL_SECONDS", "60"))
+BOOKINGS_PAGE_CACHE_GENERATION_KEY = "vrbo:bookings:cache_generation"
+BOOKINGS_STREAM_BATCH_SIZE = 500
+
+# Concurrent booking processing: bookings are spread over SYNC_WORKERS
+# per-property lanes, with at most SYNC_MAX_CONCURRENCY batches in flight
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", "4"))
+SYNC_MAX_CONCURRENCY = int(os.getenv("SYNC_MAX_CONCURRENCY", str(SYNC_WORKERS)))
+
+# Delta sync runs every SYNC_INTERVAL_SECONDS and only asks for bookings
+# modified since the stored watermark; a full reconciliation runs every
+# FULL_SYNC_INTERVAL_SECONDS to catch anything a delta may have missed.
+SYNC_INTERVAL_SECONDS = int(os.getenv("SYNC_INTERVAL_SECONDS", "3600"))
+FULL_SYNC_INTERVAL_SECONDS = int(os.getenv("FULL_SYNC_INTERVAL_SECONDS", "86400"))
+SYNC_WATERMARK_OVERLAP_SECONDS = int(os.getenv("SYNC_WATERMARK_OVERLAP_SECONDS", "300"))
+SYNC_RETRY_SECONDS = int(os.getenv("SYNC_RETRY_SECONDS", "300"))
+
+# The property catalog is synced every PROPERTY_SYNC_INTERVAL_SECONDS by
+# one replica, with conditional requests so unchanged listings cost a 304
+PROPERTY_SYNC_INTERVAL_SECONDS = int(os.getenv("PROPERTY_SYNC_INTERVAL_SECONDS", str(6 * 3600)))
+PROPERTY_SYNC_CONCURRENCY = int(os.getenv("PROPERTY_SYNC_CONCURRENCY", "8"))
+PROPERTY_VALIDATORS_KEY = f"vrbo:property_catalog:{VRBO_CLIENT_ID}:validators"
+
+# Every raw bookings page and webhook payload is journaled here for offline
+# reprocessing (see payload_journal.py); set it empty to disable
+VRBO_JOURNAL_DIR = os.getenv("VRBO_JOURNAL_DIR", "/app/data/journal")
+
+# Sync work is split into SYNC_SHARDS shards by property. Replicas claim
+# shards through Redis leases (renewed every SYNC_LEASE_HEARTBEAT_SECONDS)
+# and each replica syncs at most SYNC_MAX_ACTIVE_SHARDS shards at a time.
+# The owner of UNASSIGNED_PROPERTIES_SHARD also syncs the bookings of
+# properties missing from the active property catalog.
+SYNC_SHARDS = int(os.getenv("SYNC_SHARDS", "16"))
+SYNC_LEASE_TTL_SECONDS = int(os.getenv("SYNC_LEASE_TTL_SECONDS", "30"))
+SYNC_LEASE_HEARTBEAT_SECONDS = int(os.getenv("SYNC_LEASE_HEARTBEAT_SECONDS", "10"))
+SYNC_MAX_ACTIVE_SHARDS = int(os.getenv("SYNC_MAX_ACTIVE_SHARDS", "2"))
+UNASSIGNED_PROPERTIES_SHARD = 0
+
+# Booking webhooks are acknowledged once they are on a Redis stream and
+# processed from it by every replica's ingestion worker. Unsigned webhooks
+# are refused unless VRBO_WEBHOOK_SECRET is set or
+# VRBO_WEBHOOK_ALLOW_UNSIGNED=true. Event ids are remembered for
+# WEBHOOK_DEDUP_TTL_SECONDS; events whose batch failed (or whose replica
+# died) are picked up again after WEBHOOK_RETRY_SECONDS. Events that are
+# not valid, or still fail after WEBHOOK_MAX_DELIVERIES deliveries, are
+# moved to the WEBHOOK_DEAD_LETTERS_KEY stream.
+VRBO_WEBHOOK_SECRET = os.getenv("VRBO_WEBHOOK_SECRET")
+VRBO_WEBHOOK_ALLOW_UNSIGNED = os.getenv("VRBO_WEBHOOK_ALLOW_UNSIGNED", "false").lower() == "true"
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "10000"))
+WEBHOOK_DEDUP_TTL_SECONDS = int(os.getenv("WEBHOOK_DEDUP_TTL_SECONDS", str(7 * 86400)))
+WEBHOOK_RETRY_SECONDS = int(os.getenv("WEBHOOK_RETRY_SECONDS", "60"))
+WEBHOOK_MAX_DELIVERIES = int(os.getenv("WEBHOOK_MAX_DELIVERIES", "5"))
+WEBHOOK_EVENT_TYPES = {"booking.created", "booking.changed"}
+WEBHOOK_EVENTS_KEY = "vrbo:webhook:events"
+WEBHOOK_CONSUMER_GROUP = "booking-ingestion"
+WEBHOOK_DEAD_LETTERS_KEY = "vrbo:webhook:dead_letters"
+
+# KEYS: events stream, event dedup key
+# ARGV: max queued events, dedup TTL, event JSON
+# Queues an event unless it is already queued or processed. Returns 1 if
+# queued, 0 for a duplicate and -1 if the stream is full.
+ENQUEUE_WEBHOOK_EVENT_SCRIPT = """
+if redis.call('XLEN', KEYS[1]) >= tonumber(ARGV[1]) then
+    return -1
+end
+if not redis.call('SET', KEYS[2], 'queued', 'NX', 'EX', ARGV[2]) then
+    return 0
+end
+redis.call('XADD', KEYS[1], '*', 'event', ARGV[3])
+return 1
+"""
+
+# Booking calendar changes are broadcast so every replica's availability
+# index stays current; detected double bookings are published as alerts
+BOOKING_CHANGES_CHANNEL = "vrbo:bookings:changes"
+BOOKING_CONFLICTS_CHANNEL = "vrbo:alerts:booking_conflicts"
+
+enqueue_webhook_event = redis_client.register_script(ENQUEUE_WEBHOOK_EVENT_SCRIPT)
+
+instance_id = default_owner_id()
+availability_index = AvailabilityIndex()
+availability_index_ready = asyncio.Event()
+
+sync_leases = ShardLeases(
+    redis_client,
+    f"vrbo:sync:{VRBO_CLIENT_ID}",
+    SYNC_SHARDS,
+    lease_ttl=SYNC_LEASE_TTL_SECONDS,
+    heartbeat_interval=SYNC_LEASE_HEARTBEAT_SECONDS,
+    owner=instance_id
+)
+active_shard_syncs = asyncio.Semaphore(max(1, SYNC_MAX_ACTIVE_SHARDS))
+payload_journal = PayloadJournal(VRBO_JOURNAL_DIR) if VRBO_JOURNAL_DIR else None
+
+class VRBOAPIError(Exception):
+    """Raised when the VRBO Partner API returns an unexpected response"""
 
 class BookingData(BaseModel):
     booking_id: str
@@ -52,6 +194,18 @@ class BookingData(BaseModel):
     total_amount: float
     guest_count: int
 
+class BookingWebhookEvent(BaseModel):
+    event_id: str
+    event_type: str
+    occurred_at: Optional[datetime] = None
+    booking: Dict[str, Any]
+
+class BookingFilters(BaseModel):
+    property_id: Optional[str] = None
+    status: Optional[str] = None
+    check_in_from: Optional[date] = None
+    check_in_to: Optional[date] = None
+
 class PropertyData(BaseModel):
     property_id: str
     name: str
@@ -59,7 +213,12 @@ class PropertyData(BaseModel):
     nightly_rate: float
     max_guests: int
 
-@app.on_startup
+class PropertyValidators(BaseModel):
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_length: int = 0
+
+@app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
     logger.info("🚀 Starting Bill Sloth VRBO Automation Service")
@@ -80,8 +239,31 @@ async def startup_event():
         logger.error(f"❌ Redis connection failed: {e}")
     
     # Start background tasks
-    asyncio.create_task(sync_bookings_scheduler())
-    asyncio.create_task(guest_communication_scheduler())
+    app.state.availability_listener = asyncio.create_task(availability_index_listener())
+    app.state.sync_scheduler = asyncio.create_task(sync_bookings_scheduler())
+    app.state.property_catalog_scheduler = asyncio.create_task(property_catalog_scheduler())
+    app.state.guest_communication_scheduler = asyncio.create_task(guest_communication_scheduler())
+    app.state.webhook_ingestion = asyncio.create_task(webhook_ingestion_worker())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks, handing back sync shards, and release pooled connections on shutdown"""
+    # Unfinished webhook events stay on the stream for another replica, and
+    # emails being sent are reclaimed from the outbox after their timeout
+    tasks = [
+        app.state.sync_scheduler,
+        app.state.webhook_ingestion,
+        app.state.property_catalog_scheduler,
+        app.state.guest_communication_scheduler,
+        app.state.availability_listener
+    ]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    
+    await vrbo_client.close()
+    if payload_journal:
+        payload_journal.close()
 
 @app.get("/")
 async def root():
@@ -98,121 +280,1060 @@ async def health_check():
     }
 
 @app.post("/sync-bookings")
-async def sync_bookings(background_tasks: BackgroundTasks):
-    """Manually trigger booking synchronization"""
-    background_tasks.add_task(sync_bookings_from_vrbo)
-    return {"message": "Booking sync initiated"}
+async def sync_bookings(background_tasks: BackgroundTasks, full: bool = False):
+    """Manually trigger booking synchronization (delta unless full=true)"""
+    background_tasks.add_task(sync_bookings_from_vrbo, full or None)
+    return {"message": "Booking sync initiated", "mode": "full" if full else "auto"}
+
+@app.post("/sync-properties")
+async def sync_properties(background_tasks: BackgroundTasks):
+    """Manually trigger a property catalog sync"""
+    background_tasks.add_task(sync_property_catalog)
+    return {"message": "Property catalog sync initiated"}
+
+@app.get("/sync-status")
+async def get_sync_status():
+    """Get shard ownership, watermarks and last run details for booking synchronization"""
+    assignments = await sync_leases.assignments()
+    property_run = await redis_client.get(sync_state_key("property_catalog:last_run"))
+    shards = []
+    for shard, owner in assignments.items():
+        watermark = await get_sync_timestamp(shard_state_name(shard, "watermark"))
+        last_full_sync = await get_sync_timestamp(shard_state_name(shard, "last_full_sync"))
+        last_run = await redis_client.get(sync_state_key(shard_state_name(shard, "last_run")))
+        shards.append({
+            "shard": shard,
+            "owner": owner,
+            "watermark": format_sync_timestamp(watermark),
+            "last_full_sync": format_sync_timestamp(last_full_sync),
+            "last_run": json.loads(last_run) if last_run else None
+        })
+    
+    return {
+        "account": VRBO_CLIENT_ID,
+        "worker": sync_leases.owner,
+        "owned_shards": sorted(sync_leases.owned),
+        "workers": sorted({owner for owner in assignments.values() if owner}),
+        "sync_interval_seconds": SYNC_INTERVAL_SECONDS,
+        "full_sync_interval_seconds": FULL_SYNC_INTERVAL_SECONDS,
+        "shards": shards,
+        "property_catalog": json.loads(property_run) if property_run else None,
+        "webhook_queue_depth": await redis_client.xlen(WEBHOOK_EVENTS_KEY),
+        "webhook_dead_letters": await redis_client.xlen(WEBHOOK_DEAD_LETTERS_KEY)
+    }
+
+@app.post("/webhooks/vrbo/bookings", status_code=202)
+async def receive_booking_webhook(request: Request):
+    """Accept a booking-created/changed notification from VRBO
+
+    The event is acknowledged as soon as it is deduplicated and on the
+    events stream; the booking itself is processed asynchronously by
+    webhook_ingestion_worker.
+    """
+    body = await request.body()
+    
+    if VRBO_WEBHOOK_SECRET:
+        signature = request.headers.get("X-VRBO-Signature", "")
+        expected = hmac.new(VRBO_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(signature, expected):
+            raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    elif not VRBO_WEBHOOK_ALLOW_UNSIGNED:
+        raise HTTPException(status_code=503, detail="Webhook signing is not configured")
+    
+    try:
+        event = BookingWebhookEvent.model_validate_json(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid webhook payload: {e}")
+    
+    if event.event_type not in WEBHOOK_EVENT_TYPES:
+        return {"status": "ignored", "event_id": event.event_id}
+    
+    # VRBO retries deliveries, so only the first copy of an event is queued
+    queued = await enqueue_webhook_event(
+        keys=[WEBHOOK_EVENTS_KEY, webhook_dedup_key(event.event_id)],
+        args=[WEBHOOK_QUEUE_SIZE, WEBHOOK_DEDUP_TTL_SECONDS, event.model_dump_json()]
+    )
+    if queued == 0:
+        return {"status": "duplicate", "event_id": event.event_id}
+    if queued < 0:
+        raise HTTPException(
+            status_code=503,
+            detail="Webhook queue is full",
+            headers={"Retry-After": "5"}
+        )
+    
+    return {"status": "accepted", "event_id": event.event_id}
+
+def webhook_dedup_key(event_id: str) -> str:
+    return f"vrbo:webhook:event:{event_id}"
+
+@app.get("/rate-limit")
+async def get_rate_limit_state():
+    """Get shared VRBO API rate limiter state"""
+    return await vrbo_client.limiter.state()
 
 @app.get("/bookings")
-async def get_bookings():
-    """Get all bookings from database"""
+async def get_bookings(
+    property_id: Optional[str] = None,
+    status: Optional[str] = None,
+    check_in_from: Optional[date] = None,
+    check_in_to: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(BOOKINGS_PAGE_DEFAULT_LIMIT, ge=1, le=BOOKINGS_PAGE_MAX_LIMIT),
+    format: str = "json"
+):
+    """Get bookings from database, ordered by check-in
+
+    JSON responses are keyset-paginated: pass the returned next_cursor to
+    get the following page. format=ndjson streams every matching booking
+    after the cursor, one JSON object per line, ignoring limit.
+    """
+    filters = BookingFilters(
+        property_id=property_id,
+        status=status,
+        check_in_from=check_in_from,
+        check_in_to=check_in_to
+    )
+    after = decode_bookings_cursor(cursor) if cursor else None
+    
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_bookings_ndjson(filters, after),
+            media_type="application/x-ndjson"
+        )
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    
     try:
-        # This would fetch from database in real implementation
-        bookings = await get_bookings_from_db()
-        return {"bookings": bookings}
+        return await get_bookings_page(filters, after, limit)
     except Exception as e:
         logger.error(f"Error fetching bookings: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch bookings")
 
+@app.get("/properties/{property_id}/availability")
+async def get_property_availability(property_id: str, start: date, end: date):
+    """Check whether a property is free for the nights from start to end"""
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if not availability_index_ready.is_set():
+        raise HTTPException(status_code=503, detail="Availability index is loading", headers={"Retry-After": "5"})
+    
+    overlapping = availability_index.overlapping(property_id, start, end)
+    return {
+        "property_id": property_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "available": not overlapping,
+        "conflicting_bookings": overlapping
+    }
+
+@app.get("/availability/conflicts")
+async def get_booking_conflicts(property_id: Optional[str] = None):
+    """Get current double bookings (overlapping confirmed stays)"""
+    if not availability_index_ready.is_set():
+        raise HTTPException(status_code=503, detail="Availability index is loading", headers={"Retry-After": "5"})
+    conflicts = availability_index.property_conflicts(property_id)
+    return {"conflicts": conflicts, "total": len(conflicts), "indexed_bookings": len(availability_index)}
+
 @app.post("/send-welcome-email/{booking_id}")
 async def send_welcome_email(booking_id: str, background_tasks: BackgroundTasks):
     """Send welcome email to guest"""
     background_tasks.add_task(send_guest_welcome_email, booking_id)
     return {"message": f"Welcome email queued for booking {booking_id}"}
 
-async def sync_bookings_from_vrbo():
-    """Synchronize bookings from VRBO API"""
-    logger.info("🔄 Starting VRBO booking synchronization")
+async def sync_bookings_from_vrbo(full: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+    """Synchronize bookings for every shard from VRBO API
+
+    Used for manual runs; scheduled syncs go through the shard leases in
+    sync_bookings_scheduler. Each shard's lease is held while it syncs, and
+    shards already leased (and so being synced by a scheduler) are skipped.
+    Shards run at most SYNC_MAX_ACTIVE_SHARDS at a time. Returns combined
+    stats, or None if any shard failed.
+    """
+    async def sync_leased_shard(shard: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        async with sync_leases.hold(shard) as held:
+            if not held:
+                logger.info(f"⏭️ Shard {shard} is leased to a scheduled sync, skipping it")
+                return False, None
+            return True, await sync_booking_shard(shard, full)
     
+    started = time.monotonic()
+    outcomes = await asyncio.gather(*[sync_leased_shard(shard) for shard in range(SYNC_SHARDS)])
+    results = [result for held, result in outcomes if held]
+    if any(result is None for result in results):
+        return None
+    
+    elapsed = time.monotonic() - started
+    totals = {
+        key: sum(result[key] for result in results)
+        for key in ("bookings_synced", "inserted", "updated", "unchanged", "conflicts")
+    }
+    return {
+        **totals,
+        "shards": len(results),
+        "skipped_shards": [shard for shard, (held, _) in enumerate(outcomes) if not held],
+        "elapsed_seconds": round(elapsed, 3),
+        "bookings_per_second": round(totals["bookings_synced"] / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+async def sync_booking_shard(shard: int, full: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+    """Synchronize the bookings of one property shard from VRBO API
+
+    Runs a delta sync against the shard's stored watermark unless a full
+    reconciliation is requested or FULL_SYNC_INTERVAL_SECONDS has elapsed
+    since the shard's last one. A delta is a single account-wide
+    modified_since query, keeping the bookings routed to this shard by
+    booking_shard; properties new to the shard are fetched in full. A full
+    reconciliation fetches each of the shard's properties, and the
+    unassigned shard each account property missing from the catalog, so no
+    booking is downloaded twice. The watermark only advances after a sync
+    of at least one property (or the unassigned properties) completes.
+    Returns the run's stats, or None if the sync failed.
+    """
     if not VRBO_CLIENT_ID or not VRBO_CLIENT_SECRET:
         logger.warning("⚠️ VRBO API credentials not configured")
-        return
+        return None
     
-    try:
-        # Get auth token
-        token = await get_vrbo_auth_token()
-        if not token:
-            logger.error("❌ Failed to get VRBO auth token")
+    async with active_shard_syncs:
+        logger.info(f"🔄 Starting VRBO booking synchronization for shard {shard}")
+        try:
+            # Get auth token
+            token = await get_vrbo_auth_token()
+            if not token:
+                logger.error("❌ Failed to get VRBO auth token")
+                return None
+            
+            started_at = datetime.now(timezone.utc).timestamp()
+            watermark = await get_sync_timestamp(shard_state_name(shard, "watermark"))
+            last_full_sync = await get_sync_timestamp(shard_state_name(shard, "last_full_sync"))
+            
+            if full is None:
+                full = (
+                    watermark is None
+                    or last_full_sync is None
+                    or started_at - last_full_sync >= FULL_SYNC_INTERVAL_SECONDS
+                )
+            elif watermark is None:
+                # A delta needs a watermark to start from
+                full = True
+            
+            modified_since = None
+            if not full:
+                modified_since = datetime.fromtimestamp(
+                    watermark - SYNC_WATERMARK_OVERLAP_SECONDS, tz=timezone.utc
+                )
+            mode = "full" if full else "delta"
+            catalog = await get_active_property_ids()
+            catalog_ids = set(catalog)
+            property_ids = [property_id for property_id in catalog if shard_for_property(property_id) == shard]
+            syncs_unassigned = shard == UNASSIGNED_PROPERTIES_SHARD
+            if not property_ids and not syncs_unassigned:
+                logger.info(f"⏭️ Shard {shard} has no active properties, nothing to sync")
+                return {
+                    "bookings_synced": 0, "inserted": 0, "updated": 0, "unchanged": 0, "conflicts": 0,
+                    "properties": 0
+                }
+            
+            # Properties that joined the shard since its last sync have no
+            # history here yet, so they get a full fetch even in a delta sync
+            known_properties_key = sync_state_key(shard_state_name(shard, "properties"))
+            new_property_ids = []
+            if not full and property_ids:
+                known = await redis_client.smismember(known_properties_key, property_ids)
+                new_property_ids = [property_id for property_id, seen in zip(property_ids, known) if not seen]
+            
+            if full:
+                full_property_ids = list(property_ids)
+                if syncs_unassigned:
+                    full_property_ids += [
+                        property_id for property_id in await list_vrbo_property_ids()
+                        if property_id not in catalog_ids
+                    ]
+            else:
+                full_property_ids = new_property_ids
+            logger.info(
+                f"🔄 Running {mode} sync of shard {shard} ({len(property_ids)} properties, "
+                f"{len(new_property_ids)} new" + (", plus unassigned properties" if syncs_unassigned else "") + ")"
+                + (f" since {modified_since.isoformat()}" if modified_since else "")
+            )
+            
+            # Stream bookings page by page so memory stays flat on large portfolios,
+            # and hand each booking to the concurrent, per-property ordered processor
+            async with BookingProcessor() as processor:
+                if not full:
+                    fetched_in_full = set(new_property_ids)
+                    async for page in stream_vrbo_booking_pages(modified_since):
+                        for booking in page:
+                            property_id = str(booking.get("property_id"))
+                            if property_id not in fetched_in_full and booking_shard(property_id, catalog_ids) == shard:
+                                await processor.submit(booking)
+                
+                if full_property_ids:
+                    async for page in stream_vrbo_booking_pages(property_ids=full_property_ids):
+                        for booking in page:
+                            await processor.submit(booking)
+            sync_stats = processor.summary()
+            
+            # Only advance the watermark once every page has been processed
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.set(sync_state_key(shard_state_name(shard, "watermark")), started_at)
+                if full:
+                    pipe.set(sync_state_key(shard_state_name(shard, "last_full_sync")), started_at)
+                pipe.delete(known_properties_key)
+                if property_ids:
+                    pipe.sadd(known_properties_key, *property_ids)
+                await pipe.execute()
+            await redis_client.set(sync_state_key(shard_state_name(shard, "last_run")), json.dumps({
+                "mode": mode,
+                "worker": sync_leases.owner,
+                "started_at": format_sync_timestamp(started_at),
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "modified_since": modified_since.isoformat() if modified_since else None,
+                "properties": len(property_ids),
+                **sync_stats
+            }))
+            
+            logger.info(
+                f"✅ Synchronized {sync_stats['bookings_synced']} bookings ({mode} sync of shard {shard}): "
+                f"{sync_stats['inserted']} inserted, {sync_stats['updated']} updated, "
+                f"{sync_stats['unchanged']} unchanged "
+                f"at {sync_stats['bookings_per_second']} bookings/s with {sync_stats['workers']} workers"
+            )
+            return sync_stats
+            
+        except Exception as e:
+            logger.error(f"❌ Booking sync of shard {shard} failed: {e}")
+            return None
+
+def shard_for_property(property_id: str) -> int:
+    """Sync shard that owns a VRBO property
+
+    Uses blake2b rather than crc32 so the shard does not also fix the
+    BookingProcessor lane (crc32 % SYNC_WORKERS) of every property in it.
+    """
+    digest = hashlib.blake2b(str(property_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % SYNC_SHARDS
+
+def booking_shard(property_id: str, catalog_ids: Collection[str]) -> int:
+    """Sync shard that owns a booking: its property's shard, or
+    UNASSIGNED_PROPERTIES_SHARD if the property is not in the active catalog"""
+    if property_id not in catalog_ids:
+        return UNASSIGNED_PROPERTIES_SHARD
+    return shard_for_property(property_id)
+
+def shard_state_name(shard: int, name: str) -> str:
+    return f"shard:{shard}:{name}"
+
+async def get_active_property_ids() -> List[str]:
+    """VRBO property ids of the active property catalog"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(text(
+            "SELECT vrbo_property_id FROM properties "
+            "WHERE sync_status = 'active' AND vrbo_property_id IS NOT NULL "
+            "ORDER BY vrbo_property_id"
+        ))
+        return [property_id for (property_id,) in result]
+
+def sync_state_key(name: str) -> str:
+    """Redis key for per-account booking sync state"""
+    return f"vrbo:sync:{VRBO_CLIENT_ID}:{name}"
+
+async def get_sync_timestamp(name: str) -> Optional[float]:
+    """Get a stored sync timestamp (epoch seconds) for this account"""
+    value = await redis_client.get(sync_state_key(name))
+    return float(value) if value else None
+
+def format_sync_timestamp(timestamp: Optional[float]) -> Optional[str]:
+    """Format an epoch timestamp as UTC ISO-8601"""
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+async def get_vrbo_auth_token() -> Optional[str]:
+    """Get authentication token from VRBO API (cached by the shared client)"""
+    return await vrbo_client.get_token()
+
+async def fetch_vrbo_bookings_page(
+    cursor: Optional[str] = None,
+    modified_since: Optional[datetime] = None,
+    property_id: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Fetch a single page of bookings from VRBO API
+
+    Returns the page of bookings and the cursor for the next page, which is
+    None once the last page has been reached.
+    """
+    params = {"limit": VRBO_PAGE_SIZE}
+    if cursor:
+        params["cursor"] = cursor
+    if modified_since:
+        params["modified_since"] = modified_since.isoformat()
+    if property_id:
+        params["property_id"] = property_id
+    
+    async with vrbo_client.request("GET", "/bookings/v1/bookings", params=params) as response:
+        if response.status == 200:
+            result = await response.json()
+            await journal_payload("/bookings/v1/bookings", result)
+            return result.get("bookings", []), result.get("next_cursor")
+        else:
+            logger.error(f"Failed to fetch bookings: {response.status}")
+            raise VRBOAPIError(f"Booking fetch failed with status {response.status}")
+
+async def stream_vrbo_booking_pages(
+    modified_since: Optional[datetime] = None,
+    property_ids: Optional[List[str]] = None
+) -> AsyncIterator[List[dict]]:
+    """Stream booking pages from VRBO API, following pagination cursors
+
+    Pages cover the whole account, or each of `property_ids` in turn. A
+    background task prefetches the next pages into a bounded queue, so at
+    most SYNC_MAX_INFLIGHT_PAGES pages are buffered while the caller works on
+    the current one. Fetch errors are re-raised to the caller.
+    """
+    pages: asyncio.Queue = asyncio.Queue(maxsize=SYNC_MAX_INFLIGHT_PAGES)
+    
+    async def produce_pages():
+        try:
+            for property_id in (property_ids if property_ids is not None else [None]):
+                cursor = None
+                while True:
+                    bookings, cursor = await fetch_vrbo_bookings_page(cursor, modified_since, property_id)
+                    if bookings:
+                        await pages.put(bookings)
+                    if not cursor:
+                        break
+        except Exception as e:
+            await pages.put(e)
             return
+        await pages.put(None)
+    
+    producer = asyncio.create_task(produce_pages())
+    try:
+        while True:
+            page = await pages.get()
+            if page is None:
+                break
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        producer.cancel()
+
+async def property_catalog_scheduler():
+    """Background scheduler for property catalog synchronization
+
+    The first replica to take the interval lock runs the sync, so the
+    catalog is refreshed once per interval however many replicas there are.
+    """
+    while True:
+        if await redis_client.set(
+            sync_state_key("property_catalog:lock"), instance_id,
+            nx=True, ex=PROPERTY_SYNC_INTERVAL_SECONDS
+        ):
+            await sync_property_catalog()
+        await asyncio.sleep(PROPERTY_SYNC_INTERVAL_SECONDS)
+
+async def sync_property_catalog() -> Optional[Dict[str, Any]]:
+    """Synchronize the property catalog from VRBO API
+
+    Lists every property, then fetches each listing with the ETag and
+    Last-Modified stored from its previous fetch. Listings answering 304
+    are skipped without a body; changed listings are diffed against their
+    stored row and only the changed columns are written. Returns run stats,
+    including bytes and full downloads saved by conditional requests.
+    """
+    if not VRBO_CLIENT_ID or not VRBO_CLIENT_SECRET:
+        logger.warning("⚠️ VRBO API credentials not configured")
+        return None
+    
+    logger.info("🏠 Starting VRBO property catalog synchronization")
+    started = time.monotonic()
+    stats = {
+        "properties": 0, "requests": 0, "not_modified": 0, "inserted": 0,
+        "updated": 0, "unchanged": 0, "failed": 0,
+        "bytes_received": 0, "bytes_saved": 0
+    }
+    
+    try:
+        property_ids = []
+        cursor = None
+        while True:
+            page_ids, cursor = await fetch_vrbo_property_ids_page(cursor)
+            stats["requests"] += 1
+            property_ids.extend(page_ids)
+            if not cursor:
+                break
+        stats["properties"] = len(property_ids)
         
-        # Fetch bookings
-        bookings = await fetch_vrbo_bookings(token)
+        stored_validators = await redis_client.hgetall(PROPERTY_VALIDATORS_KEY)
+        # Validators are only trusted for listings we actually have a row
+        # for; a deleted or never-committed row needs the full listing
+        stored_ids = await get_stored_property_ids(property_ids)
+        semaphore = asyncio.Semaphore(max(1, PROPERTY_SYNC_CONCURRENCY))
         
-        # Process and store bookings
-        for booking in bookings:
-            await process_booking(booking)
+        async def sync_listing(property_id: str):
+            raw = stored_validators.get(property_id.encode())
+            validators = PropertyValidators()
+            if raw and property_id in stored_ids:
+                validators = PropertyValidators.model_validate_json(raw)
+            async with semaphore:
+                try:
+                    listing, new_validators = await fetch_vrbo_property(property_id, validators)
+                except Exception as e:
+                    logger.error(f"❌ Failed to fetch property {property_id}: {e}")
+                    stats["failed"] += 1
+                    return
+            stats["requests"] += 1
+            
+            if listing is None:
+                stats["not_modified"] += 1
+                stats["bytes_saved"] += validators.content_length
+                return
             
-        logger.info(f"✅ Synchronized {len(bookings)} bookings")
+            stats["bytes_received"] += new_validators.content_length
+            outcome = await store_property_listing(listing)
+            stats[outcome] += 1
+            await redis_client.hset(PROPERTY_VALIDATORS_KEY, property_id, new_validators.model_dump_json())
+        
+        await asyncio.gather(*[sync_listing(property_id) for property_id in property_ids])
         
     except Exception as e:
-        logger.error(f"❌ Booking sync failed: {e}")
+        logger.error(f"❌ Property catalog sync failed: {e}")
+        return None
+    
+    full_fetch_bytes = stats["bytes_received"] + stats["bytes_saved"]
+    stats.update({
+        "full_downloads_saved": stats["not_modified"],
+        "bytes_saved_percent": round(100 * stats["bytes_saved"] / full_fetch_bytes, 1) if full_fetch_bytes else 0.0,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+        "finished_at": datetime.now(timezone.utc).isoformat()
+    })
+    await redis_client.set(sync_state_key("property_catalog:last_run"), json.dumps(stats))
+    
+    logger.info(
+        f"✅ Synchronized {stats['properties']} properties: {stats['not_modified']} not modified, "
+        f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['unchanged']} unchanged; "
+        f"saved {stats['bytes_saved']} bytes ({stats['bytes_saved_percent']}%)"
+    )
+    return stats
 
-async def get_vrbo_auth_token():
-    """Get authentication token from VRBO API"""
-    auth_url = f"{VRBO_BASE_URL}/authentication/v1/token"
+async def get_stored_property_ids(property_ids: List[str]) -> Set[str]:
+    """Which of these VRBO property ids have a properties row"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            text("SELECT vrbo_property_id FROM properties WHERE vrbo_property_id = ANY(CAST(:property_ids AS text[]))"),
+            {"property_ids": property_ids}
+        )
+        return {property_id for (property_id,) in result}
+
+async def list_vrbo_property_ids() -> List[str]:
+    """Every property id of the account, following pagination cursors"""
+    property_ids = []
+    cursor = None
+    while True:
+        page_ids, cursor = await fetch_vrbo_property_ids_page(cursor)
+        property_ids.extend(page_ids)
+        if not cursor:
+            return property_ids
+
+async def fetch_vrbo_property_ids_page(cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+    """Fetch a page of property ids from VRBO API; returns the ids and the next cursor"""
+    params = {"limit": VRBO_PAGE_SIZE}
+    if cursor:
+        params["cursor"] = cursor
     
-    async with aiohttp.ClientSession() as session:
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": VRBO_CLIENT_ID,
-            "client_secret": VRBO_CLIENT_SECRET
-        }
-        
-        async with session.post(auth_url, data=data) as response:
-            if response.status == 200:
-                result = await response.json()
-                return result.get("access_token")
-            else:
-                logger.error(f"Auth failed: {response.status}")
-                return None
+    async with vrbo_client.request("GET", "/properties/v1/properties", params=params) as response:
+        if response.status != 200:
+            logger.error(f"Failed to list properties: {response.status}")
+            raise VRBOAPIError(f"Property list failed with status {response.status}")
+        result = await response.json()
+        return [str(listing["id"]) for listing in result.get("properties", [])], result.get("next_cursor")
+
+async def fetch_vrbo_property(
+    property_id: str,
+    validators: PropertyValidators
+) -> Tuple[Optional[dict], PropertyValidators]:
+    """Conditionally fetch one listing
 
-async def fetch_vrbo_bookings(token: str):
-    """Fetch bookings from VRBO API"""
-    bookings_url = f"{VRBO_BASE_URL}/bookings/v1/bookings"
-    headers = {"Authorization": f"Bearer {token}"}
+    Returns (None, validators) on 304 Not Modified, otherwise the listing
+    and the validators to send next time.
+    """
+    headers = {}
+    if validators.etag:
+        headers["If-None-Match"] = validators.etag
+    if validators.last_modified:
+        headers["If-Modified-Since"] = validators.last_modified
     
-    async with aiohttp.ClientSession() as session:
-        async with session.get(bookings_url, headers=headers) as response:
-            if response.status == 200:
-                result = await response.json()
-                return result.get("bookings", [])
-            else:
-                logger.error(f"Failed to fetch bookings: {response.status}")
-                return []
+    async with vrbo_client.request("GET", f"/properties/v1/properties/{property_id}", headers=headers) as response:
+        if response.status == 304:
+            return None, validators
+        if response.status != 200:
+            raise VRBOAPIError(f"Property fetch failed with status {response.status}")
+        
+        body = await response.read()
+        return json.loads(body), PropertyValidators(
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            content_length=len(body)
+        )
+
+async def journal_payload(source: str, payload: Dict[str, Any]):
+    """Append a raw payload to the journal; a journal failure never stops ingestion"""
+    if not payload_journal:
+        return
+    try:
+        await payload_journal.append(source, payload)
+    except OSError as e:
+        logger.error(f"❌ Failed to journal {source} payload: {e}")
 
 async def process_booking(booking_data: dict):
     """Process and store individual booking"""
     try:
-        # Store in database
-        await store_booking_in_db(booking_data)
-        
-        # Cache in Redis for quick access
-        await redis_client.setex(
-            f"booking:{booking_data['id']}", 
-            86400, 
-            str(booking_data)
+        await process_booking_page([booking_data])
+    except Exception as e:
+        logger.error(f"❌ Failed to process booking {booking_data.get('id')}: {e}")
+
+async def process_booking_page(bookings: List[dict], force: bool = False) -> Dict[str, int]:
+    """Process and store a page of bookings
+
+    Each booking's content fingerprint is compared with the one stored for
+    it, so unchanged bookings are skipped after a single HMGET. Changed
+    bookings are diffed field by field against their stored row; only rows
+    with a non-empty diff are written (in one batched upsert), and guest
+    communications are only rescheduled when the diff touches status or
+    check-in. Returns inserted/updated/unchanged counts. Database errors
+    propagate so the sync does not advance its watermark past unsaved
+    bookings.
+
+    force skips the fingerprint shortcuts and diffs every booking, for
+    rebuilding stored rows after booking_to_row changes.
+    """
+    # Keep only the latest payload per booking id
+    payloads = {}
+    rows = {}
+    for booking_data in bookings:
+        try:
+            row = booking_to_row(booking_data)
+        except (KeyError, ValueError) as e:
+            logger.error(f"❌ Skipping malformed booking {booking_data.get('id')}: {e}")
+            continue
+        payloads[row["vrbo_booking_id"]] = booking_data
+        rows[row["vrbo_booking_id"]] = row
+    
+    if not rows:
+        return {"inserted": 0, "updated": 0, "unchanged": 0, "conflicts": 0}
+    
+    booking_ids = list(rows)
+    fingerprints = {booking_id: booking_fingerprint(payloads[booking_id]) for booking_id in booking_ids}
+    known_fingerprints = await redis_client.hmget(BOOKING_FINGERPRINTS_KEY, booking_ids)
+    changed_ids = [
+        booking_id for booking_id, known in zip(booking_ids, known_fingerprints)
+        if force or known is None or known.decode() != fingerprints[booking_id]
+    ]
+    if not changed_ids:
+        return {"inserted": 0, "updated": 0, "unchanged": len(rows), "conflicts": 0}
+    
+    # Diff changed bookings against their stored rows; the stored
+    # content_hash also catches bookings whose Redis fingerprint was lost
+    previous_rows = await fetch_booking_rows(changed_ids)
+    diffs = {}
+    for booking_id in changed_ids:
+        previous = previous_rows.get(booking_id)
+        if not force and previous is not None and previous["content_hash"] == fingerprints[booking_id]:
+            diffs[booking_id] = {}
+        else:
+            diffs[booking_id] = booking_diff(previous, rows[booking_id])
+    
+    # Store in database
+    db_stats = await store_bookings_in_db([
+        {**rows[booking_id], "content_hash": fingerprints[booking_id]}
+        for booking_id in changed_ids if diffs[booking_id]
+    ])
+    
+    # Keep the availability index current and catch double bookings as
+    # they arrive
+    calendar_changes = []
+    conflict_alerts = []
+    for booking_id in changed_ids:
+        if AVAILABILITY_FIELDS & diffs[booking_id].keys():
+            change = calendar_change(rows[booking_id])
+            calendar_changes.append(change)
+            for other in upsert_availability(change):
+                conflict_alerts.append({
+                    "property_id": change[1],
+                    "booking_id": booking_id,
+                    "conflicts_with": other,
+                    "check_in": change[2].isoformat(),
+                    "check_out": change[3].isoformat()
+                })
+    for alert in conflict_alerts:
+        logger.warning(
+            f"🚨 Double booking at {alert['property_id']}: {alert['booking_id']} "
+            f"({alert['check_in']} to {alert['check_out']}) overlaps {alert['conflicts_with']}"
         )
+    
+    # Trigger guest communication for new confirmations and reschedule it
+    # when the stay moves; the outbox rows are written before the booking's
+    # fingerprint, so a failure here is retried by the next sync
+    scheduled_emails = []
+    for booking_id in changed_ids:
+        booking_data = payloads[booking_id]
+        if booking_data.get("status") == "confirmed" and COMMUNICATION_FIELDS & diffs[booking_id].keys():
+            try:
+                scheduled_emails.extend(guest_communication_schedule(booking_data))
+            except (KeyError, ValueError) as e:
+                logger.error(f"❌ Failed to schedule guest communications for booking {booking_id}: {e}")
+    await enqueue_guest_emails(scheduled_emails)
+    
+    # Cache changed bookings, record their fingerprints and wake the email
+    # dispatchers for the whole page in one pipelined Redis round trip
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for booking_id in changed_ids:
+            pipe.setex(
+                f"booking:{booking_id}",
+                BOOKING_CACHE_TTL_SECONDS,
+                encode_booking(payloads[booking_id])
+            )
         
-        # Trigger guest communication if new booking
-        if booking_data.get("status") == "confirmed":
-            await schedule_guest_communications(booking_data)
-        
-        logger.info(f"✅ Processed booking {booking_data['id']}")
+        pipe.hset(BOOKING_FINGERPRINTS_KEY, mapping={
+            booking_id: fingerprints[booking_id] for booking_id in changed_ids
+        })
+        if scheduled_emails:
+            pipe.publish(
+                scheduled_email_dispatcher.wakeup_channel,
+                min(email["scheduled_time"] for email in scheduled_emails).replace(tzinfo=timezone.utc).timestamp()
+            )
+        if db_stats["inserted"] or db_stats["updated"]:
+            # Orphan every cached GET /bookings page
+            pipe.incr(BOOKINGS_PAGE_CACHE_GENERATION_KEY)
+        if calendar_changes:
+            pipe.publish(BOOKING_CHANGES_CHANNEL, json.dumps({
+                "origin": instance_id,
+                "changes": [encode_calendar_change(change) for change in calendar_changes]
+            }))
+        for alert in conflict_alerts:
+            pipe.publish(BOOKING_CONFLICTS_CHANNEL, json.dumps(alert))
+        await pipe.execute()
+    
+    db_stats["unchanged"] = len(rows) - db_stats["inserted"] - db_stats["updated"]
+    db_stats["conflicts"] = len(conflict_alerts)
+    logger.info(
+        f"✅ Processed {len(bookings)} bookings "
+        f"({db_stats['inserted']} new, {db_stats['updated']} updated, "
+        f"{db_stats['unchanged']} unchanged)"
+    )
+    return db_stats
+
+class BookingProcessor:
+    """Concurrent booking processor that preserves per-property ordering"""
+    
+    def __init__(
+        self,
+        workers: int = SYNC_WORKERS,
+        max_concurrency: int = SYNC_MAX_CONCURRENCY,
+        batch_size: int = VRBO_PAGE_SIZE,
+        force: bool = False
+    ):
+        self.workers = max(1, workers)
+        self.force = force
+        self.batch_size = max(1, batch_size)
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self.lanes = [asyncio.Queue(maxsize=self.batch_size * 2) for _ in range(self.workers)]
+        self.tasks: List[asyncio.Task] = []
+        self.first_error: Optional[Exception] = None
+        self.failed_batches = 0
+        self.totals = {"inserted": 0, "updated": 0, "unchanged": 0, "conflicts": 0}
+        self.processed = 0
+        self.started_at = 0.0
+        self.elapsed = 0.0
+    
+    async def __aenter__(self):
+        self.started_at = time.monotonic()
+        self.tasks = [asyncio.create_task(self._run_lane(lane)) for lane in self.lanes]
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            for lane in self.lanes:
+                await lane.put(None)
+        else:
+            for task in self.tasks:
+                task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.elapsed = time.monotonic() - self.started_at
         
+        # Surface failed batches so the sync does not advance its watermark
+        if exc_type is None and self.first_error:
+            raise self.first_error
+        return False
+    
+    async def submit(self, booking_data: dict):
+        """Queue a booking on the lane that owns its property"""
+        key = str(booking_data.get("property_id") or booking_data.get("id"))
+        lane = self.lanes[zlib.crc32(key.encode()) % self.workers]
+        await lane.put(booking_data)
+    
+    async def _run_lane(self, lane: asyncio.Queue):
+        finished = False
+        while not finished:
+            booking = await lane.get()
+            if booking is None:
+                break
+            
+            # Batch whatever is already waiting on this lane, in order
+            batch = [booking]
+            while len(batch) < self.batch_size and not lane.empty():
+                booking = lane.get_nowait()
+                if booking is None:
+                    finished = True
+                    break
+                batch.append(booking)
+            
+            try:
+                async with self.semaphore:
+                    batch_stats = await process_booking_page(batch, force=self.force)
+                for key in self.totals:
+                    self.totals[key] += batch_stats[key]
+                self.processed += len(batch)
+            except Exception as e:
+                logger.error(f"❌ Failed to process batch of {len(batch)} bookings: {e}")
+                self.failed_batches += 1
+                self.first_error = self.first_error or e
+    
+    def summary(self) -> Dict[str, Any]:
+        """Counts and achieved throughput for this run"""
+        elapsed = self.elapsed or (time.monotonic() - self.started_at)
+        return {
+            "bookings_synced": self.processed,
+            **self.totals,
+            "workers": self.workers,
+            "elapsed_seconds": round(elapsed, 3),
+            "bookings_per_second": round(self.processed / elapsed, 1) if elapsed > 0 else 0.0
+        }
+
+async def webhook_ingestion_worker():
+    """Feed queued webhook bookings through the booking processing pipeline
+
+    Reads batches of events from the shared events stream as this replica's
+    consumer, first reclaiming events left unacknowledged for
+    WEBHOOK_RETRY_SECONDS by a failed batch or a replica that died.
+    """
+    try:
+        await redis_client.xgroup_create(WEBHOOK_EVENTS_KEY, WEBHOOK_CONSUMER_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+    
+    while True:
+        try:
+            entries = await claim_webhook_events(block_ms=5000)
+            if entries:
+                await process_webhook_events(entries)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error reading {WEBHOOK_EVENTS_KEY}: {e}")
+            await asyncio.sleep(1)
+
+async def claim_webhook_events(block_ms: int) -> List[Tuple[bytes, Dict[bytes, bytes]]]:
+    """Next batch of stream entries for this consumer, retries first
+
+    Reclaimed entries that have already been delivered
+    WEBHOOK_MAX_DELIVERIES times are dead-lettered instead of retried.
+    """
+    # XAUTOCLAIM replies with two elements before Redis 7 and three from
+    # it; the claimed entries are the second either way
+    claimed = await redis_client.xautoclaim(
+        WEBHOOK_EVENTS_KEY,
+        WEBHOOK_CONSUMER_GROUP,
+        instance_id,
+        min_idle_time=WEBHOOK_RETRY_SECONDS * 1000,
+        count=VRBO_PAGE_SIZE
+    )
+    entries = claimed[1]
+    if entries:
+        pending = await redis_client.xpending_range(
+            WEBHOOK_EVENTS_KEY,
+            WEBHOOK_CONSUMER_GROUP,
+            min=entries[0][0],
+            max=entries[-1][0],
+            count=len(entries)
+        )
+        deliveries = {entry["message_id"]: entry["times_delivered"] for entry in pending}
+        # Later events of a booking are redelivered while they wait behind
+        # its failing one, so only a booking's earliest event is given up on
+        exhausted, seen_bookings = [], set()
+        for entry_id, fields in entries:
+            booking_id = webhook_entry_booking_id(fields)
+            if deliveries.get(entry_id, 0) > WEBHOOK_MAX_DELIVERIES and (
+                booking_id is None or booking_id not in seen_bookings
+            ):
+                exhausted.append((entry_id, fields, f"Failed after {WEBHOOK_MAX_DELIVERIES} deliveries"))
+            seen_bookings.add(booking_id)
+        if exhausted:
+            await dead_letter_webhook_entries(exhausted)
+            given_up = {entry_id for entry_id, _, _ in exhausted}
+            entries = [entry for entry in entries if entry[0] not in given_up]
+        if entries:
+            return entries
+    
+    streams = await redis_client.xreadgroup(
+        WEBHOOK_CONSUMER_GROUP,
+        instance_id,
+        {WEBHOOK_EVENTS_KEY: ">"},
+        count=VRBO_PAGE_SIZE,
+        block=block_ms
+    )
+    return streams[0][1] if streams else []
+
+def webhook_entry_booking_id(fields: Optional[Dict[bytes, bytes]]) -> Optional[str]:
+    try:
+        return json.loads(fields[b"event"])["booking"]["id"]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+async def process_webhook_events(entries: List[Tuple[bytes, Dict[bytes, bytes]]]):
+    """Process a batch of stream entries, acknowledging them only once stored
+
+    Entries that are not valid events are dead-lettered on their own. If
+    the batch fails it is retried one event at a time, so one bad booking
+    does not hold back the others.
+    """
+    events: Dict[bytes, BookingWebhookEvent] = {}
+    invalid = []
+    for entry_id, fields in entries:
+        try:
+            events[entry_id] = BookingWebhookEvent.model_validate_json(fields[b"event"])
+        except (KeyError, TypeError, ValueError) as e:
+            invalid.append((entry_id, fields, f"Invalid webhook event: {e}"))
+    if invalid:
+        await dead_letter_webhook_entries(invalid)
+    
+    for event in events.values():
+        await journal_payload("/webhooks/vrbo/bookings", {
+            "event_id": event.event_id,
+            "event_type": event.event_type,
+            "bookings": [event.booking]
+        })
+    
+    if events:
+        await ingest_webhook_events(events)
+
+async def ingest_webhook_events(events: Dict[bytes, BookingWebhookEvent]) -> bool:
+    """Store and acknowledge events by entry id; returns whether all were stored"""
+    try:
+        # Entries are in arrival order, and process_booking_page keeps the
+        # latest payload of each booking
+        await process_booking_page([event.booking for event in events.values()])
     except Exception as e:
-        logger.error(f"❌ Failed to process booking {booking_data['id']}: {e}")
+        if len(events) > 1:
+            logger.warning(f"⚠️ Failed to process {len(events)} webhook events together, retrying one at a time: {e}")
+            # A booking whose event failed keeps its later events pending
+            # too, so they are not applied ahead of it
+            failed_bookings = set()
+            for entry_id, event in events.items():
+                booking_id = event.booking.get("id")
+                if booking_id in failed_bookings:
+                    continue
+                if not await ingest_webhook_events({entry_id: event}):
+                    failed_bookings.add(booking_id)
+            return not failed_bookings
+        
+        event = next(iter(events.values()))
+        logger.error(
+            f"❌ Failed to process webhook event {event.event_id}, "
+            f"retrying after {WEBHOOK_RETRY_SECONDS}s: {e}"
+        )
+        await redis_client.delete(webhook_dedup_key(event.event_id))
+        return False
+    
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.xack(WEBHOOK_EVENTS_KEY, WEBHOOK_CONSUMER_GROUP, *events)
+        pipe.xdel(WEBHOOK_EVENTS_KEY, *events)
+        for event in events.values():
+            pipe.set(webhook_dedup_key(event.event_id), "processed", ex=WEBHOOK_DEDUP_TTL_SECONDS)
+        await pipe.execute()
+    return True
+
+async def dead_letter_webhook_entries(entries: List[Tuple[bytes, Optional[Dict[bytes, bytes]], str]]):
+    """Move (entry id, fields, error) stream entries to the dead-letter stream"""
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for entry_id, fields, error in entries:
+            # Before Redis 7, XAUTOCLAIM returns entries deleted since
+            # delivery with no fields
+            if fields:
+                pipe.xadd(
+                    WEBHOOK_DEAD_LETTERS_KEY,
+                    {**fields, b"entry_id": entry_id, b"error": error},
+                    maxlen=WEBHOOK_QUEUE_SIZE,
+                    approximate=True
+                )
+        entry_ids = [entry_id for entry_id, _, _ in entries]
+        pipe.xack(WEBHOOK_EVENTS_KEY, WEBHOOK_CONSUMER_GROUP, *entry_ids)
+        pipe.xdel(WEBHOOK_EVENTS_KEY, *entry_ids)
+        await pipe.execute()
+    for entry_id, _, error in entries:
+        logger.error(f"❌ Dead-lettered webhook entry {entry_id.decode()}: {error}")
 
 async def sync_bookings_scheduler():
-    """Background scheduler for booking synchronization"""
+    """Background scheduler for booking synchronization
+
+    Claims this replica's share of the sync shards through Redis leases and
+    runs each owned shard on its own schedule. A shard's sync is cancelled
+    as soon as its lease is lost or handed to another replica, and shards
+    of a replica that stops heartbeating are picked up once its leases
+    expire, so every shard is synced by exactly one replica.
+    """
+    if not VRBO_CLIENT_ID or not VRBO_CLIENT_SECRET:
+        logger.warning("⚠️ VRBO API credentials not configured, booking sync disabled")
+        return
+    
+    shard_tasks: Dict[int, asyncio.Task] = {}
+    
+    def start_shard(shard: int):
+        shard_tasks[shard] = asyncio.create_task(run_sync_shard(shard))
+    
+    def stop_shard(shard: int):
+        task = shard_tasks.pop(shard, None)
+        if task:
+            task.cancel()
+    
+    await sync_leases.run(start_shard, stop_shard)
+
+async def run_sync_shard(shard: int):
+    """Sync an owned shard every SYNC_INTERVAL_SECONDS, based on its watermark
+
+    The schedule lives in Redis, so a shard taken over from another replica
+    continues where it left off instead of syncing again straight away.
+    """
     while True:
-        await asyncio.sleep(3600)  # Run every hour
-        await sync_bookings_from_vrbo()
+        watermark = await get_sync_timestamp(shard_state_name(shard, "watermark"))
+        if watermark is not None:
+            delay = watermark + SYNC_INTERVAL_SECONDS - datetime.now(timezone.utc).timestamp()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        
+        sync_stats = await sync_booking_shard(shard)
+        if sync_stats is None:
+            await asyncio.sleep(SYNC_RETRY_SECONDS)
+        elif sync_stats.get("properties") == 0:
+            # Nothing to sync yet, and no watermark to schedule from
+            await asyncio.sleep(SYNC_INTERVAL_SECONDS)
 
 async def guest_communication_scheduler():
-    """Background scheduler for guest communications"""
-    while True:
-        await asyncio.sleep(1800)  # Run every 30 minutes
-        await process_scheduled_communications()
+    """Background scheduler for guest communications
+
+    Sends each scheduled email at its due time rather than on a fixed poll;
+    see EmailOutboxDispatcher for the wake-up and claiming logic. Emails
+    still sitting in the old scheduled_emails Redis set are moved into the
+    outbox first.
+    """
+    try:
+        await migrate_scheduled_emails_zset()
+    except Exception as e:
+        logger.error(f"❌ Failed to migrate scheduled_emails into the email outbox: {e}")
+    await scheduled_email_dispatcher.run()
 
 async def send_guest_welcome_email(booking_id: str):
     """Send welcome email to guest"""
@@ -222,52 +1343,677 @@ async def send_guest_welcome_email(booking_id: str):
 
 async def schedule_guest_communications(booking_data: dict):
     """Schedule automated guest communications"""
-    checkin_date = datetime.fromisoformat(booking_data['check_in'])
-    
-    # Schedule welcome email (immediate)
-    await schedule_email("welcome", booking_data, datetime.now())
-    
-    # Schedule check-in instructions (24 hours before)
-    checkin_reminder = checkin_date - timedelta(hours=24)
-    await schedule_email("checkin_instructions", booking_data, checkin_reminder)
+    emails = guest_communication_schedule(booking_data)
+    await enqueue_guest_emails(emails)
+    await notify_email_dispatchers(emails)
+
+def guest_communication_schedule(booking_data: dict) -> List[dict]:
+    """Build email_queue outbox rows for a booking's guest communications
+
+    Send times are naive UTC, like every email_queue timestamp.
+    """
+    checkin_date = datetime.fromisoformat(booking_data['check_in'][:10])
     
-    # Schedule checkout instructions (day of checkin)
-    await schedule_email("checkout_instructions", booking_data, checkin_date)
+    return [
+        # Welcome email (immediate)
+        guest_email_row("welcome", booking_data, utc_now()),
+        # Check-in instructions (24 hours before)
+        guest_email_row("checkin_instructions", booking_data, checkin_date - timedelta(hours=24)),
+        # Checkout instructions (day of checkin)
+        guest_email_row("checkout_instructions", booking_data, checkin_date)
+    ]
+
+def guest_email_row(email_type: str, booking_data: dict, send_time: datetime) -> dict:
+    return {
+        "booking_id": str(booking_data["id"]),
+        "email_type": email_type,
+        "recipient_email": booking_data.get("guest_email") or "",
+        "recipient_name": booking_data.get("guest_name"),
+        "subject": GUEST_EMAIL_SUBJECTS.get(email_type, email_type.replace("_", " ").title()),
+        "scheduled_time": send_time
+    }
+
+def utc_now() -> datetime:
+    """Current time as naive UTC, matching email_queue timestamps"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 async def schedule_email(email_type: str, booking_data: dict, send_time: datetime):
     """Schedule email to be sent at specific time"""
-    await redis_client.zadd(
-        "scheduled_emails",
-        {f"{email_type}:{booking_data['id']}": send_time.timestamp()}
-    )
+    if send_time.tzinfo is not None:
+        send_time = send_time.astimezone(timezone.utc).replace(tzinfo=None)
+    emails = [guest_email_row(email_type, booking_data, send_time)]
+    await enqueue_guest_emails(emails)
+    await notify_email_dispatchers(emails)
+
+async def notify_email_dispatchers(emails: List[dict]):
+    if emails:
+        earliest = min(email["scheduled_time"] for email in emails)
+        await scheduled_email_dispatcher.notify(earliest.replace(tzinfo=timezone.utc).timestamp())
 
 async def process_scheduled_communications():
     """Process scheduled communications that are due"""
-    now = datetime.now().timestamp()
-    
-    # Get due communications
-    due_communications = await redis_client.zrangebyscore(
-        "scheduled_emails", 0, now, withscores=True
-    )
-    
-    for comm_data, score in due_communications:
-        email_type, booking_id = comm_data.decode().split(":", 1)
-        await send_scheduled_email(email_type, booking_id)
-        await redis_client.zrem("scheduled_emails", comm_data)
+    await scheduled_email_dispatcher.dispatch_due()
+
+async def send_due_emails(due_emails: List[dict]):
+    """Send a batch of claimed outbox emails and record the outcome of each"""
+    sent, failed = [], []
+    for email in due_emails:
+        try:
+            await send_scheduled_email(email["email_type"], email["booking_id"])
+            sent.append(email["id"])
+        except Exception as e:
+            logger.error(f"❌ Failed to send {email['email_type']} email for booking {email['booking_id']}: {e}")
+            failed.append({"id": email["id"], "error": str(e)})
+    await complete_outbox_emails(sent, failed)
 
 async def send_scheduled_email(email_type: str, booking_id: str):
     """Send scheduled email"""
     logger.info(f"📧 Sending {email_type} email for booking {booking_id}")
     # Implementation would load template and send email
 
+class EmailOutboxDispatcher(DelayedDispatcher):
+    """Exact-time dispatcher for the email_queue outbox, claiming due rows with SKIP LOCKED"""
+    
+    def __init__(self, redis_client, handler, batch_size: int, workers: int):
+        super().__init__(redis_client, "email_queue:wakeup")
+        self.handler = handler
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+    
+    async def claim_due(self) -> List[dict]:
+        """Claim up to batch_size due (or abandoned) outbox rows"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(text(CLAIM_DUE_EMAILS_QUERY), {
+                "batch_size": self.batch_size,
+                "claim_timeout": EMAIL_CLAIM_TIMEOUT_SECONDS
+            })
+            claimed = [dict(row._mapping) for row in result]
+            await session.commit()
+        return claimed
+    
+    async def dispatch_due(self) -> int:
+        """Drain every due row with `workers` concurrent claimers"""
+        async def drain() -> int:
+            dispatched = 0
+            while True:
+                emails = await self.claim_due()
+                if not emails:
+                    return dispatched
+                await self.handler(emails)
+                dispatched += len(emails)
+                if len(emails) < self.batch_size:
+                    return dispatched
+        
+        return sum(await asyncio.gather(*[drain() for _ in range(self.workers)]))
+    
+    async def seconds_until_next_job(self) -> float:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(text("""
+                SELECT EXTRACT(EPOCH FROM MIN(scheduled_time) - timezone('utc', NOW()))
+                FROM email_queue
+                WHERE delivery_status = 'pending'
+            """))
+            delay = result.scalar()
+        if delay is None:
+            return self.max_sleep
+        return min(self.max_sleep, max(0.0, float(delay)))
+
+scheduled_email_dispatcher = EmailOutboxDispatcher(
+    redis_client,
+    send_due_emails,
+    batch_size=SCHEDULED_EMAIL_BATCH_SIZE,
+    workers=EMAIL_OUTBOX_WORKERS
+)
+
+async def migrate_scheduled_emails_zset() -> int:
+    """Move emails scheduled in the old scheduled_emails Redis set into the outbox
+
+    Emails whose booking is not stored yet stay in the set, to be moved on a
+    later start once the booking has been synced.
+    """
+    legacy = await redis_client.zrange("scheduled_emails", 0, -1, withscores=True)
+    if not legacy:
+        return 0
+    
+    members = {member.decode(): score for member, score in legacy}
+    stored = await fetch_booking_rows(list({member.split(":", 1)[1] for member in members}))
+    emails = []
+    migrated = []
+    for member, score in members.items():
+        email_type, booking_id = member.split(":", 1)
+        row = stored.get(booking_id)
+        if row is None:
+            continue
+        emails.append(guest_email_row(email_type, {
+            "id": booking_id,
+            "guest_email": row["guest_email"],
+            "guest_name": row["guest_name"]
+        }, datetime.fromtimestamp(score, tz=timezone.utc).replace(tzinfo=None)))
+        migrated.append(member)
+    
+    if migrated:
+        await enqueue_guest_emails(emails)
+        await redis_client.zrem("scheduled_emails", *migrated)
+    logger.info(f"📦 Moved {len(emails)} of {len(members)} scheduled emails from Redis into the email outbox")
+    if len(migrated) < len(members):
+        logger.warning(
+            f"⚠️ Left {len(members) - len(migrated)} scheduled emails in Redis until their bookings are synced"
+        )
+    return len(emails)
+
 # Database helper functions (would be implemented with SQLAlchemy)
-async def get_bookings_from_db():
-    """Get bookings from database"""
-    return []
+BookingsCursor = Tuple[date, int]
 
-async def store_booking_in_db(booking_data: dict):
-    """Store booking in database"""
-    pass
+def encode_bookings_cursor(check_in: date, booking_id: int) -> str:
+    """Opaque keyset cursor for the (check_in, id) position of a booking"""
+    raw = json.dumps([check_in.isoformat(), booking_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_bookings_cursor(cursor: str) -> BookingsCursor:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        check_in, booking_id = json.loads(raw)
+        return date.fromisoformat(check_in), int(booking_id)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+def bookings_query(
+    filters: BookingFilters,
+    after: Optional[BookingsCursor],
+    limit: Optional[int] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """Build the keyset query for a bookings listing
+
+    Seeks past `after` with a row comparison on (check_in, id), so every
+    page is an index range scan on idx_bookings_check_in_id no matter how
+    deep it is.
+    """
+    query = """
+        SELECT b.id, b.vrbo_booking_id, p.vrbo_property_id, b.guest_name,
+               b.guest_email, b.guest_count, b.check_in, b.check_out, b.nights,
+               b.total_amount, b.booking_status, b.updated_at
+        FROM bookings b
+        LEFT JOIN properties p ON p.id = b.property_id
+        WHERE b.check_in IS NOT NULL
+    """
+    params: Dict[str, Any] = {}
+    
+    if filters.property_id:
+        query += " AND p.vrbo_property_id = :property_id"
+        params["property_id"] = filters.property_id
+    if filters.status:
+        query += " AND b.booking_status = :status"
+        params["status"] = filters.status
+    if filters.check_in_from:
+        query += " AND b.check_in >= :check_in_from"
+        params["check_in_from"] = filters.check_in_from
+    if filters.check_in_to:
+        query += " AND b.check_in <= :check_in_to"
+        params["check_in_to"] = filters.check_in_to
+    if after:
+        query += " AND (b.check_in, b.id) > (:after_check_in, :after_id)"
+        params["after_check_in"], params["after_id"] = after
+    
+    query += " ORDER BY b.check_in, b.id"
+    if limit is not None:
+        query += " LIMIT :limit"
+        params["limit"] = limit
+    return query, params
+
+def booking_record(row) -> Dict[str, Any]:
+    """JSON-ready booking from a bookings_query row"""
+    return {
+        "id": row.id,
+        "booking_id": row.vrbo_booking_id,
+        "property_id": row.vrbo_property_id,
+        "guest_name": row.guest_name,
+        "guest_email": row.guest_email,
+        "guest_count": row.guest_count,
+        "check_in": row.check_in.isoformat(),
+        "check_out": row.check_out.isoformat() if row.check_out else None,
+        "nights": row.nights,
+        "total_amount": float(row.total_amount) if row.total_amount is not None else None,
+        "status": row.booking_status,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None
+    }
+
+async def get_bookings_from_db(
+    filters: BookingFilters,
+    after: Optional[BookingsCursor] = None,
+    limit: int = BOOKINGS_PAGE_DEFAULT_LIMIT
+) -> Tuple[List[dict], Optional[str]]:
+    """Get one keyset page of bookings; returns the page and the next cursor"""
+    query, params = bookings_query(filters, after, limit + 1)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(text(query), params)
+        rows = result.fetchall()
+    
+    # One extra row tells us whether another page exists
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_bookings_cursor(rows[-1].check_in, rows[-1].id)
+    return [booking_record(row) for row in rows], next_cursor
+
+async def get_bookings_page(
+    filters: BookingFilters,
+    after: Optional[BookingsCursor],
+    limit: int
+) -> Dict[str, Any]:
+    """Read-through cache in front of get_bookings_from_db
+
+    Pages are keyed by the current cache generation, so bumping the
+    generation when a booking changes orphans every cached page at once;
+    orphaned pages simply expire.
+    """
+    generation = (await redis_client.get(BOOKINGS_PAGE_CACHE_GENERATION_KEY) or b"0").decode()
+    page_key = hashlib.blake2b(
+        json.dumps([filters.model_dump(mode="json"), after and [after[0].isoformat(), after[1]], limit]).encode(),
+        digest_size=16
+    ).hexdigest()
+    cache_key = f"vrbo:bookings:page:{generation}:{page_key}"
+    
+    cached = await redis_client.get(cache_key)
+    if cached:
+        return json.loads(cached)
+    
+    bookings, next_cursor = await get_bookings_from_db(filters, after, limit)
+    page = {"bookings": bookings, "next_cursor": next_cursor, "limit": limit}
+    await redis_client.setex(cache_key, BOOKINGS_PAGE_CACHE_TTL_SECONDS, json.dumps(page))
+    return page
+
+async def stream_bookings_ndjson(
+    filters: BookingFilters,
+    after: Optional[BookingsCursor] = None
+) -> AsyncIterator[bytes]:
+    """Stream matching bookings as NDJSON from a server-side cursor
+
+    Rows are fetched BOOKINGS_STREAM_BATCH_SIZE at a time, so memory stays
+    flat however many bookings match.
+    """
+    query, params = bookings_query(filters, after)
+    async with engine.connect() as connection:
+        result = await connection.stream(
+            text(query).execution_options(yield_per=BOOKINGS_STREAM_BATCH_SIZE),
+            params
+        )
+        async for rows in result.partitions():
+            yield "".join(json.dumps(booking_record(row)) + "\n" for row in rows).encode()
+
+def encode_booking(booking_data: dict) -> str:
+    """Encode a booking as compact JSON for the Redis cache"""
+    return json.dumps(booking_data, separators=(",", ":"), default=str)
+
+def booking_fingerprint(booking_data: dict) -> str:
+    """Content fingerprint of a booking payload, independent of key order"""
+    canonical = json.dumps(booking_data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+def booking_diff(previous: Optional[dict], row: dict) -> Dict[str, Dict[str, Any]]:
+    """Field-level diff between a stored booking row and a new one
+
+    A booking with no stored row diffs on every field.
+    """
+    return {
+        column: {"old": previous.get(column) if previous else None, "new": row[column]}
+        for column in BOOKING_COLUMNS[1:]
+        if previous is None or previous.get(column) != row[column]
+    }
+
+def booking_to_row(booking_data: dict) -> dict:
+    """Map a VRBO booking payload onto bookings table columns"""
+    return {
+        "vrbo_booking_id": str(booking_data["id"]),
+        "vrbo_property_id": str(booking_data["property_id"]),
+        "guest_name": booking_data.get("guest_name"),
+        "guest_email": booking_data.get("guest_email"),
+        "guest_count": booking_data.get("guest_count"),
+        "check_in": date.fromisoformat(str(booking_data["check_in"])[:10]),
+        "check_out": date.fromisoformat(str(booking_data["check_out"])[:10]),
+        "total_amount": Decimal(str(booking_data.get("total_amount") or 0)),
+        "booking_status": booking_data.get("status")
+    }
+
+BOOKING_COLUMNS = (
+    "vrbo_booking_id", "vrbo_property_id", "guest_name", "guest_email", "guest_count",
+    "check_in", "check_out", "total_amount", "booking_status"
+)
+
+# Changes to these fields (re)schedule guest communications
+COMMUNICATION_FIELDS = {"booking_status", "check_in"}
+
+# Changes to these fields move a booking in the availability index
+AVAILABILITY_FIELDS = {"vrbo_property_id", "check_in", "check_out", "booking_status"}
+
+CalendarChange = Tuple[str, str, date, date, str]
+
+# Calendar changes applied while the index is being reloaded, to replay
+# onto the reloaded index; None when no reload is running
+availability_index_reload_changes: Optional[List[CalendarChange]] = None
+
+def calendar_change(row: dict) -> CalendarChange:
+    """Availability index entry (booking, property, check-in, check-out, status) for a booking row"""
+    return (
+        row["vrbo_booking_id"], row["vrbo_property_id"],
+        row["check_in"], row["check_out"], row["booking_status"]
+    )
+
+def encode_calendar_change(change: CalendarChange) -> list:
+    booking_id, property_id, check_in, check_out, status = change
+    return [booking_id, property_id, check_in.isoformat(), check_out.isoformat(), status]
+
+def decode_calendar_change(change: list) -> CalendarChange:
+    booking_id, property_id, check_in, check_out, status = change
+    return booking_id, property_id, date.fromisoformat(check_in), date.fromisoformat(check_out), status
+
+async def load_availability_index() -> int:
+    """(Re)build the availability index from every confirmed booking in the database
+
+    The bookings are loaded into a fresh index while the current one keeps
+    serving requests. Changes applied in the meantime are replayed onto the
+    fresh index, which then replaces the current one in a single step.
+    """
+    global availability_index, availability_index_reload_changes
+    query = text("""
+        SELECT b.vrbo_booking_id, p.vrbo_property_id, b.check_in, b.check_out, b.booking_status
+        FROM bookings b
+        JOIN properties p ON p.id = b.property_id
+        WHERE b.booking_status = 'confirmed'
+        ORDER BY b.check_in
+    """)
+    index = AvailabilityIndex()
+    availability_index_reload_changes = []
+    try:
+        async with engine.connect() as connection:
+            result = await connection.stream(query.execution_options(yield_per=BOOKINGS_STREAM_BATCH_SIZE))
+            loaded = 0
+            async for rows in result.partitions():
+                loaded += index.load(tuple(row) for row in rows)
+        
+        for change in availability_index_reload_changes:
+            index.upsert(*change)
+        availability_index = index
+    finally:
+        availability_index_reload_changes = None
+    return loaded
+
+def upsert_availability(change: CalendarChange) -> List[str]:
+    """Apply a calendar change to the availability index (and keep it for
+    the reloaded index if a reload is running); returns conflicting bookings"""
+    if availability_index_reload_changes is not None:
+        availability_index_reload_changes.append(change)
+    return availability_index.upsert(*change)
+
+async def availability_index_listener():
+    """Build the availability index and apply other replicas' booking changes
+
+    Subscribes before loading from the database so no change falls between
+    the two, and reloads after a lost subscription since pub/sub does not
+    replay missed messages.
+    """
+    await listen_forever(
+        redis_client,
+        BOOKING_CHANGES_CHANNEL,
+        apply_booking_changes,
+        on_subscribe=reload_availability_index
+    )
+
+async def reload_availability_index():
+    loaded = await load_availability_index()
+    availability_index_ready.set()
+    logger.info(
+        f"📅 Availability index loaded with {loaded} bookings "
+        f"({availability_index.conflict_count()} conflicts)"
+    )
+
+def apply_booking_changes(data: bytes):
+    update = json.loads(data)
+    if update["origin"] == instance_id:
+        return
+    for change in update["changes"]:
+        upsert_availability(decode_calendar_change(change))
+
+# Rows are passed as parallel arrays and unnested, so a whole page is one
+# statement and one round trip. Rows whose columns are all unchanged are
+# skipped by the DO UPDATE ... WHERE clause and not returned; xmax = 0 marks
+# freshly inserted rows.
+UPSERT_BOOKINGS_QUERY = """
+WITH incoming AS (
+    SELECT i.*, p.id AS property_id
+    FROM unnest(
+        CAST(:vrbo_booking_id AS text[]),
+        CAST(:vrbo_property_id AS text[]),
+        CAST(:guest_name AS text[]),
+        CAST(:guest_email AS text[]),
+        CAST(:guest_count AS integer[]),
+        CAST(:check_in AS date[]),
+        CAST(:check_out AS date[]),
+        CAST(:total_amount AS numeric[]),
+        CAST(:booking_status AS text[]),
+        CAST(:content_hash AS text[])
+    ) AS i(vrbo_booking_id, vrbo_property_id, guest_name, guest_email, guest_count,
+           check_in, check_out, total_amount, booking_status, content_hash)
+    LEFT JOIN properties p ON p.vrbo_property_id = i.vrbo_property_id
+)
+INSERT INTO bookings (
+    vrbo_booking_id, property_id, guest_name, guest_email, guest_count,
+    check_in, check_out, nights, total_amount, booking_status, content_hash, updated_at
+)
+SELECT vrbo_booking_id, property_id, guest_name, guest_email, guest_count,
+       check_in, check_out, check_out - check_in, total_amount, booking_status, content_hash, NOW()
+FROM incoming
+ON CONFLICT (vrbo_booking_id) DO UPDATE SET
+    property_id = EXCLUDED.property_id,
+    guest_name = EXCLUDED.guest_name,
+    guest_email = EXCLUDED.guest_email,
+    guest_count = EXCLUDED.guest_count,
+    check_in = EXCLUDED.check_in,
+    check_out = EXCLUDED.check_out,
+    nights = EXCLUDED.nights,
+    total_amount = EXCLUDED.total_amount,
+    booking_status = EXCLUDED.booking_status,
+    content_hash = EXCLUDED.content_hash,
+    updated_at = NOW()
+WHERE (bookings.property_id, bookings.guest_name, bookings.guest_email,
+       bookings.guest_count, bookings.check_in, bookings.check_out,
+       bookings.total_amount, bookings.booking_status)
+    IS DISTINCT FROM
+      (EXCLUDED.property_id, EXCLUDED.guest_name, EXCLUDED.guest_email,
+       EXCLUDED.guest_count, EXCLUDED.check_in, EXCLUDED.check_out,
+       EXCLUDED.total_amount, EXCLUDED.booking_status)
+RETURNING (xmax = 0) AS inserted
+"""
+
+# Listings whose catalog fields are all unchanged are skipped by the
+# DO UPDATE ... WHERE clause and not returned; xmax = 0 marks inserted rows
+UPSERT_PROPERTY_QUERY = """
+INSERT INTO properties (vrbo_property_id, name, address, nightly_rate, max_guests, sync_status)
+VALUES (:vrbo_property_id, :name, :address, :nightly_rate, :max_guests, 'active')
+ON CONFLICT (vrbo_property_id) DO UPDATE SET
+    name = EXCLUDED.name,
+    address = EXCLUDED.address,
+    nightly_rate = EXCLUDED.nightly_rate,
+    max_guests = EXCLUDED.max_guests,
+    updated_at = NOW()
+WHERE (properties.name, properties.address, properties.nightly_rate, properties.max_guests)
+    IS DISTINCT FROM
+      (EXCLUDED.name, EXCLUDED.address, EXCLUDED.nightly_rate, EXCLUDED.max_guests)
+RETURNING (xmax = 0) AS inserted
+"""
+
+def property_to_row(listing: dict) -> dict:
+    """Map a VRBO listing onto properties columns"""
+    address = listing.get("address") or ""
+    if isinstance(address, dict):
+        address = ", ".join(
+            str(address[part]) for part in ("line1", "line2", "city", "state", "postal_code", "country")
+            if address.get(part)
+        )
+    data = PropertyData(
+        property_id=str(listing["id"]),
+        name=listing.get("name") or "",
+        address=address,
+        nightly_rate=listing.get("nightly_rate") or 0,
+        max_guests=listing.get("max_guests") or 0
+    )
+    return {
+        "vrbo_property_id": data.property_id,
+        "name": data.name,
+        "address": data.address,
+        "nightly_rate": Decimal(str(data.nightly_rate)).quantize(Decimal("0.01")),
+        "max_guests": data.max_guests
+    }
+
+async def store_property_listing(listing: dict) -> str:
+    """Insert a listing, or update it if any of its catalog fields changed
+
+    Returns "inserted", "updated" or "unchanged".
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(text(UPSERT_PROPERTY_QUERY), property_to_row(listing))
+        stored = result.first()
+        await session.commit()
+    if stored is None:
+        return "unchanged"
+    return "inserted" if stored.inserted else "updated"
+
+# Re-arms pending, failed and cancelled rows when a stay is (re)confirmed
+# or rescheduled, and sent check-in/checkout instructions when their send
+# time moves; rows being sent and already-sent welcome emails are left alone
+ENQUEUE_GUEST_EMAILS_QUERY = """
+    INSERT INTO email_queue (
+        booking_id, email_type, recipient_email, recipient_name, subject, body,
+        scheduled_time, delivery_status
+    )
+    SELECT i.booking_id, i.email_type, i.recipient_email, i.recipient_name, i.subject, '',
+           i.scheduled_time, 'pending'
+    FROM unnest(
+        CAST(:booking_id AS text[]),
+        CAST(:email_type AS text[]),
+        CAST(:recipient_email AS text[]),
+        CAST(:recipient_name AS text[]),
+        CAST(:subject AS text[]),
+        CAST(:scheduled_time AS timestamp[])
+    ) AS i(booking_id, email_type, recipient_email, recipient_name, subject, scheduled_time)
+    ON CONFLICT (booking_id, email_type) DO UPDATE SET
+        recipient_email = EXCLUDED.recipient_email,
+        recipient_name = EXCLUDED.recipient_name,
+        subject = EXCLUDED.subject,
+        scheduled_time = EXCLUDED.scheduled_time,
+        delivery_status = 'pending',
+        error_message = NULL,
+        attempts = 0
+    WHERE email_queue.delivery_status IN ('pending', 'failed', 'cancelled')
+       OR (email_queue.delivery_status = 'sent'
+           AND email_queue.email_type <> 'welcome'
+           AND email_queue.scheduled_time <> EXCLUDED.scheduled_time)
+"""
+
+CLAIM_DUE_EMAILS_QUERY = """
+    WITH due AS (
+        SELECT id FROM email_queue
+        WHERE (delivery_status = 'pending' AND scheduled_time <= timezone('utc', NOW()))
+           OR (delivery_status = 'sending'
+               AND claimed_at < timezone('utc', NOW()) - make_interval(secs => :claim_timeout))
+        ORDER BY scheduled_time
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE email_queue e
+    SET delivery_status = 'sending', claimed_at = timezone('utc', NOW()), attempts = e.attempts + 1
+    FROM due
+    WHERE e.id = due.id
+    RETURNING e.id, e.booking_id, e.email_type, e.recipient_email, e.recipient_name,
+              e.subject, e.scheduled_time, e.attempts
+"""
+
+# Stops the unsent emails of bookings that are no longer confirmed. Rows
+# being sent are cancelled too: a send that completes marks its row sent
+# again, and one whose sender died is not reclaimed.
+CANCEL_GUEST_EMAILS_QUERY = """
+    UPDATE email_queue
+    SET delivery_status = 'cancelled', error_message = 'Booking is no longer confirmed'
+    WHERE booking_id = ANY(CAST(:booking_ids AS text[]))
+      AND delivery_status IN ('pending', 'sending')
+"""
+
+async def enqueue_guest_emails(emails: List[dict]):
+    """Write guest emails to the email_queue outbox in one statement"""
+    if not emails:
+        return
+    columns = ("booking_id", "email_type", "recipient_email", "recipient_name", "subject", "scheduled_time")
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            text(ENQUEUE_GUEST_EMAILS_QUERY),
+            {column: [email[column] for email in emails] for column in columns}
+        )
+        await session.commit()
+
+async def complete_outbox_emails(sent_ids: List[int], failed: List[dict]):
+    """Mark claimed emails sent, or put failed ones back for a delayed retry"""
+    async with AsyncSessionLocal() as session:
+        if sent_ids:
+            await session.execute(text("""
+                UPDATE email_queue
+                SET delivery_status = 'sent', sent_time = timezone('utc', NOW()), error_message = NULL
+                WHERE id = ANY(CAST(:ids AS integer[]))
+            """), {"ids": sent_ids})
+        if failed:
+            await session.execute(text("""
+                UPDATE email_queue e
+                SET delivery_status = CASE WHEN e.attempts >= :max_attempts THEN 'failed' ELSE 'pending' END,
+                    scheduled_time = timezone('utc', NOW()) + make_interval(secs => :retry_delay),
+                    error_message = f.error
+                FROM unnest(CAST(:ids AS integer[]), CAST(:errors AS text[])) AS f(id, error)
+                WHERE e.id = f.id AND e.delivery_status = 'sending'
+            """), {
+                "ids": [email["id"] for email in failed],
+                "errors": [email["error"] for email in failed],
+                "max_attempts": EMAIL_MAX_ATTEMPTS,
+                "retry_delay": EMAIL_RETRY_DELAY_SECONDS
+            })
+        await session.commit()
+
+async def fetch_booking_rows(booking_ids: List[str]) -> Dict[str, dict]:
+    """Fetch stored booking rows (in booking_to_row form) keyed by VRBO id"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(text("""
+            SELECT b.vrbo_booking_id, p.vrbo_property_id, b.guest_name, b.guest_email,
+                   b.guest_count, b.check_in, b.check_out, b.total_amount,
+                   b.booking_status, b.content_hash
+            FROM bookings b
+            LEFT JOIN properties p ON p.id = b.property_id
+            WHERE b.vrbo_booking_id = ANY(CAST(:booking_ids AS text[]))
+        """), {"booking_ids": booking_ids})
+        return {row.vrbo_booking_id: dict(row._mapping) for row in result}
+
+async def store_bookings_in_db(rows: List[dict]) -> Dict[str, int]:
+    """Store booking rows in database with a single multi-row upsert
+
+    Rows come from booking_to_row plus their content_hash, with at most one
+    row per booking id (ON CONFLICT cannot touch a row twice per statement).
+    Unsent guest emails of bookings that are not confirmed are cancelled in
+    the same transaction.
+    """
+    if not rows:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
+    
+    params = {column: [row[column] for row in rows] for column in (*BOOKING_COLUMNS, "content_hash")}
+    
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(text(UPSERT_BOOKINGS_QUERY), params)
+        written = [row.inserted for row in result]
+        unconfirmed = [row["vrbo_booking_id"] for row in rows if row["booking_status"] != "confirmed"]
+        if unconfirmed:
+            await session.execute(text(CANCEL_GUEST_EMAILS_QUERY), {"booking_ids": unconfirmed})
+        await session.commit()
+    
+    inserted = sum(1 for was_inserted in written if was_inserted)
+    return {
+        "inserted": inserted,
+        "updated": len(written) - inserted,
+        "unchanged": len(rows) - len(written)
+    }
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth VRBO Payload Journal
+Append-only, compressed record of every raw booking payload the service
+receives, so bookings can be rebuilt locally without re-pulling VRBO
+
+Usage:
+    python payload_journal.py list --since 2025-07-01T00:00:00+00:00
+    python payload_journal.py replay --since 2025-07-01T00:00:00+00:00
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import socket
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+JOURNAL_SEGMENT_MAX_BYTES = int(os.getenv("VRBO_JOURNAL_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+JOURNAL_SEGMENT_MAX_SECONDS = int(os.getenv("VRBO_JOURNAL_SEGMENT_MAX_SECONDS", "3600"))
+
+SEGMENT_SUFFIX = ".ndjson.gz"
+INDEX_SUFFIX = ".idx"
+
+@dataclass
+class JournalEntry:
+    """Where one journaled payload lives"""
+    fetched_at: float
+    segment: Path
+    offset: int
+    length: int
+    source: str
+    bookings: int
+
+class PayloadJournal:
+    """Segment-rotated journal of raw payloads"""
+
+    def __init__(
+        self,
+        directory: str,
+        segment_max_bytes: int = JOURNAL_SEGMENT_MAX_BYTES,
+        segment_max_seconds: int = JOURNAL_SEGMENT_MAX_SECONDS
+    ):
+        self.directory = Path(directory)
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.writer_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._lock = asyncio.Lock()
+        self._segment = None
+        self._index = None
+        self._segment_opened_at = 0.0
+
+    async def append(self, source: str, payload: Dict[str, Any], fetched_at: Optional[float] = None):
+        """Journal one raw payload; compression and file IO run off the event loop"""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        record = json.dumps(
+            {"fetched_at": fetched_at, "source": source, "payload": payload},
+            separators=(",", ":")
+        )
+        bookings = len(payload.get("bookings", []))
+        async with self._lock:
+            await asyncio.to_thread(self._write, record, fetched_at, source, bookings)
+
+    def _write(self, record: str, fetched_at: float, source: str, bookings: int):
+        member = gzip.compress(record.encode() + b"\n", mtime=0)
+        if self._should_rotate(len(member)):
+            self._rotate(fetched_at)
+
+        offset = self._segment.tell()
+        self._segment.write(member)
+        self._segment.flush()
+        self._index.write(json.dumps([fetched_at, offset, len(member), source, bookings]) + "\n")
+        self._index.flush()
+
+    def _should_rotate(self, size: int) -> bool:
+        if self._segment is None:
+            return True
+        return (
+            self._segment.tell() + size > self.segment_max_bytes
+            or time.monotonic() - self._segment_opened_at >= self.segment_max_seconds
+        )
+
+    def _rotate(self, fetched_at: float):
+        self.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"bookings-{int(fetched_at * 1000)}-{self.writer_id}"
+        self._segment = open(self.directory / f"{name}{SEGMENT_SUFFIX}", "ab")
+        self._index = open(self.directory / f"{name}{INDEX_SUFFIX}", "a")
+        self._segment_opened_at = time.monotonic()
+        logger.info(f"📼 Started payload journal segment {name}")
+
+    def close(self):
+        for handle in (self._segment, self._index):
+            if handle:
+                handle.close()
+        self._segment = self._index = None
+
+def read_index(directory: str, since: Optional[float] = None, until: Optional[float] = None) -> List[JournalEntry]:
+    """Journal entries fetched in [since, until), oldest first"""
+    entries = []
+    for index_path in Path(directory).glob(f"*{INDEX_SUFFIX}"):
+        segment = index_path.with_name(index_path.name[:-len(INDEX_SUFFIX)] + SEGMENT_SUFFIX)
+        with open(index_path) as index_file:
+            for line in index_file:
+                try:
+                    fetched_at, offset, length, source, bookings = json.loads(line)
+                except ValueError:
+                    # Torn final line from a crash; the record is ignored
+                    continue
+                if since is not None and fetched_at < since:
+                    continue
+                if until is not None and fetched_at >= until:
+                    continue
+                entries.append(JournalEntry(fetched_at, segment, offset, length, source, bookings))
+    entries.sort(key=lambda entry: entry.fetched_at)
+    return entries
+
+def read_payloads(entries: List[JournalEntry]) -> Iterator[Dict[str, Any]]:
+    """Decode journaled records, keeping one segment open at a time"""
+    segment_path, segment = None, None
+    try:
+        for entry in entries:
+            if entry.segment != segment_path:
+                if segment:
+                    segment.close()
+                segment_path, segment = entry.segment, open(entry.segment, "rb")
+            segment.seek(entry.offset)
+            yield json.loads(gzip.decompress(segment.read(entry.length)))
+    finally:
+        if segment:
+            segment.close()
+
+async def replay(directory: str, since: Optional[float], until: Optional[float]) -> Dict[str, Any]:
+    """Feed journaled bookings back through the service's processing pipeline
+
+    Bookings are reprocessed in fetch order through BookingProcessor with
+    force=True, so every booking is re-interpreted and diffed against its
+    stored row even if its payload fingerprint is unchanged.
+    """
+    import main as service
+
+    entries = read_index(directory, since, until)
+    logger.info(f"⏪ Replaying {len(entries)} journaled payloads ({sum(e.bookings for e in entries)} bookings)")
+
+    records = 0
+    async with service.BookingProcessor(force=True) as processor:
+        for record in read_payloads(entries):
+            records += 1
+            for booking in record["payload"].get("bookings", []):
+                await processor.submit(booking)
+
+    return {"records": records, **processor.summary()}
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay the VRBO payload journal")
+    parser.add_argument("command", choices=["list", "replay"])
+    parser.add_argument("--dir", default=os.getenv("VRBO_JOURNAL_DIR", "/app/data/journal"), help="Journal directory")
+    parser.add_argument("--since", help="Only payloads fetched at or after this ISO-8601 time")
+    parser.add_argument("--until", help="Only payloads fetched before this ISO-8601 time")
+    args = parser.parse_args()
+
+    since, until = parse_time(args.since), parse_time(args.until)
+    if args.command == "list":
+        entries = read_index(args.dir, since, until)
+        segments = sorted({entry.segment.name for entry in entries})
+        report = {
+            "segments": len(segments),
+            "records": len(entries),
+            "bookings": sum(entry.bookings for entry in entries),
+            "compressed_bytes": sum(entry.length for entry in entries),
+            "first_fetched_at": entries[0].fetched_at if entries else None,
+            "last_fetched_at": entries[-1].fetched_at if entries else None
+        }
+    else:
+        report = asyncio.run(replay(args.dir, since, until))
+    print(json.dumps(report, indent=2, default=str))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth VRBO Webhook Replay Tool
+Replays booking webhook events against a vrbo-automation instance for
+offline load testing
+
+Usage:
+    python webhook_replay.py --generate 10000 --concurrency 50
+    python webhook_replay.py --events captured_events.ndjson --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import aiohttp
+
+from latency_stats import percentiles
+
+WEBHOOK_PATH = "/webhooks/vrbo/bookings"
+
+def load_events(path: str) -> Iterator[Dict]:
+    """Read webhook events from an NDJSON file"""
+    with open(path) as events_file:
+        for line in events_file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def generate_events(count: int, properties: int, duplicate_rate: float) -> Iterator[Dict]:
+    """Generate synthetic booking-created/changed events"""
+    booking_ids: List[str] = []
+    for n in range(count):
+        if booking_ids and random.random() < 0.2:
+            booking_id = random.choice(booking_ids)
+            event_type = "booking.changed"
+        else:
+            booking_id = f"SYN-{n:08d}"
+            booking_ids.append(booking_id)
+            event_type = "booking.created"
+
+        check_in = date.today() + timedelta(days=random.randint(1, 365))
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "event_type": event_type,
+            "booking": {
+                "id": booking_id,
+                "property_id": f"PROP-{random.randrange(properties):04d}",
+                "guest_name": f"Guest {n}",
+                "guest_email": f"guest{n}@example.com",
+                "guest_count": random.randint(1, 8),
+                "check_in": check_in.isoformat(),
+                "check_out": (check_in + timedelta(days=random.randint(1, 14))).isoformat(),
+                "total_amount": round(random.uniform(100, 5000), 2),
+                "status": random.choice(["confirmed", "confirmed", "confirmed", "pending", "cancelled"])
+            }
+        }
+        yield event
+
+        # Re-deliver some events to exercise deduplication
+        if random.random() < duplicate_rate:
+            yield event
+
+def sign(body: bytes, secret: Optional[str]) -> Dict[str, str]:
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-VRBO-Signature"] = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return headers
+
+async def replay(events: Iterator[Dict], url: str, concurrency: int, secret: Optional[str]) -> Dict:
+    """Post events with bounded concurrency and collect latency/status stats"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def worker(session: aiohttp.ClientSession):
+        while True:
+            event = await queue.get()
+            if event is None:
+                return
+            body = json.dumps(event).encode()
+            started = time.perf_counter()
+            try:
+                async with session.post(url, data=body, headers=sign(body, secret)) as response:
+                    result = await response.json(content_type=None)
+                    status = result.get("status", str(response.status)) if isinstance(result, dict) else str(response.status)
+            except aiohttp.ClientError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        workers = [asyncio.create_task(worker(session)) for _ in range(concurrency)]
+        for event in events:
+            await queue.put(event)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "events_sent": len(latencies),
+        "elapsed_seconds": round(elapsed, 2),
+        "events_per_second": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+            **percentiles(latencies)
+        },
+        "responses": statuses
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay VRBO booking webhooks for load testing")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--events", help="NDJSON file of webhook events to replay")
+    source.add_argument("--generate", type=int, help="Number of synthetic events to generate")
+    parser.add_argument("--url", default="http://localhost:8000", help="vrbo-automation base URL")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--properties", type=int, default=50, help="Synthetic property count")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="Share of synthetic events re-delivered")
+    parser.add_argument("--secret", default=os.getenv("VRBO_WEBHOOK_SECRET"), help="HMAC secret for signing")
+    args = parser.parse_args()
+
+    if args.events:
+        events = load_events(args.events)
+    else:
+        events = generate_events(args.generate, args.properties, args.duplicate_rate)
+
+    url = args.url.rstrip("/") + WEBHOOK_PATH
+    report = asyncio.run(replay(events, url, args.concurrency, args.secret))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
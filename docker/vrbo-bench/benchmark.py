@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth VRBO Sync & Messaging Benchmark
+Runs the real vrbo-automation sync and guest-communication send code
+against the fake Partner API and reports throughput and latency
+
+The services still talk to real Postgres and Redis, so point DATABASE_URL
+(postgresql+asyncpg://...) and REDIS_URL at a scratch database before
+running.
+
+Usage:
+    python benchmark.py --bookings 100000 --messages 5000 --latency-ms 30
+    python benchmark.py --api-url http://localhost:8900 --messages 0
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from fake_partner_api import add_config_arguments, config_from_args, start_fake_api
+
+DOCKER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(DOCKER_DIR / "shared"))
+
+from latency_stats import percentiles
+
+def load_service(name: str, directory: str):
+    """Import a service's main.py under a unique module name
+
+    The service's own directory goes on sys.path too, for the modules its
+    main.py imports next to it (as in its Docker image).
+    """
+    service_dir = str(DOCKER_DIR / directory)
+    if service_dir not in sys.path:
+        sys.path.insert(0, service_dir)
+    spec = importlib.util.spec_from_file_location(name, DOCKER_DIR / directory / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def timed(function, samples: List[float]):
+    """Wrap a coroutine function to record its latency"""
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+    return wrapper
+
+async def benchmark_sync(vrbo, warm: bool) -> Dict:
+    page_latencies: List[float] = []
+    batch_latencies: List[float] = []
+    vrbo.fetch_vrbo_bookings_page = timed(vrbo.fetch_vrbo_bookings_page, page_latencies)
+    vrbo.process_booking_page = timed(vrbo.process_booking_page, batch_latencies)
+
+    # Load the fake API's listings the way a deployment does, so most
+    # bookings are synced by their property's shard
+    await vrbo.sync_property_catalog()
+    if not warm:
+        # Forget fingerprints so every booking is fully processed
+        await vrbo.redis_client.delete(vrbo.BOOKING_FINGERPRINTS_KEY)
+
+    started = time.perf_counter()
+    stats = await vrbo.sync_bookings_from_vrbo(full=True) or {}
+    elapsed = time.perf_counter() - started
+
+    synced = stats.get("bookings_synced", 0)
+    return {
+        "bookings_synced": synced,
+        "inserted": stats.get("inserted"),
+        "updated": stats.get("updated"),
+        "unchanged": stats.get("unchanged"),
+        "shards": stats.get("shards"),
+        "elapsed_seconds": round(elapsed, 2),
+        "bookings_per_second": round(synced / elapsed, 1) if elapsed > 0 else 0.0,
+        "page_fetch_latency_ms": percentiles(page_latencies),
+        "batch_processing_latency_ms": percentiles(batch_latencies),
+        "pages_fetched": len(page_latencies)
+    }
+
+async def benchmark_messaging(guest_comms, messages: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    results = {"sent": 0, "failed": 0}
+    queue: asyncio.Queue = asyncio.Queue()
+    for n in range(messages):
+        queue.put_nowait({
+            "message_id": f"bench_{n}",
+            "booking_id": f"FAKE-{n:08d}",
+            "subject": "Benchmark message",
+            "body": "Hello from the Bill Sloth benchmark!",
+            "priority": "normal"
+        })
+
+    async def worker():
+        while not queue.empty():
+            message_data = queue.get_nowait()
+            started = time.perf_counter()
+            success = await guest_comms.send_vrbo_message(message_data)
+            latencies.append(time.perf_counter() - started)
+            results["sent" if success else "failed"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    return {
+        **results,
+        "elapsed_seconds": round(elapsed, 2),
+        "messages_per_second": round(results["sent"] / elapsed, 1) if elapsed > 0 else 0.0,
+        "send_latency_ms": percentiles(latencies)
+    }
+
+async def run(args: argparse.Namespace) -> Dict:
+    runner = None
+    api_url = args.api_url
+    if not api_url:
+        _, runner = await start_fake_api(config_from_args(args), port=args.port)
+        api_url = f"http://127.0.0.1:{args.port}"
+
+    # Services read their configuration at import time
+    os.environ["VRBO_BASE_URL"] = api_url
+    os.environ.setdefault("VRBO_CLIENT_ID", "bench-client")
+    os.environ.setdefault("VRBO_CLIENT_SECRET", "bench-secret")
+    os.environ.setdefault("LOG_DIR", str(Path(args.log_dir).resolve()))
+    os.environ["VRBO_RATE_LIMIT_PER_SECOND"] = str(args.rate_limit)
+    os.environ["VRBO_RATE_LIMIT_BURST"] = str(max(1, int(args.rate_limit)))
+
+    report: Dict = {"api_url": api_url}
+    try:
+        if args.bookings_sync:
+            vrbo = load_service("vrbo_automation_main", "vrbo-automation")
+            try:
+                report["sync"] = await benchmark_sync(vrbo, args.warm)
+            finally:
+                await vrbo.vrbo_client.close()
+
+        if args.messages:
+            guest_comms = load_service("guest_communication_main", "guest-communication")
+            try:
+                report["messaging"] = await benchmark_messaging(guest_comms, args.messages, args.concurrency)
+            finally:
+                await guest_comms.vrbo_client.close()
+    finally:
+        if runner:
+            await runner.cleanup()
+
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark VRBO sync and messaging against the fake Partner API")
+    parser.add_argument("--api-url", help="Use an already running fake API instead of starting one")
+    parser.add_argument("--port", type=int, default=8900, help="Port for the in-process fake API")
+    parser.add_argument("--no-sync", dest="bookings_sync", action="store_false", help="Skip the booking sync benchmark")
+    parser.add_argument("--warm", action="store_true", help="Keep booking fingerprints (measures the no-change path)")
+    parser.add_argument("--messages", type=int, default=1000, help="Messages to send (0 to skip)")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent message senders")
+    parser.add_argument("--rate-limit", type=float, default=10000, help="VRBO_RATE_LIMIT_PER_SECOND for the run")
+    parser.add_argument("--log-dir", default="bench-logs")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
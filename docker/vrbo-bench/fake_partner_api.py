@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Bill Sloth Fake VRBO Partner API
+Local stand-in for the token, bookings and messaging endpoints so the sync
+and messaging code can be exercised and benchmarked without Expedia
+credentials
+
+Usage:
+    python fake_partner_api.py --bookings 100000 --latency-ms 40 --throttle-rate 0.01
+    curl -X POST http://localhost:8900/_bump_property/PROP-0007  # change a listing
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from aiohttp import web
+
+@dataclass
+class FakeAPIConfig:
+    bookings: int = 100_000
+    properties: int = 200
+    page_size_max: int = 500
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    token_ttl: int = 3600
+    # Bookings are spread over this window of "last modified" times, newest
+    # first, so modified_since filters return a proportional slice
+    modified_window_hours: int = 24 * 30
+    seed: int = 1337
+
+@dataclass
+class FakeAPIStats:
+    requests: Dict[str, int] = field(default_factory=dict)
+    errors_injected: int = 0
+    throttles_injected: int = 0
+    tokens_issued: int = 0
+    bookings_served: int = 0
+    messages_received: int = 0
+    listings_not_modified: int = 0
+
+    def count(self, endpoint: str):
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+class FakePartnerAPI:
+    """Synthetic Partner API"""
+
+    def __init__(self, config: FakeAPIConfig):
+        self.config = config
+        self.stats = FakeAPIStats()
+        self.started_at = datetime.now(timezone.utc)
+        self.modified_spacing = config.modified_window_hours * 3600 / max(1, config.bookings)
+        self.tokens: Dict[str, float] = {}
+        # Bump a property's revision to change its listing (and ETag)
+        self.property_revisions: Dict[int, int] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.fault_injection])
+        app.router.add_post("/authentication/v1/token", self.issue_token)
+        app.router.add_get("/bookings/v1/bookings", self.list_bookings)
+        app.router.add_get("/properties/v1/properties", self.list_properties)
+        app.router.add_get("/properties/v1/properties/{property_id}", self.get_property)
+        app.router.add_post("/messaging/v1/messages", self.send_message)
+        app.router.add_get("/_stats", self.get_stats)
+        app.router.add_post("/_bump_property/{property_id}", self.bump_property)
+        return app
+
+    @web.middleware
+    async def fault_injection(self, request: web.Request, handler):
+        if request.path == "/_stats" or request.path.startswith("/_bump_property/"):
+            return await handler(request)
+
+        self.stats.count(request.path)
+        config = self.config
+        if config.latency_ms or config.jitter_ms:
+            delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+            await asyncio.sleep(delay)
+
+        roll = random.random()
+        if roll < config.throttle_rate:
+            self.stats.throttles_injected += 1
+            return web.json_response(
+                {"error": "rate_limited"},
+                status=429,
+                headers={"Retry-After": str(config.retry_after)}
+            )
+        if roll < config.throttle_rate + config.error_rate:
+            self.stats.errors_injected += 1
+            return web.json_response({"error": "injected_failure"}, status=500)
+
+        if request.path != "/authentication/v1/token" and not self.authorized(request):
+            return web.json_response({"error": "invalid_token"}, status=401)
+
+        return await handler(request)
+
+    def authorized(self, request: web.Request) -> bool:
+        header = request.headers.get("Authorization", "")
+        token = header[len("Bearer "):] if header.startswith("Bearer ") else None
+        return token is not None and self.tokens.get(token, 0) > time.monotonic()
+
+    async def issue_token(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if form.get("grant_type") != "client_credentials" or not form.get("client_id"):
+            return web.json_response({"error": "invalid_client"}, status=400)
+
+        token = uuid.uuid4().hex
+        self.tokens[token] = time.monotonic() + self.config.token_ttl
+        self.stats.tokens_issued += 1
+        return web.json_response({
+            "access_token": token,
+            "token_type": "Bearer",
+            "expires_in": self.config.token_ttl
+        })
+
+    def property_id(self, number: int) -> str:
+        return f"PROP-{number:04d}"
+
+    def property_number(self, property_id: str) -> Optional[int]:
+        try:
+            number = int(property_id.rsplit("-", 1)[-1])
+        except ValueError:
+            return None
+        if property_id != self.property_id(number) or not 0 <= number < self.config.properties:
+            return None
+        return number
+
+    def booking(self, index: int) -> Dict:
+        """Deterministic synthetic booking for an index"""
+        rng = random.Random(self.config.seed * 1_000_003 + index)
+        check_in = date(2025, 1, 1) + timedelta(days=rng.randrange(730))
+        nights = rng.randint(1, 14)
+        modified_at = self.started_at - timedelta(seconds=index * self.modified_spacing)
+        return {
+            "id": f"FAKE-{index:08d}",
+            "property_id": self.property_id(index % self.config.properties),
+            "guest_name": f"Guest {index}",
+            "guest_email": f"guest{index}@example.com",
+            "guest_count": rng.randint(1, 8),
+            "check_in": check_in.isoformat(),
+            "check_out": (check_in + timedelta(days=nights)).isoformat(),
+            "total_amount": round(nights * rng.uniform(90, 450), 2),
+            "status": rng.choice(["confirmed"] * 8 + ["pending", "cancelled"]),
+            "last_modified": modified_at.isoformat()
+        }
+
+    def matching_count(self, modified_since: Optional[datetime]) -> int:
+        if modified_since is None:
+            return self.config.bookings
+        age = (self.started_at - modified_since).total_seconds()
+        if age < 0:
+            return 0
+        return min(self.config.bookings, int(age / self.modified_spacing) + 1)
+
+    async def list_bookings(self, request: web.Request) -> web.Response:
+        try:
+            limit = min(int(request.query.get("limit", 100)), self.config.page_size_max)
+            offset = int(request.query.get("cursor", 0))
+            modified_since = request.query.get("modified_since")
+            since = datetime.fromisoformat(modified_since) if modified_since else None
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        matching = self.matching_count(since)
+        property_id = request.query.get("property_id")
+        if property_id is None:
+            total = matching
+            indexes = range(offset, min(offset + limit, total))
+        else:
+            # The cursor counts bookings of this property only
+            number = self.property_number(property_id)
+            properties = self.config.properties
+            total = 0 if number is None or matching <= number else (matching - number - 1) // properties + 1
+            indexes = [number + n * properties for n in range(offset, min(offset + limit, total))]
+
+        end = min(offset + limit, total)
+        bookings = [self.booking(index) for index in indexes]
+        self.stats.bookings_served += len(bookings)
+
+        return web.json_response({
+            "bookings": bookings,
+            "next_cursor": str(end) if end < total else None,
+            "total": total
+        })
+
+    def listing(self, number: int) -> Dict:
+        """Deterministic synthetic listing for a property number"""
+        revision = self.property_revisions.get(number, 0)
+        rng = random.Random(self.config.seed * 7919 + number * 31 + revision)
+        return {
+            "id": self.property_id(number),
+            "name": f"Sloth Retreat {number}" + (f" (rev {revision})" if revision else ""),
+            "address": {
+                "line1": f"{100 + number} Canopy Lane",
+                "city": "Asheville",
+                "state": "NC",
+                "postal_code": "28801",
+                "country": "US"
+            },
+            "nightly_rate": round(rng.uniform(90, 450), 2),
+            "max_guests": rng.randint(2, 12),
+            "description": "Cozy, slow-paced getaway. " * 40,
+            "amenities": ["wifi", "kitchen", "hot tub", "hammock"][:1 + number % 4]
+        }
+
+    async def list_properties(self, request: web.Request) -> web.Response:
+        try:
+            limit = min(int(request.query.get("limit", 100)), self.config.page_size_max)
+            offset = int(request.query.get("cursor", 0))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        end = min(offset + limit, self.config.properties)
+        return web.json_response({
+            "properties": [{"id": self.property_id(number)} for number in range(offset, end)],
+            "next_cursor": str(end) if end < self.config.properties else None
+        })
+
+    async def get_property(self, request: web.Request) -> web.Response:
+        """Listing with ETag/Last-Modified validators and 304 support"""
+        number = self.property_number(request.match_info["property_id"])
+        if number is None:
+            return web.json_response({"error": "not_found"}, status=404)
+
+        body = json.dumps(self.listing(number)).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        last_modified = self.started_at + timedelta(seconds=self.property_revisions.get(number, 0))
+        headers = {
+            "ETag": etag,
+            "Last-Modified": last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+        }
+
+        if request.headers.get("If-None-Match") == etag:
+            self.stats.listings_not_modified += 1
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        if not payload.get("bookingId") or not payload.get("message"):
+            return web.json_response({"error": "bookingId and message are required"}, status=400)
+
+        self.stats.messages_received += 1
+        return web.json_response({"messageId": uuid.uuid4().hex, "status": "SENT"})
+
+    async def bump_property(self, request: web.Request) -> web.Response:
+        """Change a listing, so its next fetch returns 200 with a new ETag"""
+        number = self.property_number(request.match_info["property_id"])
+        if number is None:
+            return web.json_response({"error": "not_found"}, status=404)
+
+        self.property_revisions[number] = self.property_revisions.get(number, 0) + 1
+        return web.json_response({"id": self.property_id(number), "revision": self.property_revisions[number]})
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats.__dict__)
+
+async def start_fake_api(config: FakeAPIConfig, host: str = "127.0.0.1", port: int = 8900):
+    """Start the fake API in the running event loop; returns (api, runner)"""
+    api = FakePartnerAPI(config)
+    runner = web.AppRunner(api.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return api, runner
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    defaults = FakeAPIConfig()
+    parser.add_argument("--bookings", type=int, default=defaults.bookings)
+    parser.add_argument("--properties", type=int, default=defaults.properties)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--throttle-rate", type=float, default=defaults.throttle_rate)
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--token-ttl", type=int, default=defaults.token_ttl)
+
+def config_from_args(args: argparse.Namespace) -> FakeAPIConfig:
+    return FakeAPIConfig(
+        bookings=args.bookings,
+        properties=args.properties,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        token_ttl=args.token_ttl
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake VRBO Partner API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8900)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    api = FakePartnerAPI(config_from_args(args))
+    print(f"🦥 Fake VRBO Partner API on http://{args.host}:{args.port} ({args.bookings} bookings)")
+    web.run_app(api.app(), host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+-- VRBO Automation Service schema additions (PostgreSQL)
+-- Constraints and columns relied on by docker/vrbo-automation
+
+-- Batched booking upserts use ON CONFLICT (vrbo_booking_id)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_vrbo_booking_id ON bookings(vrbo_booking_id);
+
+-- Content fingerprint of the last synced VRBO payload, used to skip
+-- unchanged bookings
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- GET /bookings keyset pagination seeks on (check_in, id), optionally
+-- within one property
+CREATE INDEX IF NOT EXISTS idx_bookings_check_in_id ON bookings(check_in, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_property_check_in_id ON bookings(property_id, check_in, id);
+
+-- Property catalog sync (PropertyData) columns and upsert target
+CREATE UNIQUE INDEX IF NOT EXISTS idx_properties_vrbo_property_id ON properties(vrbo_property_id);
+ALTER TABLE properties ADD COLUMN IF NOT EXISTS nightly_rate NUMERIC(10,2);
+ALTER TABLE properties ADD COLUMN IF NOT EXISTS max_guests INTEGER;
+ALTER TABLE properties ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+
+-- Guest communication outbox: scheduled emails are rows here rather than
+-- Redis set members, claimed by dispatchers with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS email_queue (
+    id SERIAL PRIMARY KEY,
+    recipient_email TEXT NOT NULL,
+    recipient_name TEXT,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    template_id TEXT,
+    priority INTEGER DEFAULT 5,
+    scheduled_time TIMESTAMP,
+    sent_time TIMESTAMP,
+    delivery_status TEXT DEFAULT 'pending',
+    error_message TEXT,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+ALTER TABLE email_queue ADD COLUMN IF NOT EXISTS booking_id TEXT;
+ALTER TABLE email_queue ADD COLUMN IF NOT EXISTS email_type TEXT;
+ALTER TABLE email_queue ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+ALTER TABLE email_queue ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_email_queue_booking_email_type ON email_queue(booking_id, email_type);
+CREATE INDEX IF NOT EXISTS idx_email_queue_pending_scheduled ON email_queue(scheduled_time) WHERE delivery_status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_email_queue_sending_claimed ON email_queue(claimed_at) WHERE delivery_status = 'sending';